@@ -0,0 +1,240 @@
+#  materialized per-city aggregates of the cleaned datasets
+#  every (dataset, city) pair gets a Summary of its value column (price or salary): count,
+#  sum, min and max, and a mergeable quantile sketch from which medians, other quantiles and
+#  histogram bin counts are read. Summaries of disjoint sets of rows merge into the summary of
+#  their union, so the all-cities summary is merged from the per-city ones
+#
+#  aggregates are saved next to the store files, in data/store/aggregates.json, together
+#  with a fingerprint of every city's values. When a cleaned csv changes, only the cities
+#  whose fingerprint changed get a new summary, and the all-cities one is merged again
+#
+#  usage: python aggregates.py        (re)builds data/store/aggregates.json
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+import datastore
+
+#  bumped whenever the summaries below change, so stale files get rebuilt
+FORMAT_VERSION = '2'
+
+#  summarized column of every dataset; schools are only counted
+COLUMNS = {'prop4sale': 'price',
+           'prop4rent': 'price',
+           'jobs': 'salary',
+           'schools': None}
+
+#  a sketch keeps exact values up to this many distinct ones ...
+MAX_VALUES = 10_000
+
+#  ... and beyond that rounds them onto a logarithmic grid, which keeps every quantile
+#  within this relative error (as in DDSketch)
+ACCURACY = .005
+_GAMMA = (1 + ACCURACY) / (1 - ACCURACY)
+
+
+def path():
+    return os.path.join(datastore.STORE_DIR, 'aggregates.json')
+
+
+def _rounded(values):
+    #  midpoint of the grid cell of every value, 0 and negatives keep their sign
+    magnitude = np.abs(values)
+    with np.errstate(divide='ignore'):
+        cell = np.ceil(np.log(magnitude) / math.log(_GAMMA))
+    rounded = np.sign(values) * 2 * _GAMMA ** cell / (_GAMMA + 1)
+    return np.where(magnitude > 0, rounded, 0.)
+
+
+class Summary:
+    """Count, sum, extremes and quantile sketch of a set of values."""
+
+    def __init__(self, values=(), counts=None, total=None, low=None, high=None, count=None,
+                 compacted=False):
+        values = np.asarray(values, dtype='float64')
+        if counts is None:
+            values, counts = np.unique(values[~np.isnan(values)], return_counts=True)
+        self.values = values
+        self.counts = np.asarray(counts, dtype='int64')
+        self.count = int(self.counts.sum()) if count is None else count
+        self.total = float(values @ self.counts) if total is None else total
+        self.low = (float(values[0]) if len(values) else math.nan) if low is None else low
+        self.high = (float(values[-1]) if len(values) else math.nan) if high is None else high
+        self.compacted = compacted
+        if len(self.values) > MAX_VALUES:
+            self.compact()
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    @property
+    def median(self):
+        return self.quantile(.5)
+
+    def compact(self):
+        """Round the values onto the logarithmic grid, merging those that fall together."""
+        self.values, inverse = np.unique(_rounded(self.values), return_inverse=True)
+        self.counts = np.bincount(inverse, weights=self.counts, minlength=len(self.values)).astype('int64')
+        self.compacted = True
+
+    def merge(self, other):
+        """Summary of the values of both `self` and `other`."""
+        values = np.concatenate([self.values, other.values])
+        counts = np.concatenate([self.counts, other.counts])
+        if self.compacted or other.compacted:
+            values = _rounded(values)
+        values, inverse = np.unique(values, return_inverse=True)
+        return Summary(values, np.bincount(inverse, weights=counts, minlength=len(values)),
+                       total=self.total + other.total,
+                       low=float(np.fmin(self.low, other.low)), high=float(np.fmax(self.high, other.high)),
+                       count=self.count + other.count, compacted=self.compacted or other.compacted)
+
+    def quantile(self, q):
+        """The `q` quantile, interpolated linearly as pandas and numpy do; exact until compacted."""
+        n = int(self.counts.sum())
+        if not n:
+            return math.nan
+        position = q * (n - 1)
+        below, above = math.floor(position), math.ceil(position)
+        ends = np.cumsum(self.counts)
+        value_below = self.values[np.searchsorted(ends, below, side='right')]
+        value_above = self.values[np.searchsorted(ends, above, side='right')]
+        return float(value_below + (value_above - value_below) * (position - below))
+
+    def histogram(self, bins):
+        """Counts of the values in `bins` (a number of bins or their edges) and the bin edges."""
+        counts, edges = np.histogram(self.values, bins=bins, weights=self.counts,
+                                     range=None if np.ndim(bins) else (self.low, self.high))
+        return counts.astype('int64'), edges
+
+    def to_dict(self):
+        return {'values': self.values.tolist(), 'counts': self.counts.tolist(), 'count': self.count,
+                'total': self.total, 'low': self.low, 'high': self.high, 'compacted': self.compacted}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def _fingerprint(name, rows):
+    #  row count and order-independent hash of the summarized values of one city
+    column = COLUMNS[name]
+    if column is None:
+        return str(len(rows))
+    hashes = pd.util.hash_pandas_object(rows[column], index=False).to_numpy()
+    return f'{len(rows)}:{int(hashes.sum())}'
+
+
+def update(summaries, fingerprints, name, frame):
+    """Summaries and fingerprints of dataset `name` for a new version of its `frame`.
+
+    `summaries` and `fingerprints` are those of the previous version; only the cities
+    whose values changed are summarized again, and the all-cities summary is merged from
+    the per-city ones, so the result is the same as `summarize(name, frame)`.
+    """
+    column = COLUMNS[name]
+    by_city, prints = {}, {}
+    for city, rows in frame.groupby('city', observed=True, sort=True):
+        prints[city] = _fingerprint(name, rows)
+        if city in summaries and fingerprints.get(city) == prints[city]:
+            by_city[city] = summaries[city]
+        else:
+            by_city[city] = Summary(count=len(rows)) if column is None else Summary(rows[column].to_numpy())
+    overall = Summary()
+    for summary in by_city.values():
+        overall = overall.merge(summary)
+    by_city[None] = overall
+    return by_city, prints
+
+
+def summarize(name, frame):
+    """{city: Summary} of the rows of dataset `name` in `frame`, plus the all-cities one under None."""
+    return update({}, {}, name, frame)[0]
+
+
+def _source(name):
+    stat = os.stat(datastore.source_path(name))
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def save(aggregates, fingerprints):
+    os.makedirs(datastore.STORE_DIR, exist_ok=True)
+    document = {'format_version': FORMAT_VERSION,
+                'sources': {name: _source(name) for name in aggregates},
+                'fingerprints': fingerprints,
+                'datasets': {name: {'' if city is None else city: summary.to_dict()
+                                    for city, summary in summaries.items()}
+                             for name, summaries in aggregates.items()}}
+    tmp = f'{path()}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as file:
+        json.dump(document, file)
+    os.replace(tmp, path())
+    return path()
+
+
+def _saved():
+    #  {name: (summaries, fingerprints, whether the csv is unchanged since)}
+    try:
+        with open(path()) as file:
+            document = json.load(file)
+    except FileNotFoundError:
+        return {}
+    if document.get('format_version') != FORMAT_VERSION:
+        return {}
+    return {name: ({city or None: Summary.from_dict(summary) for city, summary in summaries.items()},
+                   document['fingerprints'][name],
+                   document['sources'].get(name) == _source(name))
+            for name, summaries in document['datasets'].items()}
+
+
+def load(frames):
+    """Aggregates of every dataset in `frames` ({name: DataFrame}), as {name: {city: Summary}}.
+
+    Read from the saved file where it is up to date with the cleaned csv, otherwise
+    updated from the frame, city by city, and saved.
+    """
+    saved = _saved()
+    aggregates, fingerprints = {}, {}
+    for name, (summaries, prints, fresh) in saved.items():
+        if fresh or name in frames:
+            aggregates[name], fingerprints[name] = summaries, prints
+    stale = [name for name in frames if not saved.get(name, (None, None, False))[2]]
+    for name in stale:
+        aggregates[name], fingerprints[name] = update(aggregates.get(name, {}), fingerprints.get(name, {}),
+                                                      name, frames[name])
+    if stale:
+        save(aggregates, fingerprints)
+    return {name: aggregates[name] for name in frames}
+
+
+def bin_edges(low, high, bins):
+    """Edges of about `bins` equal bins covering `low` to `high`, at a round width (1, 2 or 5 times a power of ten)."""
+    if not high > low:
+        return np.array([low - .5, high + .5])
+    width = (high - low) / bins
+    power = 10 ** math.floor(math.log10(width))
+    width = next(m * power for m in (1, 2, 5, 10) if m * power >= width)
+    start = math.floor(low / width) * width
+    return start + width * np.arange(math.floor((high - start) / width) + 2)
+
+
+def medians(summaries, column):
+    """Median of every city, as a frame with `city` and `column` columns sorted by city."""
+    cities = sorted(city for city in summaries if city is not None)
+    return pd.DataFrame({'city': cities, column: [summaries[city].median for city in cities]})
+
+
+def counts(summaries):
+    """Number of rows of every city, largest first."""
+    cities = [city for city in summaries if city is not None]
+    return pd.Series({city: summaries[city].count for city in cities}).sort_values(ascending=False, kind='stable')
+
+
+if __name__ == '__main__':
+    updated = {name: update({}, {}, name, datastore.load(name)) for name in datastore.SOURCES}
+    print(save({name: summaries for name, (summaries, _) in updated.items()},
+               {name: prints for name, (_, prints) in updated.items()}))
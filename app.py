@@ -1,62 +1,38 @@
-from dash import Dash, html, dcc
-from dash.dependencies import Input, Output
-import dash_bootstrap_components as dbc
-import plotly.express as px
-import pandas as pd
-import geopandas as gpd
-import pyproj
-import gunicorn
+import startup
+with startup.phase('import libraries'):
+       from dash import Dash, html, dcc
+       from dash.dependencies import Input, Output, ClientsideFunction
+       import dash_bootstrap_components as dbc
+       import plotly.express as px
+       import pandas as pd
+       import gunicorn
+       import flask
+       import math
+       import os
+       from dash.exceptions import PreventUpdate
+       import config
+       import clientside
+       import datastore
+       import downsample
+       import geodata
+       import metrics
+       import aggregates
+       import serialization
+       import httpcache
+       import prerender
+       import scoring
+       import proximity
+       from figure_cache import FigureCache
+       import snapshot
+       from indexes import CityPartition, FilterIndex, GridIndex, PriceIndex
 
 ########################################################DATA PROCESSING########################################################
-#  loading the data from the cleaned datasets
-prop4sale = pd.read_csv('data/clean/clean_ncr_prop4sale.csv',index_col=0)
-prop4rent = pd.read_csv('data/clean/clean_ncr_prop4rent.csv',index_col=0)
-jobs = pd.read_csv('data/clean/clean_ncr_jobs.csv',index_col=0)
-schools = pd.read_csv('data/clean/clean_ncr_school.csv',index_col=0)
-ph_geodata = gpd.read_file('data/ph-adm/PHL_adm2.shp')
-
-#  binning numerical values 
-prop4sale['price_range'] = pd.cut(x=prop4sale.price, bins=5, right=False)
-prop4rent['price_range'] = pd.cut(x=prop4rent.price, bins=5, right=False)
-jobs['salary_range'] = pd.cut(x=jobs.salary, bins=6, right=False)
-
-#  filtering geodata to consider only those in NCR
-ph_geodata.to_crs(pyproj.CRS.from_epsg(4326), inplace=True)
-ncr_geodata = ph_geodata.query("NAME_1 == 'Metropolitan Manila'")
-ncr_geodata = ncr_geodata.rename(columns={'NAME_2': 'city'})
-ncr_geodata['city'] = ncr_geodata['city'].str.replace('City of', '')
-ncr_geodata['city'] = ncr_geodata['city'].str.replace('City', '')
-ncr_geodata['city'] = ncr_geodata['city'].str.lower()
-ncr_geodata['city'] = ncr_geodata['city'].str.strip()
-ncr_geodata = ncr_geodata.drop(columns=['NAME_1'])
-ncr_geodata = ncr_geodata[['city', 'geometry']] 
-ncr_geodata = ncr_geodata.reset_index(drop=True)
-
-#  filtered and aggregated data for choropleth map 
-#  median price of property for sale in NCR
-ave_prop4sale_city = prop4sale.groupby(by='city')['price'].median().reset_index()
-ave_prop4sale_city = ncr_geodata.merge(ave_prop4sale_city, on='city', how='inner')
-ave_prop4sale_city = ave_prop4sale_city.set_index('city')
-
-#  median price of property for rent in NCR
-ave_prop4rent_city = prop4rent.groupby(by='city')['price'].median().reset_index()
-ave_prop4rent_city = ncr_geodata.merge(ave_prop4rent_city, on='city', how='inner')
-ave_prop4rent_city = ave_prop4rent_city.set_index('city') 
-
-#  median salary for jobs in NCR
-ave_jobs_city = jobs.groupby(by='city')['salary'].median().reset_index()
-ave_jobs_city = ncr_geodata.merge(ave_jobs_city, on='city', how='inner')
-ave_jobs_city = ave_jobs_city.set_index('city') 
-
-#  property prices with respective coordinates
-#  data is filtered to remove outliers in the latitude column
-prop4sale_geo = prop4sale[~((prop4sale.latitude.gt(15)) | prop4sale.latitude.lt(14))]
-
-#  aggregating data for bar chart—frequency count for schools in each city
-city_dist = schools.city.value_counts().reset_index()
-city_dist = city_dist.rename(columns={'index': 'city', 'city': 'count'})
-
-######################################################## PRE-CHART ########################################################
+#  listing columns the scatter map can be narrowed down by, besides price and city, with
+#  the labels of their range sliders
+listing_filters = {'bedroom_num': 'Bedrooms',
+                   'bathroom_num': 'Bathrooms',
+                   'floor_area': 'Floor area (sqm)'}
+
 #  setting color map
 city_colors = {'quezon': '#9369a8',
                'manila': '#cd4a77',
@@ -66,39 +42,206 @@ city_colors = {'quezon': '#9369a8',
                'mandaluyong': '#feae51',
                'san juan': '#ec8b83'}
 
-#  creating a static bar chart
-bar_chart = px.bar(city_dist,
-                   x=city_dist.city.str.capitalize(),
-                   y='count',
-                   width=1200,
-                   height=600,
-                   color='city',
-                   color_discrete_map=city_colors,
-                   template='plotly_white',
-                   title='Total Number of Schools in Select Metro Manila Cities',
-                   text='count',
-                   hover_name=['Quezon City', 
-                               'Manila City',
-                               'Taguig City',
-                               'Pasig City',
-                               'Makati City',
-                               'Mandaluyong City',
-                               'San Juan City'],
-                   hover_data={'city': False},
-                   labels={'x': 'City',
-                           'count': 'Count'})
-
-#  hiding legends 
-bar_chart.update_layout(showlegend=False)
-
-#  updating title 
-bar_chart.update_layout(title={'y':0.9,
-                               'x':0.5,
-                               'xanchor': 'center',
-                               'yanchor': 'top',
-                               'font': {'size': 25}})   
+#  what every process would otherwise compute from the same data: the datasets grouped by
+#  city, and the listings the scatter map draws (those inside an NCR city) sorted by price
+#  with the arrays of their indexes. Written to data/store once per data version, by the
+#  first process to load it, and memory-mapped by every process (see datastore.derive)
+def derived(directory, name):
+       return os.path.join(directory, f'{name}.arrow')
+
+def derive_data(directory):
+       #  grouping the rows of each dataset by city once, so the callbacks can look a city up
+       #  as a slice instead of scanning the whole frame on every click
+       with startup.phase('partition by city'):
+              city_grid = geodata.CityGrid(geodata.load())
+              frames = {name: CityPartition(datastore.load(name)).frame for name in datastore.SOURCES}
+              for name, df in frames.items():
+                     datastore.write_frame(df, derived(directory, name))
+
+       #  per-city aggregates, saved next to the store for every process to read (see aggregates.py)
+       with startup.phase('aggregate by city'):
+              aggregates.load(frames)
+
+       with startup.phase('price index'):
+              mapped = {}
+              for name in ('prop4sale', 'prop4rent'):
+                     df = frames[name]
+                     #  map data sorted by price, so the budget slider filters with a binary search
+                     df = mapped[name] = PriceIndex(df[city_grid.locate(df.longitude, df.latitude) >= 0]).frame
+                     datastore.write_frame(df, derived(directory, f'{name}_geo'))
+
+                     #  and bucketed by map area, so a zoomed-in map only gets the listings in view
+                     datastore.write_arrays(*GridIndex(df.longitude, df.latitude).state(), derived(directory, f'{name}_grid'))
+
+                     #  and indexed on every column the listing filters narrow them down by
+                     datastore.write_arrays(*FilterIndex(df, ['price', *listing_filters], ['city']).state(),
+                                            derived(directory, f'{name}_filters'))
+
+       #  the districts nearest to every mapped listing (see proximity.py)
+       with startup.phase('proximity'):
+              centres = proximity.district_centers(*mapped.values())
+              for name, df in mapped.items():
+                     districts, km = proximity.nearest_table(df.latitude.to_numpy(), df.longitude.to_numpy(),
+                                                             centres.latitude.to_numpy(), centres.longitude.to_numpy(),
+                                                             proximity.NEAREST)
+                     datastore.write_arrays({'districts': districts, 'km': km}, {}, derived(directory, f'{name}_nearest'))
+
+#  everything the dashboard derives from the datasets, built from one version of them
+#  into a snapshot that is swapped for a new one when the data changes on disk (see snapshot.py)
+def load_data(version):
+       #  the datasets grouped by city and the indexes of the mapped listings, written once
+       #  for this version of the data, then mapped from the store
+       with startup.phase('derive datasets'):
+              directory = datastore.derive(version, derive_data)
+
+       with startup.phase('load datasets'):
+              prop4sale_by_city = CityPartition(datastore.read_frame(derived(directory, 'prop4sale')), presorted=True)
+              prop4rent_by_city = CityPartition(datastore.read_frame(derived(directory, 'prop4rent')), presorted=True)
+              jobs_by_city = CityPartition(datastore.read_frame(derived(directory, 'jobs')), presorted=True)
+              schools_by_city = CityPartition(datastore.read_frame(derived(directory, 'schools')), presorted=True)
+              prop4sale = prop4sale_by_city.frame
+              prop4rent = prop4rent_by_city.frame
+              jobs = jobs_by_city.frame
+              schools = schools_by_city.frame
+
+       #  NCR city boundaries, prepared ahead of time by geodata.py
+       #  and indexed on a grid to place listings in cities by their coordinates
+       with startup.phase('load city boundaries'):
+              ncr_geodata = geodata.load()
+              city_grid = geodata.CityGrid(ncr_geodata)
+
+       #  binning numerical values 
+       with startup.phase('bin values'):
+              prop4sale['price_range'] = pd.cut(x=prop4sale.price, bins=5, right=False)
+              prop4rent['price_range'] = pd.cut(x=prop4rent.price, bins=5, right=False)
+              jobs['salary_range'] = pd.cut(x=jobs.salary, bins=6, right=False)
+
+       #  per-city counts, means, medians and value distributions, read from data/store when
+       #  they are up to date with the datasets (see aggregates.py)
+       with startup.phase('aggregate by city'):
+              city_aggregates = aggregates.load({'prop4sale': prop4sale,
+                                                 'prop4rent': prop4rent,
+                                                 'jobs': jobs,
+                                                 'schools': schools})
+
+              #  filtered and aggregated data for choropleth map 
+              #  median price of property for sale in NCR
+              ave_prop4sale_city = aggregates.medians(city_aggregates['prop4sale'], 'price')
+              ave_prop4sale_city = ncr_geodata.merge(ave_prop4sale_city, on='city', how='inner')
+              ave_prop4sale_city = ave_prop4sale_city.set_index('city')
+
+              #  median price of property for rent in NCR
+              ave_prop4rent_city = aggregates.medians(city_aggregates['prop4rent'], 'price')
+              ave_prop4rent_city = ncr_geodata.merge(ave_prop4rent_city, on='city', how='inner')
+              ave_prop4rent_city = ave_prop4rent_city.set_index('city') 
+
+              #  median salary for jobs in NCR
+              ave_jobs_city = aggregates.medians(city_aggregates['jobs'], 'salary')
+              ave_jobs_city = ncr_geodata.merge(ave_jobs_city, on='city', how='inner')
+              ave_jobs_city = ave_jobs_city.set_index('city') 
+
+       #  property prices with respective coordinates
+       #  only listings whose coordinates fall inside one of the NCR cities are mapped
+       with startup.phase('price index'):
+              prop4sale_geo = datastore.read_frame(derived(directory, 'prop4sale_geo'))
+              prop4rent_geo = datastore.read_frame(derived(directory, 'prop4rent_geo'))
+
+              #  map data sorted by price, so the budget slider filters with a binary search
+              prop4sale_geo_by_price = PriceIndex(prop4sale_geo, presorted=True)
+              prop4rent_by_price = PriceIndex(prop4rent_geo, presorted=True)
+
+              #  and bucketed by map area, so a zoomed-in map only gets the listings in view
+              prop4sale_geo_grid = GridIndex.from_state(*datastore.read_arrays(derived(directory, 'prop4sale_grid')))
+              prop4rent_grid = GridIndex.from_state(*datastore.read_arrays(derived(directory, 'prop4rent_grid')))
+
+              #  and indexed on every column the listing filters narrow them down by
+              prop4sale_geo_filters = FilterIndex.from_state(*datastore.read_arrays(derived(directory, 'prop4sale_filters')))
+              prop4rent_filters = FilterIndex.from_state(*datastore.read_arrays(derived(directory, 'prop4rent_filters')))
+
+       #  radius search around the districts' centres, over the mapped listings (see proximity.py)
+       with startup.phase('proximity'):
+              district_centres = proximity.district_centers(prop4sale_geo, prop4rent_geo)
+              prop4sale_nearest = datastore.read_arrays(derived(directory, 'prop4sale_nearest'))[0]
+              prop4rent_nearest = datastore.read_arrays(derived(directory, 'prop4rent_nearest'))[0]
+              prop4sale_near = proximity.Proximity(prop4sale_geo, district_centres, prop4sale_geo_grid,
+                                                   (prop4sale_nearest['districts'], prop4sale_nearest['km']))
+              prop4rent_near = proximity.Proximity(prop4rent_geo, district_centres, prop4rent_grid,
+                                                   (prop4rent_nearest['districts'], prop4rent_nearest['km']))
+
+       #  feature vectors of every city and district, which the city ranking weighs (see scoring.py)
+       with startup.phase('score cities'):
+              city_scorers = scoring.scorers(city_aggregates, prop4sale, prop4rent)
+
+       #  aggregating data for bar chart—frequency count for schools in each city
+       with startup.phase('count schools'):
+              city_dist = aggregates.counts(city_aggregates['schools']).reset_index()
+              city_dist = city_dist.rename(columns={'index': 'city', 0: 'count'})
+
+       #  creating a static bar chart
+       with startup.phase('bar chart'):
+              bar_chart = px.bar(city_dist,
+                                 x=city_dist.city.str.capitalize(),
+                                 y='count',
+                                 width=1200,
+                                 height=600,
+                                 color='city',
+                                 color_discrete_map=city_colors,
+                                 template='plotly_white',
+                                 title='Total Number of Schools in Select Metro Manila Cities',
+                                 text='count',
+                                 hover_name=['Quezon City', 
+                                             'Manila City',
+                                             'Taguig City',
+                                             'Pasig City',
+                                             'Makati City',
+                                             'Mandaluyong City',
+                                             'San Juan City'],
+                                 hover_data={'city': False},
+                                 labels={'x': 'City',
+                                         'count': 'Count'})
+
+              #  hiding legends 
+              bar_chart.update_layout(showlegend=False)
+
+              #  updating title 
+              bar_chart.update_layout(title={'y':0.9,
+                                             'x':0.5,
+                                             'xanchor': 'center',
+                                             'yanchor': 'top',
+                                             'font': {'size': 25}})   
+
+              bar_chart.update_traces(textposition='outside')
+
+       return snapshot.Snapshot(version,
+                                prop4sale=prop4sale,
+                                prop4rent=prop4rent,
+                                jobs=jobs,
+                                schools=schools,
+                                ncr_geodata=ncr_geodata,
+                                city_grid=city_grid,
+                                prop4sale_by_city=prop4sale_by_city,
+                                prop4rent_by_city=prop4rent_by_city,
+                                jobs_by_city=jobs_by_city,
+                                schools_by_city=schools_by_city,
+                                city_aggregates=city_aggregates,
+                                ave_prop4sale_city=ave_prop4sale_city,
+                                ave_prop4rent_city=ave_prop4rent_city,
+                                ave_jobs_city=ave_jobs_city,
+                                prop4sale_geo=prop4sale_geo,
+                                prop4rent_geo=prop4rent_geo,
+                                prop4sale_geo_by_price=prop4sale_geo_by_price,
+                                prop4rent_by_price=prop4rent_by_price,
+                                prop4sale_geo_grid=prop4sale_geo_grid,
+                                prop4rent_grid=prop4rent_grid,
+                                prop4sale_geo_filters=prop4sale_geo_filters,
+                                prop4rent_filters=prop4rent_filters,
+                                district_centres=district_centres,
+                                prop4sale_near=prop4sale_near,
+                                prop4rent_near=prop4rent_near,
+                                city_scorers=city_scorers,
+                                city_dist=city_dist,
+                                bar_chart=bar_chart)
 
-bar_chart.update_traces(textposition='outside')
 
 ######################################################## LAYOUT ########################################################
 #  external_stylesheets to be used for creating the HTML layout
@@ -124,294 +267,438 @@ app = Dash(__name__, external_stylesheets=external_stylesheets, title='City Desi
 
 server = app.server
 
-#  dashboard layout
-app.layout = html.Div(children=[html.Header(id='home', 
-                         className='container-fluid', 
-                         children=[
-                             html.Div(className='row', 
-                                      children=[html.Div(className='col-lg-12',
-                                                         children=[html.H1(id='title-text',
-                                                                           className='text-center my-3',
-                                                                           children=['City Desirability Dashboard'])])])
-                             ]), 
-                html.Br(),
-                html.Br(),
-                html.Div(id='landing',
-                         className='container-lg',
-                         children=[html.Img(src='assets/banner.png',
-                                            className='row img-fluid',
-                                            alt='banner'),
-                                   html.Br(), 
-                                   html.Br(),
-                                   html.Br(),
-                                   html.Br(),
-                                   html.Div(className='row',
-                                            children=[html.Div(className='col-lg-12',children=[html.H3(id='button-text',
-                                                                                                       className='text-center my-3',
-                                                                                                       children='Start exploring now.')])]),
-                                   html.Div(className='row justify-content-center',
-                                            children=[html.Div(id='navbuttons',
-                                                               className='btn-group col-lg-10',
-                                                               role='group',
-                                                               children=[html.A(className='btn btn-outline-dark',
-                                                                                href='#city-comparison',
-                                                                                children=['CITY COMPARISON']),
-                                                                         html.A(className='btn btn-outline-dark',
-                                                                                href='#property-comparison', 
-                                                                                children=['PROPERTY COMPARISON']),
-                                                                         html.A(className='btn btn-outline-dark',
-                                                                                href='#school-comparison',
-                                                                                children=['SCHOOL COMPARISON'])])]),
-                                   html.Br(),
-                                   html.Br(),
-                                   html.Br(),
-                                   html.Img(id='nav-arrow',
-                                            src='assets/arrow-down-sign-to-navigate.png',
-                                            className='row img-fluid mx-auto d-block')
-                                   ]),
-                html.Br(),
-                html.Br(),
-                html.Br(),
-                html.Br(),
-                html.Div(id='city-comparison',
-                         className='container-lg section-header',
-                         children=[html.Div(className='row',
-                                            children=[html.Div(className='col-lg-10',
-                                                               children=[html.H2(className='section-title',
-                                                                                 children=['City Comparison\t\t\t\t\t',
-                                                                                           html.Span(className='description',
-                                                                                                     children=['to compare cities according to ammenities'])])]),
-                                                      html.Div(className='col-lg-2',
-                                                               children=[html.Div(id='nav1',
-                                                                                className='btn-group col-lg-12',
-                                                                                role='group',
-                                                                                children=[html.A(className='btn btn-outline-dark',
-                                                                                                 href='#home',
-                                                                                                 children=['↑']),
-                                                                                          html.A(className='btn btn-outline-dark',
-                                                                                                 href='#home',
-                                                                                                 children=['home']),
-                                                                                          html.A(className='btn btn-outline-dark',
-                                                                                                 href='#property-comparison',
-                                                                                                 children=['↓'])])]),
-                                                      html.Hr()])
-                                   ]),
-                html.Div(className='container-lg card-full-xl',
-                         children=[html.Div(className='container-lg',
-                                            children=[html.Div(className='row',
-                                                               children=[html.Div(className='col-lg-6 radio-group my-2',
-                                                                                  children=[html.Br(),
-                                                                                            html.P(['Choose which amenity to explore'], className='description'),
-                                                                                            dbc.RadioItems(id='radio-section1',
-                                                                                                           className='btn-group radio',
-                                                                                                           inputClassName='btn-check',
-                                                                                                           labelClassName='btn btn-outline-dark',
-                                                                                                           labelCheckedClassName='active',
-                                                                                                           options=[{'label': 'property prices', 'value': 1},
-                                                                                                                    {'label': 'rental prices', 'value': 2},
-                                                                                                                    {'label': 'job salaries', 'value': 3}],
-                                                                                                           value=1),
-                                                                                            html.Br(),
-                                                                                            html.Br(),
-                                                                                            html.P('Description',
-                                                                                                   className='p-title'),
-                                                                                            html.P('''Shown here is the map of Metro Manila that displays the median in their respective data. 
-                                                                                                   Once you have chosen your dataset, you will see here is the expected average per city, and their respective map. 
-                                                                                                   You can also click on the map to see more information about your selected amenity which is shown below.''',
-                                                                                                   className='p-body'),
-                                                                                            html.P('How to use',
-                                                                                                   className='p-title'),
-                                                                                            html.P([html.Ol([html.Li('Choose and click what data you want to explore'),
-                                                                                                             html.Li('Hover your mouse to the cities on the map to see the average'),
-                                                                                                             html.Li('Click on the map to see more information about your selected amenity'),
-                                                                                                             html.Li('Enjoy!')])],
-                                                                                                   className='p-body')]),
-                                                                         html.Div(className='col-lg-6',
-                                                                                  children=[dcc.Graph(id='choropleth-map')])
-                                                                         ])])
-                                   ]),
-                html.Br(),
-                html.Div(className='container-lg', 
-                         children=[html.Div(className='row justify-content-between',
-                                            children=[html.Div(className='col-lg-5 card-half',
-                                                               children=[html.Br(),
-                                                                         html.Div(className='row', 
-                                                                                  children=[dcc.Graph(id='variable-chart')])]),
-                                                      html.Div(className='col-lg-5 card-half',
-                                                               children=[html.Br(), 
-                                                                         html.Div(className='col-lg-row',
-                                                                                  children=[dcc.Graph(id='histogram')])])])
-                                   ]), 
-                html.Br(),
-                html.Br(),
-                html.Br(),
-                html.Br(),
-                html.Br(),
-                html.Br(),
-                html.Div(id='property-comparison',
-                         className='container-lg section-header',
-                         children=[html.Div(className='row',
-                                            children=[html.Div(className='col-lg-10',
-                                                               children=[html.H2(className='section-title',
-                                                                                 children=['Property Comparison\t\t\t\t\t',
-                                                                                           html.Span(className='description',
-                                                                                                     children=['to compare properties according to their prices in their respective locations'])])]),
-                                                      html.Div(className='col-lg-2',
-                                                               children=[html.Div(id='nav2',
-                                                                                className='btn-group col-lg-12',
-                                                                                role='group',
-                                                                                children=[html.A(className='btn btn-outline-dark',
-                                                                                                 href='#city-comparison',
-                                                                                                 children=['↑']),
-                                                                                          html.A(className='btn btn-outline-dark',
-                                                                                                 href='#home',
-                                                                                                 children=['home']),
-                                                                                          html.A(className='btn btn-outline-dark',
-                                                                                                 href='#school-comparison',
-                                                                                                 children=['↓'])])]),
-                                                      html.Hr()])
-                                   ]),
-                html.Div(className='container-lg',
-                         children=[html.Div(className='row',
-                                            children=[html.Div(className='col-lg-2', 
-                                                               children=[html.P(className='description',
-                                                                                 children=['Choose a property type'])]),
-                                                      html.Div(className='col-lg-10',
-                                                               children=[html.P(className='description',
-                                                                                 children=['Slide to set your budget'])])]),
-                                   html.Div(className='row',
-                                            children=[html.Div(className='col-lg-2 radio-group',
-                                                               children=[dbc.RadioItems(id='radio-section2',
-                                                                                        className='btn-group',
-                                                                                        inputClassName='btn-check',
-                                                                                        labelClassName='btn btn-outline-dark',
-                                                                                        labelCheckedClassName='active',
-                                                                                        options=[{'label': 'for sale', 'value': 1},
-                                                                                                 {'label': 'for rent', 'value': 2}],
-                                                                                        value=1)]),
-                                                      html.Div(className='col-lg-10',
-                                                               children=[dcc.Slider(id='slider-scatter',
-                                                                                    tooltip={"placement": "bottom", 
-                                                                                             "always_visible": False},
-                                                                                    min=prop4sale_geo.price.min(),
-                                                                                    max=prop4sale_geo.price.max(),
-                                                                                    value=prop4sale_geo.price.median())])])]),
-                html.Br(),
-                html.Div(className='container-lg card-full-xxl',
-                         children=[html.Div(className='container-lg',
-                                            children=[html.Div(className='row',
-                                                               children=[html.Div(className='col-lg-8',
-                                                                                  children=[dcc.Graph(id='scatter-map')])])])
-                                   ]),
-                html.Div(className='container-lg',
-                         children=[html.Br(),
-                                   html.Div(className='row justify-content-center', 
-                                            children=[html.Div([html.P('Description', 
-                                                                      className='p-title'), 
-                                                               html.P('''Shown here are the property comparison according to their prices in their respective locations. 
-                                                                      You can see the range of the property price based on their colors shown on the right side.
-                                                                      ''',
-                                                                      className='p-body')],
-                                                               className='col-lg-6'),
-                                                      html.Div([html.P('How to use',
-                                                                       className='p-title'),
-                                                               html.P([html.Ol([html.Li('Select the property type that you want to explore'),
-                                                                                html.Li('Set your budget using the slider above to isolate that budget and see it on the map'),
-                                                                                html.Li('Enjoy!')])],
-                                                                      className='p-body')],
-                                                               className='col-lg-6')])
-                                   ]),
-                html.Br(),
-                html.Br(),
-                html.Br(),
-                html.Br(),
-                html.Br(),
-                html.Br(),
-                html.Div(id='school-comparison',
-                         className='container-lg section-header',
-                         children=[html.Div(className='row',
-                                            children=[html.Div(className='col-lg-10',
-                                                               children=[html.H2(className='section-title',
-                                                                                 children=['School Comparison\t\t\t\t\t',
-                                                                                           html.Span(className='description',
-                                                                                                     children=['to compare the number of schools in each city'])])]),
-                                                      html.Div(className='col-lg-2',
-                                                               children=[html.Div(id='nav3',
-                                                                                className='btn-group col-lg-12',
-                                                                                role='group',
-                                                                                children=[html.A(className='btn btn-outline-dark',
-                                                                                                 href='#property-comparison',
-                                                                                                 children=['↑']),
-                                                                                          html.A(className='btn btn-outline-dark',
-                                                                                                 href='#home',
-                                                                                                 children=['home']),
-                                                                                          html.A(className='btn btn-outline-dark',
-                                                                                                 href='#treemap',
-                                                                                                 children=['↓'])])]),
-                                                      html.Hr()])
-                                   ]), 
-                html.Br(),
-                html.Div(className='container-lg',
-                         children=[html.Div(className='row',
-                                            children=[html.Div(className='row justify-content-center', 
-                                                               children=[html.Div([html.P('Description', 
-                                                                                          className='p-title'), 
-                                                                                   html.P('''Presented below is graph that shows the total number of available schools per city of Manila. 
-                                                                                          This section will provide you how many schools there are in Metro Manila including the number of types 
-                                                                                          of school to fit your desired educational institution, which can be found below the initial graph''',
-                                                                                          className='p-body')],
-                                                                                  className='col-lg-6'),
-                                                                         html.Div([html.P('How to use',
+#  version of the code, which with the version of the data being served decides every response
+code_version = httpcache.code_version()
+
+def response_version():
+       return f'{reloader.current.version}-{code_version}'
+
+#  brotli/gzip compression and 304s for repeat requests (see httpcache.py)
+if config.COMPRESS:
+       httpcache.compress(server)
+if config.HTTP_ETAGS:
+       httpcache.install_etags(app, response_version)
+
+#  orjson for the callback responses and the layout (see serialization.py)
+if config.FAST_JSON:
+       serialization.install(typed=config.FAST_JSON_TYPED_ARRAYS)
+
+#  dashboard layout, built for every snapshot of the data
+def build_layout(data):
+       return html.Div(children=[html.Header(id='home', 
+                          className='container-fluid', 
+                          children=[
+                              html.Div(className='row', 
+                                       children=[html.Div(className='col-lg-12',
+                                                          children=[html.H1(id='title-text',
+                                                                            className='text-center my-3',
+                                                                            children=['City Desirability Dashboard'])])])
+                              ]), 
+                 html.Br(),
+                 html.Br(),
+                 html.Div(id='landing',
+                          className='container-lg',
+                          children=[html.Img(src='assets/banner.png',
+                                             className='row img-fluid',
+                                             alt='banner'),
+                                    html.Br(), 
+                                    html.Br(),
+                                    html.Br(),
+                                    html.Br(),
+                                    html.Div(className='row',
+                                             children=[html.Div(className='col-lg-12',children=[html.H3(id='button-text',
+                                                                                                        className='text-center my-3',
+                                                                                                        children='Start exploring now.')])]),
+                                    html.Div(className='row justify-content-center',
+                                             children=[html.Div(id='navbuttons',
+                                                                className='btn-group col-lg-10',
+                                                                role='group',
+                                                                children=[html.A(className='btn btn-outline-dark',
+                                                                                 href='#city-comparison',
+                                                                                 children=['CITY COMPARISON']),
+                                                                          html.A(className='btn btn-outline-dark',
+                                                                                 href='#property-comparison', 
+                                                                                 children=['PROPERTY COMPARISON']),
+                                                                          html.A(className='btn btn-outline-dark',
+                                                                                 href='#school-comparison',
+                                                                                 children=['SCHOOL COMPARISON']),
+                                                                          html.A(className='btn btn-outline-dark',
+                                                                                 href='#city-ranking',
+                                                                                 children=['CITY RANKING'])])]),
+                                    html.Br(),
+                                    html.Br(),
+                                    html.Br(),
+                                    html.Img(id='nav-arrow',
+                                             src='assets/arrow-down-sign-to-navigate.png',
+                                             className='row img-fluid mx-auto d-block')
+                                    ]),
+                 html.Br(),
+                 html.Br(),
+                 html.Br(),
+                 html.Br(),
+                 html.Div(id='city-comparison',
+                          className='container-lg section-header',
+                          children=[html.Div(className='row',
+                                             children=[html.Div(className='col-lg-10',
+                                                                children=[html.H2(className='section-title',
+                                                                                  children=['City Comparison\t\t\t\t\t',
+                                                                                            html.Span(className='description',
+                                                                                                      children=['to compare cities according to ammenities'])])]),
+                                                       html.Div(className='col-lg-2',
+                                                                children=[html.Div(id='nav1',
+                                                                                 className='btn-group col-lg-12',
+                                                                                 role='group',
+                                                                                 children=[html.A(className='btn btn-outline-dark',
+                                                                                                  href='#home',
+                                                                                                  children=['↑']),
+                                                                                           html.A(className='btn btn-outline-dark',
+                                                                                                  href='#home',
+                                                                                                  children=['home']),
+                                                                                           html.A(className='btn btn-outline-dark',
+                                                                                                  href='#property-comparison',
+                                                                                                  children=['↓'])])]),
+                                                       html.Hr()])
+                                    ]),
+                 html.Div(className='container-lg card-full-xl',
+                          children=[html.Div(className='container-lg',
+                                             children=[html.Div(className='row',
+                                                                children=[html.Div(className='col-lg-6 radio-group my-2',
+                                                                                   children=[html.Br(),
+                                                                                             html.P(['Choose which amenity to explore'], className='description'),
+                                                                                             dbc.RadioItems(id='radio-section1',
+                                                                                                            className='btn-group radio',
+                                                                                                            inputClassName='btn-check',
+                                                                                                            labelClassName='btn btn-outline-dark',
+                                                                                                            labelCheckedClassName='active',
+                                                                                                            options=[{'label': 'property prices', 'value': 1},
+                                                                                                                     {'label': 'rental prices', 'value': 2},
+                                                                                                                     {'label': 'job salaries', 'value': 3}],
+                                                                                                            value=1),
+                                                                                             html.Br(),
+                                                                                             html.Br(),
+                                                                                             html.P('Description',
+                                                                                                    className='p-title'),
+                                                                                             html.P('''Shown here is the map of Metro Manila that displays the median in their respective data. 
+                                                                                                    Once you have chosen your dataset, you will see here is the expected average per city, and their respective map. 
+                                                                                                    You can also click on the map to see more information about your selected amenity which is shown below.''',
+                                                                                                    className='p-body'),
+                                                                                             html.P('How to use',
+                                                                                                    className='p-title'),
+                                                                                             html.P([html.Ol([html.Li('Choose and click what data you want to explore'),
+                                                                                                              html.Li('Hover your mouse to the cities on the map to see the average'),
+                                                                                                              html.Li('Click on the map to see more information about your selected amenity'),
+                                                                                                              html.Li('Enjoy!')])],
+                                                                                                    className='p-body')]),
+                                                                          html.Div(className='col-lg-6',
+                                                                                   children=[dcc.Graph(id='choropleth-map')])
+                                                                          ])])
+                                    ]),
+                 html.Br(),
+                 html.Div(className='container-lg', 
+                          children=[html.Div(className='row justify-content-between',
+                                             children=[html.Div(className='col-lg-5 card-half',
+                                                                children=[html.Br(),
+                                                                          html.Div(className='row', 
+                                                                                   children=[dcc.Graph(id='variable-chart')])]),
+                                                       html.Div(className='col-lg-5 card-half',
+                                                                children=[html.Br(), 
+                                                                          html.Div(className='col-lg-row',
+                                                                                   children=[dcc.Graph(id='histogram')])])])
+                                    ]), 
+                 html.Br(),
+                 html.Br(),
+                 html.Br(),
+                 html.Br(),
+                 html.Br(),
+                 html.Br(),
+                 html.Div(id='property-comparison',
+                          className='container-lg section-header',
+                          children=[html.Div(className='row',
+                                             children=[html.Div(className='col-lg-10',
+                                                                children=[html.H2(className='section-title',
+                                                                                  children=['Property Comparison\t\t\t\t\t',
+                                                                                            html.Span(className='description',
+                                                                                                      children=['to compare properties according to their prices in their respective locations'])])]),
+                                                       html.Div(className='col-lg-2',
+                                                                children=[html.Div(id='nav2',
+                                                                                 className='btn-group col-lg-12',
+                                                                                 role='group',
+                                                                                 children=[html.A(className='btn btn-outline-dark',
+                                                                                                  href='#city-comparison',
+                                                                                                  children=['↑']),
+                                                                                           html.A(className='btn btn-outline-dark',
+                                                                                                  href='#home',
+                                                                                                  children=['home']),
+                                                                                           html.A(className='btn btn-outline-dark',
+                                                                                                  href='#school-comparison',
+                                                                                                  children=['↓'])])]),
+                                                       html.Hr()])
+                                    ]),
+                 html.Div(className='container-lg',
+                          children=[html.Div(className='row',
+                                             children=[html.Div(className='col-lg-2', 
+                                                                children=[html.P(className='description',
+                                                                                  children=['Choose a property type'])]),
+                                                       html.Div(className='col-lg-10',
+                                                                children=[html.P(className='description',
+                                                                                  children=['Slide to set your price range'])])]),
+                                    html.Div(className='row',
+                                             children=[html.Div(className='col-lg-2 radio-group',
+                                                                children=[dbc.RadioItems(id='radio-section2',
+                                                                                         className='btn-group',
+                                                                                         inputClassName='btn-check',
+                                                                                         labelClassName='btn btn-outline-dark',
+                                                                                         labelCheckedClassName='active',
+                                                                                         options=[{'label': 'for sale', 'value': 1},
+                                                                                                  {'label': 'for rent', 'value': 2}],
+                                                                                         value=1)]),
+                                                       html.Div(className='col-lg-10',
+                                                                children=[dcc.RangeSlider(id='slider-scatter',
+                                                                                          tooltip={"placement": "bottom", 
+                                                                                                   "always_visible": False},
+                                                                                          min=data.prop4sale_geo.price.min(),
+                                                                                          max=data.prop4sale_geo.price.max(),
+                                                                                          value=[data.prop4sale_geo.price.min(),
+                                                                                                 data.prop4sale_geo.price.median()]),
+                                                                          dcc.Store(id='scatter-data')])]),
+                                    #  the browser-side filter only knows the budget
+                                    *([] if config.SCATTER_CLIENTSIDE else [
+                                    html.Div(className='row',
+                                             children=[html.Div(className='col-lg-6',
+                                                                children=[html.P(className='description',
+                                                                                  children=['Only show listings near']),
+                                                                          dcc.Dropdown(id='near-district',
+                                                                                       options=[{'label': district.title(), 'value': district}
+                                                                                                for district in data.district_centres.index],
+                                                                                       placeholder='anywhere')]),
+                                                       html.Div(className='col-lg-6',
+                                                                children=[html.P(className='description',
+                                                                                  children=['within (km)']),
+                                                                          dcc.Slider(id='near-km',
+                                                                                     min=.5,
+                                                                                     max=5,
+                                                                                     step=.5,
+                                                                                     value=2)])]),
+                                    #  any combination of these is looked up in the listings' filter index
+                                    html.Div(className='row',
+                                             children=[*[html.Div(className='col-lg-3',
+                                                                  children=[html.P(className='description',
+                                                                                    children=[label]),
+                                                                            dcc.RangeSlider(id=f'filter-{column}',
+                                                                                            tooltip={"placement": "bottom",
+                                                                                                     "always_visible": False},
+                                                                                            min=bounds[0],
+                                                                                            max=bounds[1],
+                                                                                            step=1,
+                                                                                            marks=None,
+                                                                                            value=list(bounds))])
+                                                         for column, label in listing_filters.items()
+                                                         for bounds in [data.prop4sale_geo_filters.bounds(column)]],
+                                                       html.Div(className='col-lg-3',
+                                                                children=[html.P(className='description',
+                                                                                  children=['Cities']),
+                                                                          dcc.Dropdown(id='filter-cities',
+                                                                                       options=[{'label': city.title(), 'value': city}
+                                                                                                for city in sorted(data.prop4sale_geo_filters.categories('city'))],
+                                                                                       multi=True,
+                                                                                       placeholder='all cities')])])])]),
+                 html.Br(),
+                 html.Div(className='container-lg card-full-xxl',
+                          children=[html.Div(className='container-lg',
+                                             children=[html.Div(className='row',
+                                                                children=[html.Div(className='col-lg-8',
+                                                                                   children=[dcc.Graph(id='scatter-map')])])])
+                                    ]),
+                 html.Div(className='container-lg',
+                          children=[html.Br(),
+                                    html.Div(className='row justify-content-center', 
+                                             children=[html.Div([html.P('Description', 
+                                                                       className='p-title'), 
+                                                                html.P('''Shown here are the property comparison according to their prices in their respective locations. 
+                                                                       You can see the range of the property price based on their colors shown on the right side.
+                                                                       ''',
+                                                                       className='p-body')],
+                                                                className='col-lg-6'),
+                                                       html.Div([html.P('How to use',
+                                                                        className='p-title'),
+                                                                html.P([html.Ol([html.Li('Select the property type that you want to explore'),
+                                                                                 html.Li('Set your price range using the slider above to isolate the listings in it and see them on the map'),
+                                                                                 *([] if config.SCATTER_CLIENTSIDE else [html.Li('Narrow the listings down further by bedrooms, bathrooms, floor area, city or district')]),
+                                                                                 html.Li('Enjoy!')])],
+                                                                       className='p-body')],
+                                                                className='col-lg-6')])
+                                    ]),
+                 html.Br(),
+                 html.Br(),
+                 html.Br(),
+                 html.Br(),
+                 html.Br(),
+                 html.Br(),
+                 html.Div(id='school-comparison',
+                          className='container-lg section-header',
+                          children=[html.Div(className='row',
+                                             children=[html.Div(className='col-lg-10',
+                                                                children=[html.H2(className='section-title',
+                                                                                  children=['School Comparison\t\t\t\t\t',
+                                                                                            html.Span(className='description',
+                                                                                                      children=['to compare the number of schools in each city'])])]),
+                                                       html.Div(className='col-lg-2',
+                                                                children=[html.Div(id='nav3',
+                                                                                 className='btn-group col-lg-12',
+                                                                                 role='group',
+                                                                                 children=[html.A(className='btn btn-outline-dark',
+                                                                                                  href='#property-comparison',
+                                                                                                  children=['↑']),
+                                                                                           html.A(className='btn btn-outline-dark',
+                                                                                                  href='#home',
+                                                                                                  children=['home']),
+                                                                                           html.A(className='btn btn-outline-dark',
+                                                                                                  href='#treemap',
+                                                                                                  children=['↓'])])]),
+                                                       html.Hr()])
+                                    ]), 
+                 html.Br(),
+                 html.Div(className='container-lg',
+                          children=[html.Div(className='row',
+                                             children=[html.Div(className='row justify-content-center', 
+                                                                children=[html.Div([html.P('Description', 
+                                                                                           className='p-title'), 
+                                                                                    html.P('''Presented below is graph that shows the total number of available schools per city of Manila. 
+                                                                                           This section will provide you how many schools there are in Metro Manila including the number of types 
+                                                                                           of school to fit your desired educational institution, which can be found below the initial graph''',
+                                                                                           className='p-body')],
+                                                                                   className='col-lg-6'),
+                                                                          html.Div([html.P('How to use',
+                                                                                           className='p-title'),
+                                                                                    html.P([html.Ol([html.Li('Click any of the vertical bar to view the availability of the school type'),
+                                                                                                     html.Li('Hover over your desired type of school below the initial graph to know more details'),
+                                                                                                     html.Li('Enjoy!')])],
+                                                                                           className='p-body')],
+                                                                                   className='col-lg-6')])])]),
+                 html.Br(),
+                 html.Div(className='container-lg card-full-l',
+                          children=[html.Div(className='container-lg',
+                                             children=[html.Div(className='row',
+                                                                children=[html.Div(className='col-lg-12',
+                                                                                   children=[dcc.Graph(id='bar', 
+                                                                                                       figure=data.bar_chart)])])])
+                                    ]),
+                 html.Br(),
+                 html.Div(className='container-lg card-full',
+                          children=[html.Div(className='container-lg',
+                                             children=[html.Div([html.Div(className='col-lg-12',
+                                                                          children=[dcc.Graph(id='treemap')])],
+                                                                className='row'),
+                                                       html.Br(),
+                                                       html.Div(html.Div(className='col-lg-12',
+                                                                         children=[html.P('Description',
                                                                                           className='p-title'),
-                                                                                   html.P([html.Ol([html.Li('Click any of the vertical bar to view the availability of the school type'),
-                                                                                                    html.Li('Hover over your desired type of school below the initial graph to know more details'),
-                                                                                                    html.Li('Enjoy!')])],
-                                                                                          className='p-body')],
-                                                                                  className='col-lg-6')])])]),
-                html.Br(),
-                html.Div(className='container-lg card-full-l',
-                         children=[html.Div(className='container-lg',
-                                            children=[html.Div(className='row',
-                                                               children=[html.Div(className='col-lg-12',
-                                                                                  children=[dcc.Graph(id='bar', 
-                                                                                                      figure=bar_chart)])])])
-                                   ]),
-                html.Br(),
-                html.Div(className='container-lg card-full',
-                         children=[html.Div(className='container-lg',
-                                            children=[html.Div([html.Div(className='col-lg-12',
-                                                                         children=[dcc.Graph(id='treemap')])],
-                                                               className='row'),
-                                                      html.Br(),
-                                                      html.Div(html.Div(className='col-lg-12',
-                                                                        children=[html.P('Description',
-                                                                                         className='p-title'),
-                                                                                  html.P('''The figure above shows the hierarchy of the type of schools available in your selected city. 
-                                                                                         As presented, you may have a quick perception of which school type is largely available at your desired place. 
-                                                                                         This may aid you in choosing the right school fitted to your preference. 
-                                                                                         Don’t forget you can hover on the figure itself to see more details!''',
-                                                                                         className='p-body'),
-                                                                                  html.Br(),
-                                                                                  html.Br(),
-                                                                                  html.Br()]))])]),
+                                                                                   html.P('''The figure above shows the hierarchy of the type of schools available in your selected city. 
+                                                                                          As presented, you may have a quick perception of which school type is largely available at your desired place. 
+                                                                                          This may aid you in choosing the right school fitted to your preference. 
+                                                                                          Don’t forget you can hover on the figure itself to see more details!''',
+                                                                                          className='p-body'),
+                                                                                   html.Br(),
+                                                                                   html.Br(),
+                                                                                   html.Br()]))])]),
+                 html.Br(),
+                 html.Div(id='city-ranking',
+                          className='container-lg section-header',
+                          children=[html.Div(className='row',
+                                             children=[html.Div(className='col-lg-10',
+                                                                children=[html.H2(className='section-title',
+                                                                                  children=['City Ranking\t\t\t\t\t',
+                                                                                            html.Span(className='description',
+                                                                                                      children=['to find the city that suits you best'])])]),
+                                                       html.Div(className='col-lg-2',
+                                                                children=[html.Div(id='nav4',
+                                                                                 className='btn-group col-lg-12',
+                                                                                 role='group',
+                                                                                 children=[html.A(className='btn btn-outline-dark',
+                                                                                                  href='#school-comparison',
+                                                                                                  children=['↑']),
+                                                                                           html.A(className='btn btn-outline-dark',
+                                                                                                  href='#home',
+                                                                                                  children=['home'])])]),
+                                                       html.Hr()])
+                                    ]),
+                 html.Br(),
+                 html.Div(className='container-lg card-full',
+                          children=[html.Div(className='container-lg',
+                                             children=[html.Div(className='row',
+                                                                children=[html.Div(className='col-lg-4 radio-group my-2',
+                                                                                   children=[html.Br(),
+                                                                                             html.P(['Rank'], className='description'),
+                                                                                             dbc.RadioItems(id='ranking-level',
+                                                                                                            className='btn-group radio',
+                                                                                                            inputClassName='btn-check',
+                                                                                                            labelClassName='btn btn-outline-dark',
+                                                                                                            labelCheckedClassName='active',
+                                                                                                            options=[{'label': 'cities', 'value': 'city'},
+                                                                                                                     {'label': 'districts', 'value': 'district'}],
+                                                                                                            value='city'),
+                                                                                             html.Br(),
+                                                                                             html.P('How much does each matter to you?',
+                                                                                                    className='p-title'),
+                                                                                             *[html.Div([html.P(label, className='p-body'),
+                                                                                                         dcc.Slider(id=f'weight-{feature}',
+                                                                                                                    min=0,
+                                                                                                                    max=5,
+                                                                                                                    step=1,
+                                                                                                                    value=scoring.DEFAULT_WEIGHT)])
+                                                                                               for feature, (label, _) in scoring.FEATURES.items()],
+                                                                                             html.P('''Cheaper homes and rents, higher salaries and more job posts and schools score higher. 
+                                                                                                    Districts are ranked on their own home prices and rents, and on the jobs and schools of their city.''',
+                                                                                                    className='p-body')]),
+                                                                          html.Div(className='col-lg-8',
+                                                                                   children=[dcc.Graph(id='ranking')])])])]),
+                 html.Br(),
+                 html.Br(),
                 
-                ])
+                 ])
 
 
 ########################################################CHARTING PLOTS########################################################
 #  setting mapbox access token
 px.set_mapbox_access_token('pk.eyJ1IjoicnVpemxvcmVuem9jaGF2ZXoiLCJhIjoiY2wzZHp5MTNlMDM4aDNmbzN5bjhva29ueiJ9.sKJbYBhB5MwOdBqvplljWw')
 
+#  serialized figures keyed by (callback, dataset, city, data version)
+figure_cache = FigureCache(maxsize=config.FIGURE_CACHE_SIZE)
+
+#  dataset names for the values of the amenity radio buttons
+datasets = {1: 'prop4sale', 2: 'prop4rent', 3: 'jobs'}
+
+def clicked_city(click_data, key='location'):
+       #  city name from a figure's clickData, None when nothing has been clicked yet
+       #  clickData comes from the browser, so anything but one of our cities is rejected
+       try:
+              select_city = click_data['points'][0][key]
+       except TypeError:
+              return None
+       except (KeyError, IndexError):
+              raise PreventUpdate
+       if not isinstance(select_city, str) or select_city.lower() not in city_colors:
+              raise PreventUpdate
+       return select_city.lower()
+
 #  for choropleth map 
 @app.callback( 
        Output('choropleth-map', 'figure'),
-       Input('radio-section1', 'value')
+       Input('radio-section1', 'value'),
+       prevent_initial_call=config.PRERENDER
 )
-def update_choropleth(df_num):
+def update_choropleth(df_num, data=None):
+       data = data or reloader.current
+       if not isinstance(df_num, int) or df_num not in datasets:
+              raise PreventUpdate
+       return figure_cache.get(('choropleth', datasets[df_num], None, data.version),
+                               lambda: build_choropleth(data, df_num))
+
+def build_choropleth(data, df_num):
        if df_num == 1:
-              choro_map = px.choropleth_mapbox(ave_prop4sale_city, 
-                                               geojson=ave_prop4sale_city.geometry,
-                                               locations=ave_prop4sale_city.index, 
+              choro_map = px.choropleth_mapbox(data.ave_prop4sale_city, 
+                                               geojson=geodata.feature_collection(data.ave_prop4sale_city),
+                                               locations=data.ave_prop4sale_city.index, 
                                                color='price', 
                                                center={'lat': 14.60886, 'lon': 121.037402},
                                                mapbox_style='light',
@@ -426,9 +713,9 @@ def update_choropleth(df_num):
                                              'yanchor': 'top',
                                              'font': {'size': 18}})  
        elif df_num == 2:
-              choro_map = px.choropleth_mapbox(ave_prop4rent_city, 
-                                               geojson=ave_prop4rent_city.geometry,
-                                               locations=ave_prop4rent_city.index, 
+              choro_map = px.choropleth_mapbox(data.ave_prop4rent_city, 
+                                               geojson=geodata.feature_collection(data.ave_prop4rent_city),
+                                               locations=data.ave_prop4rent_city.index, 
                                                color='price', 
                                                center={'lat': 14.60886, 'lon': 121.037402},
                                                mapbox_style='light',
@@ -443,9 +730,9 @@ def update_choropleth(df_num):
                                              'yanchor': 'top',
                                              'font': {'size': 18}})  
        else:
-              choro_map = px.choropleth_mapbox(ave_jobs_city, 
-                                               geojson=ave_jobs_city.geometry,
-                                               locations=ave_jobs_city.index, 
+              choro_map = px.choropleth_mapbox(data.ave_jobs_city, 
+                                               geojson=geodata.feature_collection(data.ave_jobs_city),
+                                               locations=data.ave_jobs_city.index, 
                                                color='salary', 
                                                center={'lat': 14.60886, 'lon': 121.037402},
                                                mapbox_style='light',
@@ -471,11 +758,18 @@ room_colors = {'1.0': px.colors.qualitative.Plotly[0],
        Input('radio-section1', 'value'),
        Input('choropleth-map', 'clickData')
 )
-def update_varbar(df_num, city):
+def update_varbar(df_num, city, data=None):
+       data = data or reloader.current
+       if not isinstance(df_num, int) or df_num not in datasets:
+              raise PreventUpdate
+       city = clicked_city(city)
+       return figure_cache.get(('varbar', datasets[df_num], city, data.version),
+                               lambda: build_varbar(data, df_num, city))
+
+def build_varbar(data, df_num, select_city):
        if df_num == 1: #  scatter of floor_area and property price 
-              try: 
-                     select_city = city['points'][0]["location"]
-                     df = prop4sale.query(f'city == "{select_city}"')
+              if select_city is not None:
+                     df = data.prop4sale_by_city[select_city]
                      scatter = px.scatter(df,
                                           x='floor_area',
                                           y='price',
@@ -493,8 +787,8 @@ def update_varbar(df_num, city):
                                                'font': {'size': 18}})
                      scatter.update_layout(legend_title_text='# of Bedrooms')  
                      return scatter                   
-              except TypeError:
-                     df = prop4sale
+              else:
+                     df = data.prop4sale
                      scatter = px.scatter(df,
                                           x='floor_area',
                                           y='price',
@@ -514,9 +808,8 @@ def update_varbar(df_num, city):
                      return scatter
        
        elif df_num == 2: #  scatter of floor_area and property price 
-              try: 
-                     select_city = city['points'][0]["location"]
-                     df = prop4rent.query(f'city == "{select_city}"')
+              if select_city is not None:
+                     df = data.prop4rent_by_city[select_city]
                      scatter = px.scatter(df,
                                           x='floor_area',
                                           y='price',
@@ -534,8 +827,8 @@ def update_varbar(df_num, city):
                                                'font': {'size': 18}})  
                      scatter.update_layout(legend_title_text='# of Bedrooms') 
                      return scatter                   
-              except TypeError:
-                     df = prop4rent
+              else:
+                     df = data.prop4rent
                      scatter = px.scatter(df,
                                           x='floor_area',
                                           y='price',
@@ -555,9 +848,8 @@ def update_varbar(df_num, city):
                      return scatter
        
        else:  #  bar chart of 
-              try: 
-                     select_city = city['points'][0]["location"]
-                     df = jobs.query(f'city == "{select_city}"').company.value_counts().head(10).sort_values(ascending=True)
+              if select_city is not None:
+                     df = data.jobs_by_city[select_city].company.value_counts().head(10).sort_values(ascending=True)
                      barh = px.bar(df, 
                                    x=df.values,
                                    y=df.index,
@@ -566,7 +858,7 @@ def update_varbar(df_num, city):
                                    template='plotly_white',
                                    height=420,
                                    text=df.values,
-                                   color_discrete_sequence=[city_colors[city['points'][0]["location"]]],
+                                   color_discrete_sequence=[city_colors[select_city]],
                                    title=f'Top Ten Companies with Most Job Openings in {select_city.capitalize()} City')
                      barh.update_traces(textposition='outside')
                      barh.update_layout(title={'y':0.9,
@@ -576,8 +868,8 @@ def update_varbar(df_num, city):
                                'font': {'size': 18}})  
                      
                      return barh
-              except TypeError:
-                     df = jobs.company.value_counts().head(10).sort_values(ascending=True)
+              else:
+                     df = data.jobs.company.value_counts().head(10).sort_values(ascending=True)
                      barh = px.bar(df,
                                    x=df.values,
                                    y=df.index,
@@ -597,6 +889,16 @@ def update_varbar(df_num, city):
                      
                      return barh
 
+#  bin counts of a city's values (every city's for None), taken from the city aggregates,
+#  so the histogram carries one bar per bin instead of every row
+@snapshot.cached(maxsize=64)
+def binned(data, name, city):
+       summary = data.city_aggregates[name][city]
+       counts, edges = summary.histogram(aggregates.bin_edges(summary.low, summary.high, config.HISTOGRAM_BINS))
+       return pd.DataFrame({aggregates.COLUMNS[name]: (edges[:-1] + edges[1:]) / 2,
+                            'count': counts,
+                            'range': [f'{low:,.0f} to {high:,.0f}' for low, high in zip(edges[:-1], edges[1:])]})
+
 average_colors = {'mean': px.colors.qualitative.Light24[0],
                   'median': px.colors.qualitative.Light24[1]}
 
@@ -606,189 +908,220 @@ average_colors = {'mean': px.colors.qualitative.Light24[0],
 @app.callback(
        Output('histogram', 'figure'),
        Input('radio-section1', 'value'),
-       Input('choropleth-map', 'clickData')
+       Input('choropleth-map', 'clickData'),
+       prevent_initial_call=config.PRERENDER
 )
-def update_histogram(df_num, city):
+def update_histogram(df_num, city, data=None):
+       data = data or reloader.current
+       if not isinstance(df_num, int) or df_num not in datasets:
+              raise PreventUpdate
+       city = clicked_city(city)
+       return figure_cache.get(('histogram', datasets[df_num], city, data.version),
+                               lambda: build_histogram(data, df_num, city))
+
+def build_histogram(data, df_num, select_city):
        if df_num == 1:
-              try:
-                     select_city = city['points'][0]["location"]
-                     df = prop4sale.query(f'city == "{select_city}"')
-                     hist = px.histogram(df, 
-                                         x='price',
-                                         title = f'Distribution of Property Prices in {select_city.capitalize()} City', 
-                                         height=420,
-                                         color_discrete_sequence=[city_colors[city['points'][0]["location"]]],
-                                         template='plotly_white')
+              if select_city is not None:
+                     df = binned(data, 'prop4sale', select_city)
+                     summary = data.city_aggregates['prop4sale'][select_city]
+                     hist = px.bar(df, 
+                                   x='price',
+                                   y='count',
+                                   hover_data={'price': False, 'range': True},
+                                   title = f'Distribution of Property Prices in {select_city.capitalize()} City',
+                                   height=420,
+                                   color_discrete_sequence=[city_colors[select_city]],
+                                   template='plotly_white')
                      hist.update_layout(title={'y':0.9,
                                                'x':0.5,
                                                'xanchor': 'center',
                                                'yanchor': 'top',
                                                'font': {'size': 18}})  
+                     hist.update_layout(bargap=0)
                      hist.add_vline(type="line", 
                                     line_color=average_colors['mean'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dashdot",
-                                    x=df.price.mean(),
+                                    x=summary.mean,
                                     annotation_text='Mean')
                      hist.add_vline(type="line", 
                                     line_color=average_colors['median'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dot",
-                                    x=df.price.median(),
+                                    x=summary.median,
                                     annotation_text='Median',
                                     annotation_position='top left'
                                     )
                      return hist
-              except TypeError:
-                     df = prop4sale
-                     hist = px.histogram(df, x='price', 
-                                         height=420, 
-                                         color_discrete_sequence=['#b30000'],
-                                         title = 'Distribution of Property Prices in Select Cities',
-                                         template='plotly_white')
+              else:
+                     df = binned(data, 'prop4sale', None)
+                     summary = data.city_aggregates['prop4sale'][None]
+                     hist = px.bar(df, 
+                                   x='price',
+                                   y='count',
+                                   hover_data={'price': False, 'range': True},
+                                   height=420,
+                                   color_discrete_sequence=['#b30000'],
+                                   title = 'Distribution of Property Prices in Select Cities',
+                                   template='plotly_white')
                      hist.update_layout(title={'y':0.9,
                                                'x':0.5,
                                                'xanchor': 'center',
                                                'yanchor': 'top',
                                                'font': {'size': 18}})  
+                     hist.update_layout(bargap=0)
                      hist.add_vline(type="line", 
                                     line_color=average_colors['mean'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dashdot",
-                                    x=df.price.mean(),
+                                    x=summary.mean,
                                     annotation_text='Mean')
                      hist.add_vline(type="line", 
                                     line_color=average_colors['median'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dot",
-                                    x=df.price.median(),
+                                    x=summary.median,
                                     annotation_text='Median',
                                     annotation_position='top left'
                                     )
                      return hist
        elif df_num == 2:
-              try:
-                     select_city = city['points'][0]["location"]
-                     df = prop4rent.query(f'city == "{select_city}"')
-                     hist = px.histogram(df, 
-                                         x='price', 
-                                         title = f'Distribution of Rental Prices in {select_city.capitalize()} City',
-                                         height=420,
-                                         color_discrete_sequence= [city_colors[city['points'][0]["location"]]],
-                                         template='plotly_white')
+              if select_city is not None:
+                     df = binned(data, 'prop4rent', select_city)
+                     summary = data.city_aggregates['prop4rent'][select_city]
+                     hist = px.bar(df, 
+                                   x='price',
+                                   y='count',
+                                   hover_data={'price': False, 'range': True},
+                                   title = f'Distribution of Rental Prices in {select_city.capitalize()} City',
+                                   height=420,
+                                   color_discrete_sequence= [city_colors[select_city]],
+                                   template='plotly_white')
                      hist.update_layout(title={'y':0.9,
                                                'x':0.5,
                                                'xanchor': 'center',
                                                'yanchor': 'top',
                                                'font': {'size': 18}})  
+                     hist.update_layout(bargap=0)
                      hist.add_vline(type="line", 
                                     line_color=average_colors['mean'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dashdot",
-                                    x=df.price.mean(),
+                                    x=summary.mean,
                                     annotation_text='Mean')
                      hist.add_vline(type="line", 
                                     line_color=average_colors['median'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dot",
-                                    x=df.price.median(),
+                                    x=summary.median,
                                     annotation_text='Median',
                                     annotation_position='top left'
                                     )
                      return hist
-              except TypeError:
-                     df = prop4rent
-                     hist = px.histogram(df, 
-                                         x='price', 
-                                         height=420,
-                                         color_discrete_sequence=['#004999'],
-                                         title = 'Distribution of Rental Prices in Select Cities',
-                                         template='plotly_white')
+              else:
+                     df = binned(data, 'prop4rent', None)
+                     summary = data.city_aggregates['prop4rent'][None]
+                     hist = px.bar(df, 
+                                   x='price',
+                                   y='count',
+                                   hover_data={'price': False, 'range': True},
+                                   height=420,
+                                   color_discrete_sequence=['#004999'],
+                                   title = 'Distribution of Rental Prices in Select Cities',
+                                   template='plotly_white')
                      hist.update_layout(title={'y':0.9,
                                                'x':0.5,
                                                'xanchor': 'center',
                                                'yanchor': 'top',
                                                'font': {'size': 18}})  
+                     hist.update_layout(bargap=0)
                      hist.add_vline(type="line", 
                                     line_color=average_colors['mean'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dashdot",
-                                    x=df.price.mean(),
+                                    x=summary.mean,
                                     annotation_text='Mean')
                      hist.add_vline(type="line", 
                                     line_color=average_colors['median'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dot",
-                                    x=df.price.median(),
+                                    x=summary.median,
                                     annotation_text='Median',
                                     annotation_position='top left'
                                     )
                      return hist
        else:
-              try:
-                     select_city = city['points'][0]["location"]
-                     df = jobs.query(f'city == "{select_city}"')
-                     hist = px.histogram(df, 
-                                         x='salary', 
-                                         title = f'Distribution of Salaries Offered in {select_city.capitalize()} City',
-                                         height=420,
-                                         color_discrete_sequence= [city_colors[city['points'][0]["location"]]],
-                                         template='plotly_white')
+              if select_city is not None:
+                     df = binned(data, 'jobs', select_city)
+                     summary = data.city_aggregates['jobs'][select_city]
+                     hist = px.bar(df, 
+                                   x='salary',
+                                   y='count',
+                                   hover_data={'salary': False, 'range': True},
+                                   title = f'Distribution of Salaries Offered in {select_city.capitalize()} City',
+                                   height=420,
+                                   color_discrete_sequence= [city_colors[select_city]],
+                                   template='plotly_white')
                      hist.update_layout(title={'y':0.9,
                                                'x':0.5,
                                                'xanchor': 'center',
                                                'yanchor': 'top',
                                                'font': {'size': 18}})  
+                     hist.update_layout(bargap=0)
                      hist.add_vline(type="line", 
                                     line_color=average_colors['mean'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dashdot",
-                                    x=df.salary.mean(),
+                                    x=summary.mean,
                                     annotation_text='Mean')
                      hist.add_vline(type="line", 
                                     line_color=average_colors['median'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dot",
-                                    x=df.salary.median(),
+                                    x=summary.median,
                                     annotation_text='Median',
                                     annotation_position='top left')
                      return hist 
-              except TypeError:
-                     df = jobs
-                     hist = px.histogram(df, 
-                                         x='salary', 
-                                         height=420,
-                                         color_discrete_sequence=['#357a38'],
-                                         title = 'Distribution of Salaries in Select Cities',
-                                         template='plotly_white')
+              else:
+                     df = binned(data, 'jobs', None)
+                     summary = data.city_aggregates['jobs'][None]
+                     hist = px.bar(df, 
+                                   x='salary',
+                                   y='count',
+                                   hover_data={'salary': False, 'range': True},
+                                   height=420,
+                                   color_discrete_sequence=['#357a38'],
+                                   title = 'Distribution of Salaries in Select Cities',
+                                   template='plotly_white')
                      hist.update_layout(title={'y':0.9,
                                                'x':0.5,
                                                'xanchor': 'center',
                                                'yanchor': 'top',
                                                'font': {'size': 18}}) 
+                     hist.update_layout(bargap=0)
                      hist.add_vline(type="line", 
                                     line_color=average_colors['mean'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dashdot",
-                                    x=df.salary.mean(),
+                                    x=summary.mean,
                                     annotation_text='Mean')
                      hist.add_vline(type="line", 
                                     line_color=average_colors['median'], 
                                     line_width=3, 
                                     opacity=1, 
                                     line_dash="dot",
-                                    x=df.salary.median(),
+                                    x=summary.median,
                                     annotation_text='Median',
                                     annotation_position='top left')
                      return hist
@@ -799,28 +1132,105 @@ def update_histogram(df_num, city):
        Output('slider-scatter', 'max'),
        Output('slider-scatter', 'value'),
        Input('radio-section2', 'value'),
+       prevent_initial_call=config.PRERENDER
 )
-def update_slider(df_num):       
+def update_slider(df_num, data=None):       
+       data = data or reloader.current
        if df_num == 1:
-              df = prop4sale_geo
+              df = data.prop4sale_geo
               
-       if df_num == 2:
-              df = prop4rent
+       elif df_num == 2:
+              df = data.prop4rent_geo
+       else:
+              raise PreventUpdate
               
        mini = df.price.min()
        maxi = df.price.max()
-       value = df.price.median()
+       value = [mini, df.price.median()]
        return mini, maxi, value
-       
+
+#  for the listing filters' sliders
+def update_filters(df_num, data=None):
+       data = data or reloader.current
+       if df_num not in (1, 2):
+              raise PreventUpdate
+       filters = data.prop4sale_geo_filters if df_num == 1 else data.prop4rent_filters
+       outputs = []
+       for column in listing_filters:
+              mini, maxi = filters.bounds(column)
+              outputs += [mini, maxi, [mini, maxi]]
+       return outputs
+
+if not config.SCATTER_CLIENTSIDE:
+       app.callback(*[Output(f'filter-{column}', prop) for column in listing_filters for prop in ('min', 'max', 'value')],
+                    Input('radio-section2', 'value'),
+                    prevent_initial_call=config.PRERENDER)(update_filters)
+
+@snapshot.cached(maxsize=128)
+def scatter_points(data, df_num, prices, extent=None, near=None, ranges=(), cities=None):
+       #  listings within the price range (in view, near a district, and within the other
+       #  filters), thinned out when there are more than the map can draw
+       index = data.prop4sale_geo_by_price if df_num == 1 else data.prop4rent_by_price
+       in_budget = index.between(*prices)
+       df = in_budget
+       positions = []
+       if extent is not None:
+              grid = data.prop4sale_geo_grid if df_num == 1 else data.prop4rent_grid
+              positions.append(grid.query(extent))
+       if near is not None:
+              positions.append((data.prop4sale_near if df_num == 1 else data.prop4rent_near).near_district(*near))
+       if positions or ranges or cities is not None:
+              #  every filter is a bitmap over the price-sorted listings, and together their AND
+              filters = data.prop4sale_geo_filters if df_num == 1 else data.prop4rent_filters
+              df = index.frame.take(filters.select({'price': prices, **{column: (low, high) for column, low, high in ranges}},
+                                                   {} if cities is None else {'city': cities},
+                                                   positions))
+       thinned = downsample.thin(df, config.SCATTER_MAX_POINTS)
+       #  the color scale keeps spanning every listing in budget, not just the sample in view
+       price_range = None if len(thinned) == len(in_budget) else (in_budget.price.iloc[0], in_budget.price.iloc[-1])
+       return thinned, price_range, len(df)
+
+def viewport(data, df_num, relayout):
+       #  visible extent of the scatter map once it has been panned or zoomed, widened to
+       #  whole grid cells so that nearby views share their cached points
+       #  relayoutData comes from the browser: anything but four finite (lon, lat) corners
+       #  is ignored and the whole extent shown
+       try:
+              corners = [(float(lon), float(lat)) for lon, lat in relayout['mapbox._derived']['coordinates']]
+       except (KeyError, TypeError, ValueError):
+              return None
+       if len(corners) != 4 or not all(math.isfinite(value) for corner in corners for value in corner):
+              return None
+       lons, lats = zip(*corners)
+       grid = data.prop4sale_geo_grid if df_num == 1 else data.prop4rent_grid
+       return grid.snap((min(lons), min(lats), max(lons), max(lats)))
+
+def thinned_note(scatter_map, shown, total):
+       if shown < total:
+              scatter_map.add_annotation(text=f'showing {shown:,} of {total:,} listings',
+                                         xref='paper', yref='paper', x=0, y=0,
+                                         showarrow=False, bgcolor='white')
+
 #  for scatter map 
-@app.callback(
-       Output('scatter-map', 'figure'),
-       Input('radio-section2', 'value'),
-       Input('slider-scatter', 'value')
-)
-def update_scatter(df_num, budget):
+def update_scatter(df_num, prices, relayout=None, district=None, km=None, cities=None, *bounds, data=None):
+       data = data or reloader.current
+       if df_num not in (1, 2):
+              raise PreventUpdate
+       try:
+              #  a (low, high) pair; unpacking rejects any other length
+              low, high = prices
+              prices = (float(low), float(high))
+              ranges = tuple((column, float(value[0]), float(value[1]))
+                             for column, value in zip(listing_filters, bounds) if value)
+              near = (district, float(km)) if district in data.district_centres.index and km else None
+              cities = tuple(sorted(cities)) if cities else None
+       except (TypeError, ValueError, IndexError):
+              raise PreventUpdate
+       df, price_range, total = scatter_points(data, df_num, prices, viewport(data, df_num, relayout), near, ranges, cities)
+       return build_scatter(df_num, df, price_range, total)
+
+def build_scatter(df_num, df, price_range=None, total=0):
        if df_num == 1:
-              df = prop4sale_geo.query(f"price <= {budget}")
               scatter_map = px.scatter_mapbox(df, 
                                               lat="latitude", 
                                               lon="longitude",
@@ -831,12 +1241,15 @@ def update_scatter(df_num, budget):
                                               center={'lat': 14.59665, 'lon': 121.0369}, 
                                               zoom=11.5, 
                                               opacity=.5,
+                                              range_color=price_range,
                                               color_continuous_scale=px.colors.sequential.OrRd)
+              #  uirevision keeps the map where it was panned or zoomed to as the listings change
               scatter_map.update_layout(transition=dict(duration=1400,
-                                                    easing="circle-in"))
+                                                    easing="circle-in"),
+                                        uirevision='scatter-map')
+              thinned_note(scatter_map, len(df), total)
               return scatter_map 
        else:
-              df = prop4rent.query(f"price <= {budget}")
               scatter_map = px.scatter_mapbox(df, 
                                               lat="latitude", 
                                               lon="longitude",
@@ -847,12 +1260,47 @@ def update_scatter(df_num, budget):
                                               center={'lat': 14.5663, 'lon': 121.0372}, 
                                               zoom=12, 
                                               opacity=.5,
+                                              range_color=price_range,
                                               color_continuous_scale=px.colors.sequential.algae)
+              #  uirevision keeps the map where it was panned or zoomed to as the listings change
               scatter_map.update_layout(transition=dict(duration=1400,
-                                                    easing="circle-in"))
+                                                    easing="circle-in"),
+                                        uirevision='scatter-map')
+              thinned_note(scatter_map, len(df), total)
               
               return scatter_map
 
+@snapshot.cached(maxsize=1)
+def scatter_payloads(data):
+       #  with SCATTER_CLIENTSIDE, the browser filters a one-time payload of every listing
+       #  (assets/scatter.js), fetched once the page is up rather than sent with the layout
+       if not config.SCATTER_CLIENTSIDE:
+              return None
+       return {df_num: clientside.scatter_payload(df, build_scatter(df_num, df.iloc[:1]))
+               for df_num, df in [(1, scatter_points(data, 1, (-float('inf'), float('inf')))[0]),
+                                  (2, scatter_points(data, 2, (-float('inf'), float('inf')))[0])]}
+
+if config.SCATTER_CLIENTSIDE:
+       #  the store's id never changes, so this only runs on page load
+       @app.callback(Output('scatter-data', 'data'), Input('scatter-data', 'id'))
+       def load_scatter_data(_, data=None):
+              return scatter_payloads(data or reloader.current)
+
+       app.clientside_callback(ClientsideFunction(namespace='scatter', function_name='filter'),
+                               Output('scatter-map', 'figure'),
+                               Input('radio-section2', 'value'),
+                               Input('slider-scatter', 'value'),
+                               Input('scatter-data', 'data'))
+else:
+       app.callback(Output('scatter-map', 'figure'),
+                    Input('radio-section2', 'value'),
+                    Input('slider-scatter', 'value'),
+                    Input('scatter-map', 'relayoutData'),
+                    Input('near-district', 'value'),
+                    Input('near-km', 'value'),
+                    Input('filter-cities', 'value'),
+                    *[Input(f'filter-{column}', 'value') for column in listing_filters])(update_scatter)
+
 curr_colors = {'Purely ES': '#9d915a',
                'All Offering (K to 12)': '#b35f44',
                'ES and JHS (K to 10)': '#96999b',
@@ -865,16 +1313,21 @@ curr_colors = {'Purely ES': '#9d915a',
        Output('treemap', 'figure'),
        Input('bar', 'clickData')
 )
-def update_treemap(location):
-       try:
-              select_city = location['points'][0]["x"]
-              df = schools.query(f'city == "{select_city.lower()}"')
+def update_treemap(location, data=None):
+       data = data or reloader.current
+       city = clicked_city(location, key='x')
+       return figure_cache.get(('treemap', 'schools', city, data.version),
+                               lambda: build_treemap(data, city))
+
+def build_treemap(data, select_city):
+       if select_city is not None:
+              df = data.schools_by_city[select_city]
               treemap = px.treemap(df, 
                                    path=['sector','curricular_class', 'school_name'], 
                                    width=1200,
                                    height=1000, 
                                    color='curricular_class',
-                                   title=f'Schools in {select_city} City Grouped According to its Sector and Curricular Offering',
+                                   title=f'Schools in {select_city.capitalize()} City Grouped According to its Sector and Curricular Offering',
                                    color_discrete_map=curr_colors)
               treemap.update_layout(transition=dict(duration=750,
                                                     easing="quad"))
@@ -885,8 +1338,8 @@ def update_treemap(location):
                                             'font': {'size': 25}})
               treemap.update_traces(root_color="#98b2d1")
               return treemap
-       except TypeError:
-              df = schools
+       else:
+              df = data.schools
               treemap = px.treemap(df, 
                                    path=['sector','curricular_class', 'school_name'], 
                                    width=1200,
@@ -903,6 +1356,133 @@ def update_treemap(location):
                                             'font': {'size': 26}})  
               treemap.update_traces(root_color="#98b2d1") 
               return treemap
+
+#  for city ranking
+#  districts shown at most
+RANKING_TOP = 15
+
+#  rankings get a small cache of their own: every slider position is a new key, and they
+#  would otherwise push the map, chart and treemap figures out of figure_cache
+ranking_cache = FigureCache(maxsize=32)
+
+@app.callback(
+       Output('ranking', 'figure'),
+       Input('ranking-level', 'value'),
+       *[Input(f'weight-{feature}', 'value') for feature in scoring.FEATURES]
+)
+def update_ranking(level, *weights, data=None):
+       data = data or reloader.current
+       #  the level and the slider values come from the browser, so anything else is rejected
+       if not isinstance(level, str) or level not in data.city_scorers:
+              raise PreventUpdate
+       try:
+              weights = tuple(data.city_scorers[level].weights([weight or 0 for weight in weights]))
+       except (ValueError, TypeError):
+              raise PreventUpdate
+       return ranking_cache.get(('ranking', level, weights, data.version),
+                                lambda: build_ranking(data, level, weights))
+
+def build_ranking(data, level, weights):
+       scorer = data.city_scorers[level]
+       df = pd.DataFrame(scorer.rank(scorer.weights(weights), top=RANKING_TOP),
+                         columns=['place', 'city', 'score'])
+       ranking = px.bar(df,
+                        x='score',
+                        y='place',
+                        orientation='h',
+                        color='city',
+                        color_discrete_map=city_colors,
+                        height=600,
+                        range_x=[0, 100],
+                        template='plotly_white',
+                        labels={'score': 'score (0-100)', 'place': ''},
+                        title='Best Cities for You' if level == 'city' else 'Best Districts for You')
+       ranking.update_layout(title={'y':0.95,
+                                    'x':0.5,
+                                    'xanchor': 'center',
+                                    'yanchor': 'top',
+                                    'font': {'size': 22}})
+       ranking.update_yaxes(categoryorder='total ascending')
+       return ranking
+
+#  every snapshot of the data comes with its own layout, and with the figures built from it
+#  up front when that is turned on
+def build_snapshot(version):
+       #  one process at a time, so what is written to data/store for this version (derived
+       #  frames and indexes, aggregates, the first paint) is written once, by the first
+       #  process to get here, and the others find it complete
+       with datastore.locked():
+              return build_locked(version)
+
+def build_locked(version):
+       data = load_data(version)
+       data.layout = build_layout(data)
+       scatter_payloads(data)
+
+       #  building every figure up front moves the plotly express cost to startup
+       if config.FIGURE_CACHE_WARM:
+              with startup.phase('warm figure cache'):
+                     for df_num in datasets:
+                            update_choropleth(df_num, data=data)
+                            for city in [None, *city_colors]:
+                                   click = None if city is None else {'points': [{'location': city}]}
+                                   update_varbar(df_num, click, data=data)
+                                   update_histogram(df_num, click, data=data)
+                     for city in [None, *city_colors]:
+                            update_treemap(None if city is None else {'points': [{'x': city.capitalize()}]}, data=data)
+
+       #  first paint: what the initial callbacks of the top of the page would return goes
+       #  straight into the layout. The variable chart, scatter map, treemap and ranking are
+       #  left to their initial callbacks, their figures would make the layout megabytes long
+       if config.PRERENDER:
+              with startup.phase('pre-render first paint'):
+                     initial = prerender.snapshot(f'{version}-{code_version}', lambda: {
+                            'choropleth-map.figure': update_choropleth(1, data=data),
+                            'histogram.figure': update_histogram(1, None, data=data),
+                            **dict(zip(['slider-scatter.min', 'slider-scatter.max', 'slider-scatter.value'],
+                                       update_slider(1, data=data)))})
+                     prerender.fill(data.layout, initial)
+       return data
+
+#  the snapshot every callback reads, swapped for a new one once the data changes on disk
+#  (see snapshot.py)
+reloader = snapshot.Reloader(build_snapshot, interval=config.RELOAD_INTERVAL)
+reloader.install(server)
+
+#  figures of older data versions go when their snapshot does
+@reloader.on_swap
+def evict_figures(data):
+       figure_cache.evict(lambda key: key[-1] != data.version)
+       ranking_cache.evict(lambda key: key[-1] != data.version)
+
+app.layout = lambda: reloader.current.layout
+if config.PRERENDER:
+       prerender.serve_layout(app, lambda: reloader.current)
+
+#  place rankings as JSON, at /api/rank (see scoring.py)
+scoring.routes(server, lambda: reloader.current.city_scorers)
+
+#  listings around a district or position as JSON, at /api/nearby (see proximity.py)
+proximity.routes(server, lambda: {'prop4sale': reloader.current.prop4sale_near,
+                                  'prop4rent': reloader.current.prop4rent_near})
+
+#  data version being served, to check that a deployment has picked up new data
+@server.route('/_data-version')
+def data_version():
+       return flask.jsonify(version=reloader.current.version,
+                            loaded=reloader.current.loaded,
+                            reloading=reloader.reloading)
+
+#  cache counters, to check the hit rate of a running deployment
+@server.route('/_figure-cache')
+def figure_cache_stats():
+       return flask.jsonify(figures=figure_cache.stats(), rankings=ranking_cache.stats())
+
+#  latency and payload histograms of every callback, served at /metrics
+metrics.instrument(app, {'figures': figure_cache, 'rankings': ranking_cache})
+
+#  startup timings, written only when STARTUP_PROFILE is set
+startup.write_report()
               
               
 #  runs server
@@ -0,0 +1,48 @@
+/*  conditional callback requests, see httpcache.py
+    browsers never cache POST responses, so the callback responses that came with an ETag
+    are kept here by request body; asking for the same outputs again sends that ETag, and
+    a 304 from the server is answered with the kept response */
+(function () {
+    //  responses kept at most, the least recently used is dropped first
+    var MAX_RESPONSES = 64;
+
+    var responses = new Map();
+    var fetch = window.fetch.bind(window);
+
+    function isCallback(url, init) {
+        return init && init.method === 'POST' && typeof init.body === 'string' &&
+            String(url).indexOf('_dash-update-component') !== -1;
+    }
+
+    window.fetch = function (url, init) {
+        if (!isCallback(url, init)) {
+            return fetch(url, init);
+        }
+        var kept = responses.get(init.body);
+        if (kept) {
+            var headers = new Headers(init.headers);
+            headers.set('If-None-Match', kept.etag);
+            init = Object.assign({}, init, {headers: headers});
+        }
+        return fetch(url, init).then(function (res) {
+            if (res.status === 304 && kept) {
+                responses.delete(init.body);
+                responses.set(init.body, kept);
+                return new Response(kept.text, {status: 200, headers: kept.headers});
+            }
+            var etag = res.headers.get('ETag');
+            if (res.status !== 200 || !etag) {
+                return res;
+            }
+            return res.text().then(function (text) {
+                var entry = {etag: etag, text: text, headers: {'Content-Type': res.headers.get('Content-Type') || 'application/json'}};
+                responses.delete(init.body);
+                responses.set(init.body, entry);
+                if (responses.size > MAX_RESPONSES) {
+                    responses.delete(responses.keys().next().value);
+                }
+                return new Response(text, {status: 200, headers: entry.headers});
+            });
+        });
+    };
+})();
@@ -0,0 +1,70 @@
+/*  clientside filtering of the scatter map, see clientside.py
+    the payload holds every listing sorted by price, so the listings within a price range
+    are the run found by two binary searches over the prices */
+(function () {
+    function decode(text, ArrayType) {
+        var bytes = Uint8Array.from(atob(text), function (c) { return c.charCodeAt(0); });
+        return new ArrayType(bytes.buffer);
+    }
+
+    //  decoded columns, kept per payload object so they are decoded only once
+    var decoded = new WeakMap();
+
+    function columns(payload) {
+        if (!decoded.has(payload)) {
+            decoded.set(payload, {
+                price: decode(payload.price, Float64Array),
+                latitude: decode(payload.latitude, Float32Array),
+                longitude: decode(payload.longitude, Float32Array)
+            });
+        }
+        return decoded.get(payload);
+    }
+
+    //  number of sorted values that are < limit
+    function lowerBound(values, limit) {
+        var lo = 0, hi = values.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >>> 1;
+            if (values[mid] < limit) { lo = mid + 1; } else { hi = mid; }
+        }
+        return lo;
+    }
+
+    //  number of sorted values that are <= limit
+    function upperBound(values, limit) {
+        var lo = 0, hi = values.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >>> 1;
+            if (values[mid] <= limit) { lo = mid + 1; } else { hi = mid; }
+        }
+        return lo;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        scatter: {
+            filter: function (df_num, prices, data) {
+                if (!data || !Array.isArray(prices) || prices.length !== 2) {
+                    return window.dash_clientside.no_update;
+                }
+                var payload = data[df_num];
+                if (!payload) {
+                    return window.dash_clientside.no_update;
+                }
+                var cols = columns(payload);
+                var start = lowerBound(cols.price, prices[0]);
+                var stop = upperBound(cols.price, prices[1]);
+                stop = Math.max(start, stop);
+                var trace = Object.assign({}, payload.figure.data[0], {
+                    lat: Array.from(cols.latitude.subarray(start, stop)),
+                    lon: Array.from(cols.longitude.subarray(start, stop)),
+                    hovertext: payload.listing.slice(start, stop),
+                    marker: Object.assign({}, payload.figure.data[0].marker, {
+                        color: Array.from(cols.price.subarray(start, stop))
+                    })
+                });
+                return {data: [trace], layout: payload.figure.layout};
+            }
+        }
+    });
+})();
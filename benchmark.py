@@ -0,0 +1,199 @@
+#  benchmarks for the dashboard's startup and callbacks
+#  every scale runs in a fresh interpreter: the cleaned datasets are replicated `scale`
+#  times (with jittered prices and coordinates, so no two rows are identical) into a
+#  temporary data directory, `app` is imported against it, and every callback is driven
+#  through all of its input combinations with the figure caches cleared, so each call
+#  does the full work. Results are written as JSON so runs can be compared.
+#
+#  usage: python benchmark.py --scales 1 10 100 --output bench.json
+#         python benchmark.py --data data/synthetic     (data made by synthetic.py)
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def percentiles(samples):
+    samples = np.asarray(samples)
+    return {'p50': float(np.percentile(samples, 50)),
+            'p90': float(np.percentile(samples, 90)),
+            'p99': float(np.percentile(samples, 99)),
+            'mean': float(samples.mean()),
+            'min': float(samples.min()),
+            'max': float(samples.max())}
+
+
+def scale_datasets(scale, directory, seed=0):
+    """Write every cleaned dataset, replicated `scale` times, into `directory`."""
+    import pandas as pd
+    import datastore
+
+    rng = np.random.default_rng(seed)
+    for name in datastore.SOURCES:
+        df = pd.read_csv(datastore.source_path(name), index_col=0)
+        if scale > 1:
+            df = pd.concat([df] * scale, ignore_index=True)
+            for col, spread in (('price', .05), ('salary', .05)):
+                if col in df:
+                    df[col] = (df[col] * rng.normal(1, spread, len(df))).round(-2).clip(lower=100)
+            for col in ('latitude', 'longitude'):
+                if col in df:
+                    df[col] = df[col] + rng.normal(0, .001, len(df))
+        df.to_csv(os.path.join(directory, datastore.SOURCES[name]))
+
+
+def use_data(directory):
+    import datastore
+    datastore.SOURCE_DIR = directory
+    datastore.STORE_DIR = os.path.join(directory, 'store')
+
+
+def arguments(app):
+    """(callback name, arguments) for every input combination of every callback."""
+    data = app.reloader.current
+    clicks = [None] + [{'points': [{'location': city}]} for city in app.city_colors]
+    for df_num in (1, 2, 3):
+        yield 'update_choropleth', (df_num,)
+        for click in clicks:
+            yield 'update_varbar', (df_num, click)
+            yield 'update_histogram', (df_num, click)
+    for df_num in (1, 2):
+        yield 'update_slider', (df_num,)
+        index = data.prop4sale_geo_by_price if df_num == 1 else data.prop4rent_by_price
+        prices = [float(index.frame.price.min()), float(index.frame.price.max())]
+        for budget in np.percentile(index.frame.price, [10, 50, 90, 100]):
+            yield 'update_scatter', (df_num, [prices[0], float(budget)])
+        #  zoomed in on the middle of the map
+        corners = [[121.02, 14.57], [121.06, 14.57], [121.06, 14.54], [121.02, 14.54]]
+        yield 'update_scatter', (df_num, prices, {'mapbox._derived': {'coordinates': corners}})
+        #  within 2 km of the district with the most listings
+        district = data.district_centres['listings'].idxmax()
+        yield 'update_scatter', (df_num, prices, None, district, 2)
+        #  two-bedroom listings of 40-80 sqm in the middle half of prices, in two cities
+        middle = [float(price) for price in np.percentile(index.frame.price, [25, 75])]
+        yield 'update_scatter', (df_num, middle, None, None, None, ['makati', 'taguig'], [2, 2], None, [40, 80])
+    for city in [None, *app.city_colors]:
+        click = None if city is None else {'points': [{'x': city.capitalize()}]}
+        yield 'update_treemap', (click,)
+    for level in ('city', 'district'):
+        for weights in ((1, 1, 1, 1, 1), (5, 0, 0, 0, 1), (0, 3, 2, 2, 0)):
+            yield 'update_ranking', (level, *weights)
+
+
+def cases(app):
+    """(callback name, callable) for every input combination of every callback."""
+    for name, args in arguments(app):
+        yield name, lambda function=getattr(app, name), args=args: function(*args)
+
+
+def clear_caches(app):
+    data = app.reloader.current
+    app.figure_cache.clear()
+    app.ranking_cache.clear()
+    app.scatter_points.cache_clear(data)
+    app.binned.cache_clear(data)
+    for index in (data.prop4sale_geo_by_price, data.prop4rent_by_price):
+        index.between.cache_clear()
+
+
+def run_scale(directory, repeats):
+    """Benchmark the data in `directory` in this process; `app` must not be imported yet."""
+    from plotly.io.json import to_json_plotly
+    import datastore
+
+    use_data(directory)
+    for name in datastore.SOURCES:
+        datastore.build(name)
+
+    start = time.perf_counter()
+    import app
+    import_seconds = time.perf_counter() - start
+
+    latencies, peaks, sizes = {}, {}, {}
+    for name, call in cases(app):
+        for _ in range(repeats):
+            clear_caches(app)
+            start = time.perf_counter()
+            output = call()
+            latencies.setdefault(name, []).append(time.perf_counter() - start)
+        sizes.setdefault(name, []).append(len(to_json_plotly(output)))
+
+        #  measured in a separate call, tracemalloc slows down the one it traces
+        clear_caches(app)
+        tracemalloc.start()
+        call()
+        peaks.setdefault(name, []).append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    data = app.reloader.current
+    return {'rows': {name: len(getattr(data, name)) for name in ('prop4sale', 'prop4rent', 'jobs', 'schools')},
+            'import_seconds': import_seconds,
+            'callbacks': {name: {'cases': len(sizes[name]),
+                                 'seconds': percentiles(latencies[name]),
+                                 'peak_bytes': max(peaks[name]),
+                                 'figure_bytes': {'max': max(sizes[name]),
+                                                  'mean': float(np.mean(sizes[name]))}}
+                          for name in latencies}}
+
+
+def cold_import(directory, repeats):
+    """Wall time of `import app` in fresh interpreters, with the store already built."""
+    code = ('import sys, time; sys.path.insert(0, ".")\n'
+            'import benchmark; benchmark.use_data(sys.argv[1])\n'
+            'start = time.perf_counter(); import app; print(time.perf_counter() - start)')
+    seconds = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', code, directory],
+                                check=True, capture_output=True, text=True).stdout
+        seconds.append(float(output.split()[-1]))
+    return percentiles(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark app.py startup and callbacks.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--repeats', type=int, default=5, help='calls per input combination')
+    parser.add_argument('--import-repeats', type=int, default=3)
+    parser.add_argument('--data', nargs='+', default=[],
+                        help='also benchmark these directories of cleaned csv files')
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        json.dump(run_scale(args.child, args.repeats), sys.stdout)
+        return
+
+    results = {'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+               'python': platform.python_version(),
+               'runs': {}}
+    runs = [(f'{scale}x', scale, None) for scale in args.scales]
+    runs += [(directory, None, directory) for directory in args.data]
+    for label, scale, data in runs:
+        print(f'benchmarking {label}', file=sys.stderr)
+        directory = data or tempfile.mkdtemp(prefix=f'bench-{label}-')
+        if scale:
+            scale_datasets(scale, directory)
+        output = subprocess.run([sys.executable, __file__, '--child', directory,
+                                 '--repeats', str(args.repeats)],
+                                check=True, capture_output=True, text=True).stdout
+        results['runs'][label] = {**json.loads(output),
+                                  'cold_import_seconds': cold_import(directory, args.import_repeats)}
+        if not data:
+            shutil.rmtree(directory)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(args.output)
+
+
+if __name__ == '__main__':
+    main()
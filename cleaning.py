@@ -0,0 +1,389 @@
+#  cleaning pipeline for the raw scrapes, the scripted form of dataCleaner.ipynb
+#  every raw file is first cleaned on its own into a staged part in data/staging: columns
+#  are parsed and normalized, the city is derived from the location, and a hash of the raw
+#  (listing, location) pair is kept as the dedup key. The parts of a dataset are then merged
+#  into its csv in data/clean, which is where the steps that need the whole dataset happen:
+#  duplicates are dropped across files, incomplete rows dropped and outliers filtered
+#  against the quartiles of the merged data, in the same order as the notebook
+#
+#  raw files are fingerprinted in data/staging/manifest.json; a file is only cleaned again
+#  when its content changed, and a dataset is only merged again when one of its parts did.
+#  Files are cleaned, and datasets merged, in a pool of worker processes
+#
+#  with --chunk-size, raw files and parts are read in chunks of that many rows and every
+#  output is written as it goes: dedup keys are looked up in an on-disk sqlite index and the
+#  quartiles are taken one column at a time from a temporary file of the deduplicated rows,
+#  so memory grows with the chunk size rather than with the scrape
+#
+#  usage: python cleaning.py          (incremental)
+#         python cleaning.py --full   (clean every raw file again)
+#         python cleaning.py --chunk-size 100000
+#         python cleaning.py --jobs 4
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import datastore
+
+RAW_DIR = 'data'
+STAGE_DIR = 'data/staging'
+MANIFEST = os.path.join(STAGE_DIR, 'manifest.json')
+
+#  bumped whenever the cleaning below changes, so every part gets staged again
+FORMAT_VERSION = '1'
+
+#  in the order of the combined ncr_4sale.csv / ncr_4rent.csv the notebook cleaned, so
+#  that the first of two duplicate listings is the one kept, as it was there
+PROPERTY_CITIES = ('manila', 'makati', 'mandaluyong', 'san_juan', 'taguig', 'pasig', 'quezon-city')
+
+#  raw files of every dataset, merged in this order
+#  the per-city files in data/jobs are an earlier scrape that mostly lacks salaries, the
+#  jobs dataset comes from the combined ncr_jobs.csv
+RAW = {'prop4sale': [os.path.join('for sale', f'{city}_4sale.csv') for city in PROPERTY_CITIES],
+       'prop4rent': [os.path.join('for rent', f'{city}_4rent.csv') for city in PROPERTY_CITIES],
+       'jobs': [os.path.join('jobs', 'ncr_jobs.csv')],
+       'schools': ['ncr_schools.csv']}
+
+#  rows missing any of these are dropped after deduplication
+REQUIRED = {'prop4sale': ['price', 'bedroom_num', 'bathroom_num', 'floor_area'],
+            'prop4rent': ['price', 'bedroom_num', 'bathroom_num', 'floor_area'],
+            'jobs': ['salary']}
+
+CITIES = ['san juan', 'manila', 'quezon', 'mandaluyong', 'pasig', 'makati', 'taguig']
+
+SCHOOL_COLUMNS = {'Division': 'city',
+                  'School Name': 'school_name',
+                  'Sector': 'sector',
+                  'Sacl hColaosls Sifuicbactliaosnsification': 'school_subclass',
+                  'Modified Curricural Offering Classification': 'curricular_class'}
+
+#  read as text, so that a chunk without any value in them still has string columns
+TEXT = {'prop4sale': ['listing', 'location', 'price', 'bedroom_num'],
+        'prop4rent': ['listing', 'location', 'price', 'bedroom_num'],
+        'jobs': ['listing', 'location', 'salary', 'company'],
+        'schools': list(SCHOOL_COLUMNS)}
+
+#  numeric columns, always stored as float so that every chunk of a part has the same schema
+PROPERTY_NUMERIC = ['price', 'bedroom_num', 'bathroom_num', 'floor_area', 'longitude', 'latitude']
+NUMERIC = {'prop4sale': PROPERTY_NUMERIC,
+           'prop4rent': PROPERTY_NUMERIC,
+           'jobs': ['salary'],
+           'schools': []}
+
+#  name of the dedup key column in the staged parts
+KEY = '_key'
+
+
+def raw_path(path):
+    return os.path.join(RAW_DIR, path)
+
+
+def part_path(name, path):
+    return os.path.join(STAGE_DIR, name, os.path.splitext(os.path.basename(path))[0] + '.arrow')
+
+
+def classify_location(location):
+    """City of every lowercased location; the first city named wins, mandaluyong otherwise."""
+    checks = ['quezon', 'taguig', 'manila', 'makati', 'pasig', 'san juan']
+    return pd.Series(np.select([location.str.contains(city, regex=False, na=False) for city in checks],
+                               checks, 'mandaluyong'), index=location.index)
+
+
+def dedup_key(frame):
+    """64-bit hash of the raw (listing, location) pair of every row."""
+    return pd.util.hash_pandas_object(frame[['listing', 'location']], index=False).to_numpy()
+
+
+def iqr_bounds(q1, q3):
+    iqr = q3 - q1
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def remove_outlier(df, bounds=None):
+    """Drop rows with a numeric value outside 1.5 IQR of its column, or with any missing value.
+
+    The quartiles are those of `df` itself unless `bounds`, the (low, high) limits of every
+    numeric column, are given.
+    """
+    numeric = df.select_dtypes('number')
+    low, high = bounds or iqr_bounds(numeric.quantile(.25), numeric.quantile(.75))
+    outlier = ((numeric < low) | (numeric > high)).any(axis=1)
+    return df[~outlier].dropna().reset_index(drop=True)
+
+
+class KeyIndex:
+    """On-disk set of dedup keys, in an sqlite table."""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE seen (key INTEGER PRIMARY KEY)')
+        self.db.execute('CREATE TEMP TABLE batch (key INTEGER PRIMARY KEY)')
+
+    def add(self, keys):
+        """Add distinct `keys`; True for every key that was not in the set yet."""
+        #  sqlite integers are signed
+        keys = np.asarray(keys, dtype='uint64').view('int64')
+        with self.db:
+            self.db.executemany('INSERT INTO batch VALUES (?)', ((key,) for key in keys.tolist()))
+            seen = [key for key, in self.db.execute('SELECT key FROM batch JOIN seen USING (key)')]
+            self.db.execute('INSERT OR IGNORE INTO seen SELECT key FROM batch')
+            self.db.execute('DELETE FROM batch')
+        return ~np.isin(keys, np.array(seen, dtype='int64'))
+
+    def close(self):
+        self.db.close()
+
+
+def clean_properties(raw):
+    df = raw.drop(columns=['Unnamed: 0', 'land_size'])
+    df.insert(0, KEY, dedup_key(df))
+    for col in ('price', 'bedroom_num'):
+        df[col] = df[col].str.replace(',', '', regex=False).astype(float)
+    df['listing'] = df['listing'].str.strip()
+    df['location'] = df['location'].str.lower().str.strip()
+    df['city'] = classify_location(df['location'])
+    return df.astype({col: float for col in PROPERTY_NUMERIC})
+
+
+def parse_salary(salary):
+    """Monthly salary in pesos, the midpoint of a range; NaN for hourly and yearly rates."""
+    salary = salary.str.replace(',', '', regex=False)
+    monthly = ~salary.str.contains('hour|year')
+    salary = salary[monthly].str.strip()
+    salary = salary.str.replace(r'(\w* mon[r]?t[h]?$)', '', regex=True)
+    salary = salary.str.replace('PHP|Php|php|[Pp]|[Hh]', '', regex=True)
+    bounds = salary.str.split('-', expand=True).apply(lambda x: x.str.strip())
+    bounds = bounds.fillna('nan').replace('', 'nan').astype(float)
+    return bounds.mean(axis=1).reindex(monthly.index)
+
+
+def clean_jobs(raw):
+    df = raw.drop(columns=['Unnamed: 0']).dropna(subset=['salary'])
+    df.insert(0, KEY, dedup_key(df))
+    df['location'] = df['location'].str.lower()
+    df['salary'] = parse_salary(df['salary'])
+    df['city'] = classify_location(df['location'])
+    df['company'] = df['company'].str[:16]
+    return df.reset_index(drop=True)
+
+
+def clean_schools(raw):
+    df = raw[list(SCHOOL_COLUMNS)].rename(columns=SCHOOL_COLUMNS)
+    df['city'] = (df['city'].str.replace('City', '', regex=False)
+                  .str.replace('of', '', regex=False).str.strip().str.lower())
+    #  the raw row numbers are kept as the index, as in the notebook's csv
+    return df[df['city'].isin(CITIES)]
+
+
+CLEANERS = {'prop4sale': clean_properties,
+            'prop4rent': clean_properties,
+            'jobs': clean_jobs,
+            'schools': clean_schools}
+
+
+def to_table(df):
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    #  a chunk without any text in a column gets the null type
+    return table.cast(pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                 for field in table.schema], metadata=table.schema.metadata))
+
+
+def write_chunks(path, frames):
+    """Write DataFrames into one Arrow IPC file at `path`, replacing it atomically."""
+    writer = schema = None
+    try:
+        for df in frames:
+            table = to_table(df)
+            if writer is None:
+                schema = table.schema
+                writer = pa.ipc.new_file(f'{path}.tmp', schema)
+            writer.write_table(table.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(f'{path}.tmp', path)
+    return path
+
+
+def read_chunks(path, chunk_size=None):
+    """Yield the Arrow IPC file at `path` as DataFrames of at most `chunk_size` rows.
+
+    Record batches are read one at a time, so only the chunk being yielded is in memory.
+    """
+    with pa.OSFile(path) as source:
+        reader = pa.ipc.open_file(source)
+        if chunk_size is None:
+            yield reader.read_all().to_pandas()
+            return
+        for i in range(reader.num_record_batches):
+            for batch in pa.Table.from_batches([reader.get_batch(i)]).to_batches(max_chunksize=chunk_size):
+                yield batch.to_pandas()
+
+
+def read_column(path, col):
+    """Column `col` of the Arrow IPC file at `path` as a numpy array."""
+    with pa.OSFile(path) as source:
+        reader = pa.ipc.open_file(source)
+        #  copied, a view would keep the whole record batch it was read with alive
+        return np.concatenate([reader.get_batch(i).column(col).to_numpy(zero_copy_only=False).copy()
+                               for i in range(reader.num_record_batches)])
+
+
+def stage(name, path, chunk_size=None):
+    """Clean the raw file `path` of dataset `name` into its staged part."""
+    part = part_path(name, path)
+    os.makedirs(os.path.dirname(part), exist_ok=True)
+    chunks = pd.read_csv(raw_path(path), dtype=dict.fromkeys(TEXT[name], str), chunksize=chunk_size)
+    if chunk_size is None:
+        chunks = [chunks]
+    return write_chunks(part, (CLEANERS[name](chunk) for chunk in chunks))
+
+
+def merge(name, chunk_size=None):
+    """Merge the staged parts of dataset `name` into its cleaned csv."""
+    if chunk_size is not None:
+        return merge_chunked(name, chunk_size)
+    df = pd.concat([df for path in RAW[name] for df in read_chunks(part_path(name, path))])
+    if name in REQUIRED:
+        df = df.drop_duplicates(subset=[KEY], keep='first').drop(columns=[KEY])
+        df = remove_outlier(df.dropna(subset=REQUIRED[name]))
+    path = datastore.source_path(name)
+    df.to_csv(f'{path}.tmp')
+    os.replace(f'{path}.tmp', path)
+    return path
+
+
+def deduplicated(name, keys, chunk_size):
+    """Yield the complete rows of the parts of `name`, the first of every key only."""
+    for path in RAW[name]:
+        for df in read_chunks(part_path(name, path), chunk_size):
+            df = df[~df.duplicated(subset=[KEY], keep='first')]
+            df = df[keys.add(df[KEY])].drop(columns=[KEY])
+            yield df.dropna(subset=REQUIRED[name]).reset_index(drop=True)
+
+
+def merge_chunked(name, chunk_size):
+    """Merge the staged parts of dataset `name` into its cleaned csv, `chunk_size` rows at a time.
+
+    Gives the same csv as `merge`.
+    """
+    path = datastore.source_path(name)
+    with tempfile.TemporaryDirectory(dir=STAGE_DIR) as tmp, open(f'{path}.tmp', 'w', newline='') as out:
+        if name in REQUIRED:
+            keys = KeyIndex(os.path.join(tmp, 'keys.sqlite'))
+            try:
+                rows = write_chunks(os.path.join(tmp, 'rows.arrow'), deduplicated(name, keys, chunk_size))
+            finally:
+                keys.close()
+            q1, q3 = pd.Series(dtype=float), pd.Series(dtype=float)
+            for col in NUMERIC[name]:
+                q1[col], q3[col] = np.nanquantile(read_column(rows, col), [.25, .75])
+            bounds = iqr_bounds(q1, q3)
+            start = 0
+            for i, df in enumerate(read_chunks(rows, chunk_size)):
+                df = remove_outlier(df, bounds)
+                df.index += start
+                start += len(df)
+                df.to_csv(out, header=(i == 0))
+        else:
+            for part in RAW[name]:
+                for df in read_chunks(part_path(name, part), chunk_size):
+                    df.to_csv(out, header=(out.tell() == 0))
+    os.replace(f'{path}.tmp', path)
+    return path
+
+
+def fingerprint(path, previous=None):
+    """Size, mtime and sha256 of a raw file; the hash is reused while size and mtime match."""
+    stat = os.stat(raw_path(path))
+    if previous and (previous['size'], previous['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+        return previous
+    digest = hashlib.sha256()
+    with open(raw_path(path), 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST) as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        return {}
+    return manifest['files'] if manifest.get('format_version') == FORMAT_VERSION else {}
+
+
+def save_manifest(files):
+    os.makedirs(STAGE_DIR, exist_ok=True)
+    with open(f'{MANIFEST}.tmp', 'w') as file:
+        json.dump({'format_version': FORMAT_VERSION, 'files': files}, file, indent=2, sort_keys=True)
+    os.replace(f'{MANIFEST}.tmp', MANIFEST)
+
+
+def changed(names=None, full=False):
+    """Raw files of `names` that need staging, and the fingerprints of every raw file."""
+    previous = {} if full else load_manifest()
+    todo, files = {}, dict(previous)
+    for name in names or RAW:
+        for path in RAW[name]:
+            key = f'{name}/{path}'
+            files[key] = fingerprint(path, previous.get(key))
+            old = previous.get(key)
+            if old is None or old['sha256'] != files[key]['sha256'] or not os.path.exists(part_path(name, path)):
+                todo.setdefault(name, []).append(path)
+    return todo, files
+
+
+def executor(jobs):
+    if jobs == 1:
+        return concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    return concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+
+
+def run(names=None, full=False, chunk_size=None, jobs=None):
+    """Stage the changed raw files of `names` (every dataset by default) and merge them.
+
+    With `chunk_size`, files are read and written in chunks of that many rows. Files are
+    staged and datasets merged in `jobs` processes (one per core by default); a dataset is
+    merged once all of its parts are staged, always in the order of `RAW`, so the output
+    does not depend on which process finishes first. Returns the cleaned csv of every
+    dataset that was merged again.
+    """
+    names = names or list(RAW)
+    todo, files = changed(names, full)
+    with executor(jobs or os.cpu_count()) as pool:
+        staged = {name: [pool.submit(stage, name, path, chunk_size) for path in todo.get(name, [])]
+                  for name in names}
+        merges = []
+        for name in names:
+            if name in todo or not os.path.exists(datastore.source_path(name)):
+                for future in staged[name]:
+                    future.result()
+                merges.append(pool.submit(merge, name, chunk_size))
+        merged = [future.result() for future in merges]
+    save_manifest(files)
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Clean the raw scrapes into data/clean.')
+    parser.add_argument('--datasets', nargs='+', choices=list(RAW), default=list(RAW))
+    parser.add_argument('--full', action='store_true', help='clean every raw file again')
+    parser.add_argument('--chunk-size', type=int, help='stream files in chunks of this many rows')
+    parser.add_argument('--jobs', type=int, help='worker processes (default: one per core)')
+    args = parser.parse_args()
+    for path in run(args.datasets, args.full, args.chunk_size, args.jobs):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
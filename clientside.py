@@ -0,0 +1,27 @@
+#  one-time payload for filtering the scatter map in the browser
+#  with SCATTER_CLIENTSIDE on, every listing's price, coordinates and name are sent once
+#  after the page loads, and assets/scatter.js filters them as the price slider moves, so
+#  dragging the slider never reaches the server
+import base64
+import json
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+
+def encode_array(values, dtype):
+    """Little-endian binary of `values` as base64, decoded by the browser into a typed array."""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=f'<{dtype}').tobytes()).decode('ascii')
+
+
+def scatter_payload(frame, template):
+    """Columns of a price-sorted `frame` plus a one-listing figure `template` to draw them with.
+
+    Prices stay float64 so the browser's binary search sees the same values as the slider;
+    coordinates are float32, which is still well under a metre of precision.
+    """
+    return {'price': encode_array(frame['price'], 'f8'),
+            'latitude': encode_array(frame['latitude'], 'f4'),
+            'longitude': encode_array(frame['longitude'], 'f4'),
+            'listing': frame['listing'].tolist(),
+            'figure': json.loads(to_json_plotly(template))}
@@ -0,0 +1,50 @@
+#  runtime settings for the dashboard
+#  every value can be overridden through an environment variable of the same name,
+#  e.g. on the deployment: heroku config:set FIGURE_CACHE_SIZE=512
+import os
+
+
+def _int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _flag(name, default=False):
+    return os.environ.get(name, '1' if default else '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+#  maximum number of serialized figures kept by the figure cache
+FIGURE_CACHE_SIZE = _int('FIGURE_CACHE_SIZE', 256)
+
+#  build every cacheable figure at startup instead of on first request
+FIGURE_CACHE_WARM = _flag('FIGURE_CACHE_WARM')
+
+#  listings drawn on the scatter map; larger selections are thinned out per map area
+#  (see downsample.py), keeping one listing in every occupied area, 0 draws every listing
+SCATTER_MAX_POINTS = _int('SCATTER_MAX_POINTS', 20000)
+
+#  bars of the histograms, which are binned on the server from the city aggregates
+HISTOGRAM_BINS = _int('HISTOGRAM_BINS', 40)
+
+#  filter the scatter map in the browser from a one-time data payload instead of
+#  asking the server on every budget slider change (see clientside.py)
+SCATTER_CLIENTSIDE = _flag('SCATTER_CLIENTSIDE')
+
+#  put the initial figures in the layout, computed once per data version, instead of
+#  firing every callback on page load (see prerender.py)
+PRERENDER = _flag('PRERENDER', default=True)
+
+#  serialize callback responses and the layout with orjson (see serialization.py)
+FAST_JSON = _flag('FAST_JSON')
+
+#  with FAST_JSON, send numeric trace arrays as base64 typed arrays; needs plotly.js 2.28+
+FAST_JSON_TYPED_ARRAYS = _flag('FAST_JSON_TYPED_ARRAYS')
+
+#  compress responses with brotli or gzip (see httpcache.py)
+COMPRESS = _flag('COMPRESS', default=True)
+
+#  tag the dash responses with ETags and answer repeat requests with 304 Not Modified
+HTTP_ETAGS = _flag('HTTP_ETAGS', default=True)
+
+#  seconds between looks at the data on disk; a new version is loaded in the background
+#  and swapped in without restarting (see snapshot.py), 0 keeps the data loaded at startup
+RELOAD_INTERVAL = _int('RELOAD_INTERVAL', 30)
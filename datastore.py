@@ -0,0 +1,206 @@
+#  typed columnar store for the cleaned datasets
+#  the csv files in data/clean are converted once into Arrow IPC (feather v2) files with
+#  categorical text columns and float32 numbers where that loses nothing; the dashboard
+#  then memory-maps those files instead of parsing and type-inferring the csv text
+#
+#  what the dashboard derives from one version of the data (the datasets partitioned by
+#  city, the mapped listings sorted by price, the arrays of their indexes) is written once,
+#  by whichever process takes the store's lock first, to a directory named after the
+#  version; the other processes only map its files. The directory is written under a
+#  temporary name and renamed when complete, so it is never read half-written
+#
+#  usage: python datastore.py        (re)builds every file in data/store
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+SOURCE_DIR = 'data/clean'
+STORE_DIR = 'data/store'
+
+#  bumped whenever the conversion below changes, so stale stores get rebuilt
+FORMAT_VERSION = '1'
+
+#  cleaned csv for every dataset
+SOURCES = {'prop4sale': 'clean_ncr_prop4sale.csv',
+           'prop4rent': 'clean_ncr_prop4rent.csv',
+           'jobs': 'clean_ncr_jobs.csv',
+           'schools': 'clean_ncr_school.csv'}
+
+#  low-cardinality text columns stored as dictionary-encoded categoricals
+CATEGORIES = {'prop4sale': ['location', 'city'],
+              'prop4rent': ['location', 'city'],
+              'jobs': ['location', 'city'],
+              'schools': ['city']}
+
+
+def source_path(name):
+    return os.path.join(SOURCE_DIR, SOURCES[name])
+
+
+def store_path(name):
+    return os.path.join(STORE_DIR, f'{name}.arrow')
+
+
+def _downcast(df):
+    #  float64 columns become float32 only if every value survives the round trip,
+    #  so prices above 2**24 and coordinates keep their full precision
+    for col in df.select_dtypes('float64').columns:
+        values = df[col].to_numpy()
+        narrowed = values.astype('float32')
+        if np.array_equal(narrowed.astype('float64'), values, equal_nan=True):
+            df[col] = narrowed
+    return df
+
+
+def convert(name):
+    """Read the cleaned csv of `name` and apply the store's column types."""
+    df = pd.read_csv(source_path(name), index_col=0)
+    for col in CATEGORIES[name]:
+        df[col] = df[col].astype('category')
+    return _downcast(df)
+
+
+def build(name):
+    """Write the store file of `name`, replacing any previous one atomically."""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    table = pa.Table.from_pandas(convert(name))
+    table = table.replace_schema_metadata({**table.schema.metadata,
+                                           b'format_version': FORMAT_VERSION.encode()})
+    path = store_path(name)
+    #  written uncompressed so the buffers can be memory-mapped as-is, to a temporary file
+    #  renamed into place, so a process mapping the store never sees it half-written
+    tmp = f'{path}.{os.getpid()}.tmp'
+    feather.write_feather(table, tmp, compression='uncompressed')
+    os.replace(tmp, path)
+    return path
+
+
+def is_stale(name):
+    path = store_path(name)
+    if not os.path.exists(path):
+        return True
+    if os.path.getmtime(path) < os.path.getmtime(source_path(name)):
+        return True
+    with pa.memory_map(path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return metadata.get(b'format_version') != FORMAT_VERSION.encode()
+
+
+def read_frame(path):
+    """The DataFrame in the Arrow file at `path`, backed by the memory-mapped file."""
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    #  split_blocks keeps numeric columns as zero-copy views of the mapped file, and free
+    #  text stays in arrow buffers rather than becoming one python object per value, so
+    #  the pages can be shared by every process that maps the file (see gunicorn.conf.py)
+    return table.to_pandas(split_blocks=True,
+                           types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+
+
+def write_frame(frame, path):
+    """Write `frame`, index included, to an uncompressed Arrow file `read_frame` maps back."""
+    feather.write_feather(frame, path, compression='uncompressed')
+    return path
+
+
+def write_arrays(arrays, metadata, path):
+    """Write numpy `arrays` ({name: array}) and JSON-able `metadata` to an Arrow file at `path`."""
+    columns, shapes = {}, {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        shapes[name] = [list(array.shape), array.dtype.str]
+        #  arrow packs booleans into bits, bytes map back as they are
+        flat = array.reshape(-1).view('uint8') if array.dtype == bool else array.reshape(-1)
+        columns[name] = pa.ListArray.from_arrays(pa.array([0, len(flat)], pa.int32()), pa.array(flat))
+    table = pa.table(columns).replace_schema_metadata({b'shapes': json.dumps(shapes).encode(),
+                                                       b'metadata': json.dumps(metadata).encode()})
+    feather.write_feather(table, path, compression='uncompressed')
+    return path
+
+
+def read_arrays(path):
+    """The (arrays, metadata) in the Arrow file at `path`, arrays being read-only views of the mapped file."""
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    shapes = json.loads(table.schema.metadata[b'shapes'])
+    arrays = {name: table.column(name).chunk(0).values.to_numpy(zero_copy_only=True).view(dtype).reshape(shape)
+              for name, (shape, dtype) in shapes.items()}
+    return arrays, json.loads(table.schema.metadata[b'metadata'])
+
+
+def load(name):
+    """Return the dataset `name` as a DataFrame backed by the memory-mapped store file.
+
+    The store is (re)built from the cleaned csv first when it is missing or older than it.
+    """
+    if is_stale(name):
+        build(name)
+    return read_frame(store_path(name))
+
+
+@contextlib.contextmanager
+def locked():
+    """Hold the store's lock, taken by one process (or thread) at a time."""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    with open(os.path.join(STORE_DIR, '.lock'), 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def derived_path(data_version):
+    return os.path.join(STORE_DIR, data_version)
+
+
+def derive(data_version, build):
+    """Directory of the files derived from `data_version`, written by `build(directory)` unless they are already.
+
+    Call it holding `locked()`. The files are written to a temporary directory that is
+    renamed once `build` returns, and only if the data on disk is still that version, so a
+    directory under the version's name is always complete and of the right data; the
+    directories of other versions are removed then (processes that have their files
+    mapped keep reading them).
+    """
+    path = derived_path(data_version)
+    if os.path.isdir(path):
+        return path
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f'{data_version}.', suffix='.tmp', dir=STORE_DIR)
+    try:
+        build(tmp)
+        if version() != data_version:
+            raise RuntimeError(f'the data changed while version {data_version} was derived from it')
+        os.rename(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    for entry in os.listdir(STORE_DIR):
+        if entry != data_version and os.path.isdir(os.path.join(STORE_DIR, entry)):
+            shutil.rmtree(os.path.join(STORE_DIR, entry), ignore_errors=True)
+    return path
+
+
+def version():
+    """Short hash naming the current contents of every cleaned csv.
+
+    Changes whenever a csv is rewritten, so anything derived from the data can be keyed on it.
+    """
+    digest = hashlib.sha1(FORMAT_VERSION.encode())
+    for name in sorted(SOURCES):
+        stat = os.stat(source_path(name))
+        digest.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()[:16]
+
+
+if __name__ == '__main__':
+    for name in SOURCES:
+        print(build(name))
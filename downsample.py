@@ -0,0 +1,40 @@
+#  point reduction for the scatter map
+#  a full-NCR scrape is far more listings than a browser can draw smoothly, so above a
+#  cap the map gets a sample that keeps both where the listings are and how they are priced
+import numpy as np
+
+
+def thin(frame, max_points, cell=0.002, price='price', lat='latitude', lon='longitude'):
+    """Return about `max_points` rows of `frame`, sampled per map grid cell.
+
+    Listings are bucketed into square cells of `cell` degrees (~200 m). Every occupied
+    cell keeps its median-priced listing, so no area of the map goes blank, even when
+    that alone exceeds `max_points`; the rest of the budget is spread over the other
+    listings, ordered by cell and then by price, at evenly spaced positions, so each cell
+    gets its share and the price mix of every neighbourhood is preserved. Kept rows are
+    returned unchanged, with all their columns, in their original order.
+    """
+    n = len(frame)
+    if max_points <= 0 or n <= max_points:
+        return frame
+
+    rows = np.floor(frame[lat].to_numpy() / cell).astype('int64')
+    cols = np.floor(frame[lon].to_numpy() / cell).astype('int64')
+    cells = rows * 1_000_000 + cols
+
+    #  listings by cell, then by price within a cell
+    order = np.lexsort((frame[price].to_numpy(), cells))
+    sorted_cells = cells[order]
+    starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+
+    keep = np.zeros(n, dtype=bool)
+    keep[starts + (sizes - 1) // 2] = True
+
+    #  systematic sample of the others: a listing is kept each time the running share of
+    #  the budget crosses a whole number, carried over from one cell to the next
+    others = np.flatnonzero(~keep)
+    fraction = max(max_points - len(starts), 0) / len(others)
+    position = np.arange(len(others))
+    keep[others[np.floor((position + 1) * fraction + 0.5) > np.floor(position * fraction + 0.5)]] = True
+    return frame.iloc[np.sort(order[keep])]
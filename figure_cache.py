@@ -0,0 +1,67 @@
+#  bounded cache of serialized plotly figures
+#  callbacks whose output depends only on (dataset, city) ask the cache first, so a
+#  repeat request returns the stored figure JSON without rebuilding it in plotly express
+import json
+import threading
+from collections import Counter, OrderedDict
+
+from plotly.io.json import to_json_plotly
+
+
+class FigureCache:
+    """Least-recently-used store of figure JSON keyed by (callback, dataset, city, data version)."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._counts = Counter()
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """Return the cached figure for `key`, calling `build()` to create it on a miss."""
+        with self._lock:
+            entry = self._figures.get(key)
+            if entry is not None:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                self._counts[key[0], 'hit'] += 1
+                return entry[0]
+            self.misses += 1
+            self._counts[key[0], 'miss'] += 1
+
+        #  built outside the lock; two threads racing on the same key just build it twice
+        #  serialized with the same encoder dash uses for callback responses
+        serialized = to_json_plotly(build())
+        figure = json.loads(serialized)
+        with self._lock:
+            #  sized as sent, in utf-8 bytes
+            self._figures[key] = (figure, len(serialized.encode()))
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.maxsize:
+                self._figures.popitem(last=False)
+        return figure
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+
+    def evict(self, stale):
+        """Drop every figure whose key `stale(key)` is true, e.g. those of an old data version."""
+        with self._lock:
+            for key in [key for key in self._figures if stale(key)]:
+                del self._figures[key]
+
+    def counts(self):
+        """Hits and misses per callback, as {(callback, 'hit' or 'miss'): count}."""
+        with self._lock:
+            return dict(self._counts)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self._figures),
+                    'maxsize': self.maxsize,
+                    'bytes': sum(nbytes for _, nbytes in self._figures.values())}
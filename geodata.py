@@ -0,0 +1,260 @@
+#  Metro Manila city boundaries
+#  the build stage reads the whole-country GADM shapefile once, keeps the NCR cities,
+#  normalizes their names, reprojects and simplifies them, and writes a small GeoJSON
+#  artifact; the dashboard only ever loads that artifact, so geopandas and pyproj are
+#  needed where it is built but are never imported by the web workers
+#
+#  CityGrid places listings in the city whose boundary contains their coordinates,
+#  testing only the few that fall near a boundary against the polygons
+#
+#  usage: python geodata.py        (re)builds the artifact from the shapefile and reports
+#                                  the listings whose coordinates disagree with their city
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+SHAPEFILE = 'data/ph-adm/PHL_adm2.shp'
+
+#  derived from GADM data, which may not be redistributed, so it is not committed either
+ARTIFACT = 'data/ph-adm/ncr_geodata.geojson'
+
+#  simplification tolerance in degrees (~10 m) and decimals kept per coordinate (~1 m)
+TOLERANCE = 0.0001
+PRECISION = 5
+
+
+def normalize_city(name):
+    #  'City of Manila' -> 'manila', 'Quezon City' -> 'quezon', matching the datasets
+    return name.replace('City of', '').replace('City', '').lower().strip()
+
+
+def build(shapefile=SHAPEFILE, artifact=ARTIFACT, tolerance=TOLERANCE, precision=PRECISION):
+    """Write the NCR-only, simplified GeoJSON artifact and return its path."""
+    import geopandas as gpd
+    import pyproj
+    from shapely.geometry import mapping
+
+    ph_geodata = gpd.read_file(shapefile)
+
+    #  filtering before reprojecting, so only the NCR rows are transformed
+    ncr_geodata = ph_geodata[ph_geodata['NAME_1'] == 'Metropolitan Manila']
+    ncr_geodata = ncr_geodata.to_crs(pyproj.CRS.from_epsg(4326))
+    ncr_geodata = ncr_geodata.assign(city=ncr_geodata['NAME_2'].map(normalize_city))
+    geometry = ncr_geodata.geometry.simplify(tolerance, preserve_topology=True)
+
+    def rounded(coords):
+        if isinstance(coords[0], (int, float)):
+            return [round(c, precision) for c in coords]
+        return [rounded(c) for c in coords]
+
+    features = [{'type': 'Feature',
+                 'id': city,
+                 'properties': {'city': city},
+                 'geometry': {'type': shape['type'], 'coordinates': rounded(shape['coordinates'])}}
+                for city, shape in zip(ncr_geodata['city'], map(mapping, geometry))]
+
+    os.makedirs(os.path.dirname(artifact), exist_ok=True)
+    with open(f'{artifact}.tmp', 'w') as file:
+        json.dump({'type': 'FeatureCollection', 'features': features}, file, separators=(',', ':'))
+    os.replace(f'{artifact}.tmp', artifact)
+    return artifact
+
+
+def load(artifact=ARTIFACT):
+    """Return the NCR cities as a DataFrame of `city` and GeoJSON `geometry` dicts.
+
+    The artifact is never built here, as the web workers have neither the shapefile nor
+    geopandas; a missing one is an error.
+    """
+    try:
+        with open(artifact) as file:
+            features = json.load(file)['features']
+    except FileNotFoundError:
+        raise FileNotFoundError(f'{artifact} is missing, build it from the shapefile with `python geodata.py`') from None
+    return pd.DataFrame({'city': [feature['id'] for feature in features],
+                         'geometry': [feature['geometry'] for feature in features]})
+
+
+def feature_collection(frame):
+    """GeoJSON FeatureCollection of a frame indexed by city with a `geometry` column."""
+    return {'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'id': city, 'properties': {}, 'geometry': geometry}
+                         for city, geometry in frame['geometry'].items()]}
+
+
+def _polygons(geometry):
+    return [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+
+
+def _in_ring(ring, lon, lat):
+    #  even-odd ray casting, vectorized over the points and looped over the ring's edges
+    ring = np.asarray(ring)
+    inside = np.zeros(len(lon), dtype=bool)
+    for (x0, y0), (x1, y1) in zip(ring[:-1], ring[1:]):
+        crosses = (y0 > lat) != (y1 > lat)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x0 + (lat - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= crosses & (lon < x_cross)
+    return inside
+
+
+def bounds(geometry):
+    """(min lon, min lat, max lon, max lat) of a GeoJSON Polygon or MultiPolygon."""
+    points = np.concatenate([np.asarray(polygon[0]) for polygon in _polygons(geometry)])
+    return (*points.min(axis=0), *points.max(axis=0))
+
+
+def contains(geometry, lon, lat):
+    """Boolean mask of the points inside a GeoJSON Polygon or MultiPolygon."""
+    lon, lat = np.asarray(lon, dtype='float64'), np.asarray(lat, dtype='float64')
+    inside = np.zeros(len(lon), dtype=bool)
+    for polygon in _polygons(geometry):
+        exterior = np.asarray(polygon[0])
+        (min_lon, min_lat), (max_lon, max_lat) = exterior.min(axis=0), exterior.max(axis=0)
+        candidates = ~inside & (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+        if not candidates.any():
+            continue
+        hit = _in_ring(exterior, lon[candidates], lat[candidates])
+        for hole in polygon[1:]:
+            hit &= ~_in_ring(hole, lon[candidates], lat[candidates])
+        inside[candidates] = hit
+    return inside
+
+
+def _edges(geometry):
+    #  start and end points of every edge of every ring, holes included
+    rings = [np.asarray(ring, dtype='float64') for polygon in _polygons(geometry) for ring in polygon]
+    return (np.concatenate([ring[:-1] for ring in rings]), np.concatenate([ring[1:] for ring in rings]))
+
+
+def _orientation(a, b, c):
+    #  sign of the turn a -> b -> c, for arrays of points of shape (n, 2)
+    return np.sign((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0]))
+
+
+class CityGrid:
+    """The city polygons over a regular grid of `cell`-degree cells (~220 m by default).
+
+    Every cell knows which cities' boundaries cross it, which edges do, and whether its
+    center is inside each city. A point in a cell that no boundary crosses takes the cell's
+    city by a lookup; a point near a boundary is inside a city when its center is, unless the
+    segment from the point to the center crosses an odd number of the city's edges in that
+    cell. Either way a point is only ever compared with the few edges of its own cell.
+    """
+
+    def __init__(self, frame, cell=.002):
+        self.cities = list(frame['city'])
+        self.cell = cell
+        self._geometries = list(frame['geometry'])
+        edges = [_edges(geometry) for geometry in self._geometries]
+        low = np.min([start.min(axis=0) for start, _ in edges], axis=0)
+        high = np.max([start.max(axis=0) for start, _ in edges], axis=0)
+        self.origin = low
+        nx, ny = np.floor((high - low) / cell).astype('int64') + 1
+        self.shape = (int(ny), int(nx))
+        cells = int(nx * ny)
+
+        #  (city, cell) -> edges under the cell, as runs of arrays sorted by city and cell
+        keys, starts, ends = [], [], []
+        for code, (start, end) in enumerate(edges):
+            for edge, cell_id in self._cells_of(start, end):
+                keys.append(code * cells + cell_id)
+                starts.append(start[edge])
+                ends.append(end[edge])
+        keys = np.concatenate(keys)
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._starts = np.concatenate(starts)[order]
+        self._ends = np.concatenate(ends)[order]
+        self._crossed = np.zeros(len(self.cities) * cells, dtype=bool)
+        self._crossed[self._keys] = True
+        self._crossed = self._crossed.reshape(len(self.cities), cells)
+
+        #  whether every cell center is inside every city, by even-odd scanlines
+        centers_lon = low[0] + (np.arange(nx) + .5) * cell
+        self._center_inside = np.zeros((len(self.cities), cells), dtype=bool)
+        for code, (start, end) in enumerate(edges):
+            for row in range(ny):
+                lat = low[1] + (row + .5) * cell
+                crosses = (start[:, 1] > lat) != (end[:, 1] > lat)
+                a, b = start[crosses], end[crosses]
+                x_cross = np.sort(a[:, 0] + (lat - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1]))
+                right = len(x_cross) - np.searchsorted(x_cross, centers_lon, side='right')
+                self._center_inside[code, row * nx:(row + 1) * nx] = right % 2 == 1
+
+        #  first city wholly containing each cell, -1 for none
+        whole = self._center_inside & ~self._crossed
+        self._owner = np.where(whole.any(axis=0), whole.argmax(axis=0), -1)
+        self._near = self._crossed.any(axis=0)
+
+    def _cells_of(self, start, end):
+        #  (edges, cells) for every cell under the bounding box of each edge, a superset
+        #  of the cells the edge crosses
+        low = np.floor((np.minimum(start, end) - self.origin) / self.cell).astype('int64')
+        high = np.floor((np.maximum(start, end) - self.origin) / self.cell).astype('int64')
+        span = high - low
+        for dx in range(span[:, 0].max() + 1):
+            for dy in range(span[:, 1].max() + 1):
+                edge = np.flatnonzero((dx <= span[:, 0]) & (dy <= span[:, 1]))
+                yield edge, (low[edge, 1] + dy) * self.shape[1] + low[edge, 0] + dx
+
+    def _inside(self, code, cell_id, points):
+        #  inside flags of `points` for the (city, cell) pairs given by `code` and `cell_id`
+        key = code * self._crossed.shape[1] + cell_id
+        first = np.searchsorted(self._keys, key, side='left')
+        count = np.searchsorted(self._keys, key, side='right') - first
+        pair = np.repeat(np.arange(len(key)), count)
+        edge = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count) + np.repeat(first, count)
+
+        nx = self.shape[1]
+        centers = self.origin + (np.stack([cell_id % nx, cell_id // nx], axis=1) + .5) * self.cell
+        p, c = points[pair], centers[pair]
+        a, b = self._starts[edge], self._ends[edge]
+        crossing = ((_orientation(a, b, p) != _orientation(a, b, c)) &
+                    (_orientation(p, c, a) != _orientation(p, c, b)))
+        odd = np.bincount(pair, weights=crossing, minlength=len(key)) % 2 == 1
+        return self._center_inside[code, cell_id] ^ odd
+
+    def locate(self, lon, lat):
+        """Index into `cities` of the city containing every point, -1 for points outside all of them.
+
+        A point inside several (overlapping) polygons gets the first of their cities.
+        """
+        lon, lat = np.asarray(lon, dtype='float64'), np.asarray(lat, dtype='float64')
+        with np.errstate(invalid='ignore'):
+            x = np.floor((lon - self.origin[0]) / self.cell)
+            y = np.floor((lat - self.origin[1]) / self.cell)
+            on_grid = (x >= 0) & (x < self.shape[1]) & (y >= 0) & (y < self.shape[0])
+        cell_id = (np.where(on_grid, y, 0) * self.shape[1] + np.where(on_grid, x, 0)).astype('int64')
+        codes = np.where(on_grid, self._owner.ravel()[cell_id], -1)
+
+        near = np.flatnonzero(on_grid & self._near.ravel()[cell_id])
+        code, which = np.nonzero(self._crossed[:, cell_id[near]])
+        point = near[which]
+        inside = self._inside(code, cell_id[point], np.stack([lon[point], lat[point]], axis=1))
+        first = np.where(codes == -1, len(self.cities), codes)
+        np.minimum.at(first, point[inside], code[inside])
+        return np.where(first == len(self.cities), -1, first)
+
+    def city_of(self, lon, lat):
+        """Name of the city containing every point, None for points outside all of them."""
+        return np.array(self.cities + [None], dtype=object)[self.locate(lon, lat)]
+
+    def mismatches(self, frame, column='city'):
+        """Boolean mask of the rows of `frame` whose coordinates lie outside their `column` city."""
+        located = self.city_of(frame['longitude'].to_numpy(), frame['latitude'].to_numpy())
+        return frame[column].astype(object).to_numpy() != located
+
+
+if __name__ == '__main__':
+    import datastore
+
+    print(build())
+    grid = CityGrid(load())
+    for name in ('prop4sale', 'prop4rent'):
+        listings = datastore.load(name)
+        outside = int((grid.locate(listings['longitude'], listings['latitude']) < 0).sum())
+        print(f'{name}: {outside} of {len(listings)} listings outside Metro Manila, '
+              f'{int(grid.mismatches(listings).sum())} not in the city they are listed under')
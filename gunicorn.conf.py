@@ -0,0 +1,17 @@
+#  gunicorn settings, picked up by the Procfile
+#  the app (and with it every dataset, index and static chart) is built once in the
+#  master process and then forked, so workers share those pages copy-on-write instead
+#  of each building a private copy; memory grows with the data, not with the workers
+#  (once new data is loaded, the first worker to load it writes its frames and indexes to
+#  data/store and every worker maps them from there, see datastore.derive)
+import gc
+
+preload_app = True
+
+
+def when_ready(server):
+    #  runs in the master after the app has been loaded, before any worker is forked;
+    #  frozen objects are skipped by the garbage collector, whose bookkeeping writes
+    #  would otherwise copy every shared page into each worker
+    gc.collect()
+    gc.freeze()
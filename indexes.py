@@ -0,0 +1,264 @@
+#  lookup structures built once at load time for the callbacks' filters
+import functools
+import math
+
+import numpy as np
+import pandas as pd
+
+
+class UnknownCityError(KeyError):
+    """Raised for a city value that is not in the partitioned dataset."""
+
+
+class CityPartition:
+    """A frame reordered so each city's rows are contiguous, with O(1) lookups by city.
+
+    Rows are grouped in order of each city's first appearance and keep their relative
+    order within a city, so a lookup returns the same rows as a boolean filter would.
+    A `presorted` frame, such as the `frame` of an earlier partition read back from the
+    store, is used as it is.
+    """
+
+    def __init__(self, frame, column='city', presorted=False):
+        codes, cities = pd.factorize(frame[column])
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(cities)))])
+        self.frame = frame if presorted else frame.take(np.argsort(codes, kind='stable'))
+        self._slices = {city: slice(start, stop)
+                        for city, start, stop in zip(cities, bounds[:-1], bounds[1:])}
+
+    @property
+    def cities(self):
+        return list(self._slices)
+
+    def __contains__(self, city):
+        return city in self._slices
+
+    def __getitem__(self, city):
+        """Rows of `city`, as a positional slice (a view) of the reordered frame."""
+        try:
+            rows = self._slices[city]
+        except (KeyError, TypeError):
+            raise UnknownCityError(city) from None
+        return self.frame.iloc[rows]
+
+
+class PriceIndex:
+    """A frame sorted by a numeric column, filtered to a range of it by binary search.
+
+    The rows between two values are a contiguous run of the sorted frame, so a filter is
+    a searchsorted plus a zero-copy slice; recent ranges are memoized, which makes slider
+    drags free. A `presorted` frame is used as it is.
+    """
+
+    def __init__(self, frame, column='price', cachesize=128, presorted=False):
+        self.frame = frame if presorted else frame.sort_values(column, kind='stable')
+        self._values = self.frame[column].to_numpy()
+        self.between = functools.lru_cache(maxsize=cachesize)(self._between)
+
+    def _between(self, low, high):
+        return self.frame.iloc[np.searchsorted(self._values, low, side='left'):
+                               np.searchsorted(self._values, high, side='right')]
+
+
+class GridIndex:
+    """Points bucketed into a regular grid of `cell`-degree cells, for bounding-box queries.
+
+    Points are ordered by cell, row by row, so the cells of a box along one grid row hold
+    a contiguous run of points: a query gathers one run per grid row the box spans and keeps
+    the points inside the box. Queries return positions into the arrays the index was built
+    from, in ascending order, so they can be combined with a PriceIndex over the same frame.
+    """
+
+    def __init__(self, lon, lat, cell=.005):
+        lon, lat = np.asarray(lon, dtype='float64'), np.asarray(lat, dtype='float64')
+        located = np.isfinite(lon) & np.isfinite(lat)
+        self.cell = cell
+        self.origin = (lon[located].min(), lat[located].min()) if located.any() else (0., 0.)
+        x = np.floor((lon - self.origin[0]) / cell)
+        y = np.floor((lat - self.origin[1]) / cell)
+        self.shape = (int(y[located].max()) + 1, int(x[located].max()) + 1) if located.any() else (0, 0)
+        cells = self.shape[0] * self.shape[1]
+
+        #  points without coordinates sort after every cell and are never returned
+        cell_id = np.where(located, np.nan_to_num(y) * self.shape[1] + np.nan_to_num(x), cells).astype('int64')
+        self._order = np.argsort(cell_id, kind='stable')
+        self._starts = np.searchsorted(cell_id[self._order], np.arange(cells + 1))
+        self._lon = lon[self._order]
+        self._lat = lat[self._order]
+        self._located = np.flatnonzero(located)
+        self._extent = (*self.origin, lon[located].max(), lat[located].max()) if located.any() else None
+
+    def state(self):
+        """The index as numpy arrays and JSON-able metadata, which `from_state` takes back."""
+        arrays = {'order': self._order, 'starts': self._starts, 'lon': self._lon, 'lat': self._lat,
+                  'located': self._located}
+        metadata = {'cell': self.cell, 'origin': [float(value) for value in self.origin], 'shape': list(self.shape),
+                    'extent': None if self._extent is None else [float(value) for value in self._extent]}
+        return arrays, metadata
+
+    @classmethod
+    def from_state(cls, arrays, metadata):
+        index = cls.__new__(cls)
+        index.cell = metadata['cell']
+        index.origin = tuple(metadata['origin'])
+        index.shape = tuple(metadata['shape'])
+        index._extent = None if metadata['extent'] is None else tuple(metadata['extent'])
+        index._order, index._starts = arrays['order'], arrays['starts']
+        index._lon, index._lat, index._located = arrays['lon'], arrays['lat'], arrays['located']
+        return index
+
+    def snap(self, box):
+        """`box` (min lon, min lat, max lon, max lat) widened outwards to whole cells."""
+        min_lon, min_lat, max_lon, max_lat = box
+        x0, y0 = self.origin
+        return (x0 + math.floor((min_lon - x0) / self.cell) * self.cell,
+                y0 + math.floor((min_lat - y0) / self.cell) * self.cell,
+                x0 + math.ceil((max_lon - x0) / self.cell) * self.cell,
+                y0 + math.ceil((max_lat - y0) / self.cell) * self.cell)
+
+    def query(self, box):
+        """Sorted positions of the points inside `box` (min lon, min lat, max lon, max lat)."""
+        min_lon, min_lat, max_lon, max_lat = box
+        if self._extent is not None and (min_lon <= self._extent[0] and min_lat <= self._extent[1] and
+                                         max_lon >= self._extent[2] and max_lat >= self._extent[3]):
+            return self._located
+        rows, cols = self.shape
+        x0 = max(math.floor((min_lon - self.origin[0]) / self.cell), 0)
+        x1 = min(math.floor((max_lon - self.origin[0]) / self.cell), cols - 1)
+        y0 = max(math.floor((min_lat - self.origin[1]) / self.cell), 0)
+        y1 = min(math.floor((max_lat - self.origin[1]) / self.cell), rows - 1)
+        if x0 > x1 or y0 > y1:
+            return np.empty(0, dtype='int64')
+
+        #  one run of points per grid row
+        row_starts = np.arange(y0, y1 + 1) * cols
+        firsts = self._starts[row_starts + x0]
+        lasts = self._starts[row_starts + x1 + 1]
+        lengths = lasts - firsts
+        candidates = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(firsts, lengths)
+
+        lon, lat = self._lon[candidates], self._lat[candidates]
+        inside = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+        return np.sort(self._order[candidates[inside]])
+
+
+class FilterIndex:
+    """Rows of a frame selected by any conjunction of value ranges and category sets.
+
+    Predicates are evaluated as bitmaps, one bit per row packed eight to a byte, and a
+    conjunction is the bitwise AND of its predicates' bitmaps. Every category of the
+    categorical columns has a precomputed bitmap of its rows. Every numeric column is kept
+    sorted (an argsort plus the sorted values) and split into `bins` equal-count bins, with
+    a precomputed bitmap of the rows below each bin edge: the rows in a range are then the
+    bitmap up to the last whole bin AND NOT the bitmap up to the first, plus the few rows
+    of the two partial bins at its ends, found by binary search. A range that spans the
+    whole column selects every row and is skipped. Selections return sorted positions into
+    the frame, like a GridIndex over the same frame.
+    """
+
+    def __init__(self, frame, ranges=(), categories=(), bins=32):
+        self.size = len(frame)
+        self._nbytes = (self.size + 7) // 8
+        self._sorted = {}
+        for column in ranges:
+            values = frame[column].to_numpy(dtype='float64')
+            order = np.argsort(values, kind='stable')
+            #  missing values sort last and never fall within a range
+            finite = int(np.isfinite(values).sum())
+            edges = np.unique(np.linspace(0, finite, bins + 1).round().astype('int64'))
+            below = np.zeros((len(edges), self._nbytes), dtype='uint8')
+            for i, edge in enumerate(edges[1:], 1):
+                below[i] = below[i - 1]
+                self._set(below[i], order[edges[i - 1]:edge])
+            self._sorted[column] = (order, values[order][:finite], edges, below)
+        self._categories = {}
+        for column in categories:
+            codes, values = pd.factorize(frame[column])
+            self._categories[column] = {value: np.packbits(codes == code) for code, value in enumerate(values)}
+
+    def state(self):
+        """The index as numpy arrays and JSON-able metadata, which `from_state` takes back."""
+        arrays = {f'{column}.{part}': array for column, parts in self._sorted.items()
+                  for part, array in zip(('order', 'values', 'edges', 'below'), parts)}
+        arrays.update({f'{column}.bitmaps': np.array(list(bitmaps.values()), dtype='uint8').reshape(-1, self._nbytes)
+                       for column, bitmaps in self._categories.items()})
+        metadata = {'size': self.size, 'ranges': list(self._sorted),
+                    'categories': {column: list(bitmaps) for column, bitmaps in self._categories.items()}}
+        return arrays, metadata
+
+    @classmethod
+    def from_state(cls, arrays, metadata):
+        index = cls.__new__(cls)
+        index.size = metadata['size']
+        index._nbytes = (index.size + 7) // 8
+        index._sorted = {column: tuple(arrays[f'{column}.{part}'] for part in ('order', 'values', 'edges', 'below'))
+                         for column in metadata['ranges']}
+        index._categories = {column: dict(zip(values, arrays[f'{column}.bitmaps']))
+                             for column, values in metadata['categories'].items()}
+        return index
+
+    def categories(self, column):
+        return list(self._categories[column])
+
+    def bounds(self, column):
+        """Smallest and largest value of `column`, or None when it has no values."""
+        values = self._sorted[column][1]
+        return (values[0], values[-1]) if len(values) else None
+
+    @staticmethod
+    def _set(bits, rows):
+        np.bitwise_or.at(bits, rows >> 3, (128 >> (rows & 7)).astype('uint8'))
+
+    def _rows(self, positions):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[positions] = True
+        return np.packbits(mask)
+
+    def _range(self, column, low, high):
+        if low is None and high is None:
+            return None
+        order, values, edges, below = self._sorted[column]
+        start = 0 if low is None else int(np.searchsorted(values, low, side='left'))
+        stop = len(values) if high is None else int(np.searchsorted(values, high, side='right'))
+        if start == 0 and stop == self.size:
+            return None
+        #  whole bins between the first edge at or after start and the last at or before stop
+        first = int(np.searchsorted(edges, start, side='left'))
+        last = int(np.searchsorted(edges, stop, side='right')) - 1
+        if first >= last:
+            bits = np.zeros(self._nbytes, dtype='uint8')
+            self._set(bits, order[start:stop])
+            return bits
+        bits = below[last] & ~below[first]
+        self._set(bits, order[start:edges[first]])
+        self._set(bits, order[edges[last]:stop])
+        return bits
+
+    def _category(self, column, chosen):
+        bitmaps = self._categories[column]
+        bits = np.zeros(self._nbytes, dtype='uint8')
+        for value in chosen:
+            if value in bitmaps:
+                bits |= bitmaps[value]
+        return bits
+
+    def select(self, ranges=None, categories=None, positions=()):
+        """Sorted positions of the rows matching every predicate.
+
+        `ranges` maps columns to inclusive (low, high) bounds, either of which may be None;
+        `categories` maps columns to the values to keep; `positions` are arrays of positions
+        (such as GridIndex results) the rows must also be in.
+        """
+        bitmaps = [*(self._range(column, *bounds) for column, bounds in (ranges or {}).items()),
+                   *(self._category(column, chosen) for column, chosen in (categories or {}).items()),
+                   *(self._rows(rows) for rows in positions)]
+        bits = None
+        for bitmap in bitmaps:
+            if bitmap is not None:
+                bits = bitmap if bits is None else bits & bitmap
+        if bits is None:
+            return np.arange(self.size)
+        #  only the bytes with a bit set are unpacked, so a narrow selection is quick to read
+        nonzero = np.flatnonzero(bits)
+        mask = np.unpackbits(bits[nonzero]).reshape(-1, 8).view(bool)
+        return (nonzero[:, None] * 8 + np.arange(8))[mask]
@@ -0,0 +1,127 @@
+#  per-callback latency and payload metrics, served in the Prometheus text format
+#  every server-side callback is wrapped once all of them are registered; a request is
+#  timed as a whole and split into building the output (the callback function itself)
+#  and serializing it to JSON, and the size of the JSON response is recorded
+#
+#  metrics are kept per process: behind gunicorn each worker reports its own requests,
+#  told apart by the `pid` label
+import os
+import threading
+import time
+from functools import wraps
+
+import dash._callback
+import flask
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+PAYLOAD_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per callback."""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, callback, value):
+        with self._lock:
+            series = self._series.setdefault(callback, [[0] * len(self.buckets), 0, 0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def expose(self, pid):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for callback, (counts, count, total) in sorted(self._series.items()):
+                labels = f'callback="{callback}",pid="{pid}"'
+                for bound, bucket in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound:g}"}} {bucket}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'{self.name}_count{{{labels}}} {count}')
+                lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+        return lines
+
+
+latency = Histogram('dash_callback_seconds',
+                    'Wall time of a callback request.', LATENCY_BUCKETS)
+build_time = Histogram('dash_callback_build_seconds',
+                       'Time spent in the callback function building its output.', LATENCY_BUCKETS)
+serialize_time = Histogram('dash_callback_serialize_seconds',
+                           'Time spent serializing the callback output to JSON.', LATENCY_BUCKETS)
+payload = Histogram('dash_callback_response_bytes',
+                    'Size of the JSON response of a callback.', PAYLOAD_BUCKETS)
+HISTOGRAMS = (latency, build_time, serialize_time, payload)
+
+#  serialization time of the request being handled by this thread
+_current = threading.local()
+
+
+def _timed_to_json(to_json):
+    @wraps(to_json)
+    def timed(obj, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return to_json(obj, *args, **kwargs)
+        finally:
+            _current.serialize += time.perf_counter() - start
+    return timed
+
+
+def _instrumented(name, callback):
+    @wraps(callback)
+    def instrumented(*args, **kwargs):
+        _current.serialize = 0.0
+        start = time.perf_counter()
+        response = callback(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        latency.observe(name, elapsed)
+        serialize_time.observe(name, _current.serialize)
+        build_time.observe(name, elapsed - _current.serialize)
+        #  the response is the JSON text, sent as utf-8
+        payload.observe(name, len(response.encode()))
+        return response
+    return instrumented
+
+
+def instrument(app, caches=None):
+    """Wrap every server-side callback of `app` and add a /metrics route to its server.
+
+    `caches` ({name: FigureCache}) are reported too, labelled with their name. Call it after
+    the last callback has been registered. Relies on dash 2.5 serializing callback responses
+    through `dash._callback.to_json`.
+    """
+    caches = caches or {}
+    if not hasattr(dash._callback.to_json, '__wrapped__'):
+        dash._callback.to_json = _timed_to_json(dash._callback.to_json)
+
+    for entry in app.callback_map.values():
+        #  clientside callbacks never reach the server
+        if 'callback' in entry:
+            callback = entry['callback']
+            entry['callback'] = _instrumented(callback.__wrapped__.__name__, callback)
+
+    @app.server.route('/metrics')
+    def metrics():
+        pid = os.getpid()
+        lines = []
+        for histogram in HISTOGRAMS:
+            lines.extend(histogram.expose(pid))
+        if caches:
+            lines.extend(['# HELP figure_cache_requests_total Figure cache lookups by outcome.',
+                          '# TYPE figure_cache_requests_total counter'])
+            for name, cache in caches.items():
+                for (callback, result), count in sorted(cache.counts().items()):
+                    lines.append(f'figure_cache_requests_total{{cache="{name}",callback="{callback}",'
+                                 f'result="{result}",pid="{pid}"}} {count}')
+            lines.extend(['# HELP figure_cache_bytes Size of the figures held by the figure cache.',
+                          '# TYPE figure_cache_bytes gauge'])
+            for name, cache in caches.items():
+                lines.append(f'figure_cache_bytes{{cache="{name}",pid="{pid}"}} {cache.stats()["bytes"]}')
+        return flask.Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,97 @@
+#  pre-rendered first paint
+#  on a first visit the page used to load an empty layout and then fire every callback
+#  (choropleth, variable chart, histogram, slider, scatter map, treemap) before anything
+#  was drawn. Instead, the outputs of the initial callbacks at the top of the page (the
+#  choropleth, the histogram and the price slider) are computed once per version of the data
+#  and code, saved in data/store/prerender.json, and put straight into the layout, whose
+#  callbacks are then registered with prevent_initial_call. The figures further down, a
+#  megabyte or more of listings, are still drawn by their initial callbacks so that the
+#  layout stays small. The serialized layout is kept too, so serving the page does not
+#  re-encode its figures; a new data snapshot (see snapshot.py) comes with its own layout
+#  and first paint
+#
+#  usage: python prerender.py        (re)builds data/store/prerender.json
+import json
+import os
+
+import flask
+from plotly.io.json import to_json_plotly
+
+import datastore
+
+
+def path():
+    return os.path.join(datastore.STORE_DIR, 'prerender.json')
+
+
+def load(version):
+    """Saved initial outputs for `version`, or None when there are none or they are stale."""
+    try:
+        with open(path()) as file:
+            document = json.load(file)
+    except FileNotFoundError:
+        return None
+    return document['outputs'] if document.get('version') == version else None
+
+
+def save(version, outputs):
+    os.makedirs(datastore.STORE_DIR, exist_ok=True)
+    #  each process writes its own temporary file, as workers reloading new data may save at once
+    tmp = f'{path()}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as file:
+        file.write(to_json_plotly({'version': version, 'outputs': outputs}))
+    os.replace(tmp, path())
+    return path()
+
+
+def snapshot(version, build):
+    """Initial outputs as {'component-id.property': value}, read from the saved file or built.
+
+    `build()` returns the outputs, figures included, and is only called when nothing is saved
+    for `version`. Either way the values come back as plain JSON data.
+    """
+    outputs = load(version)
+    if outputs is None:
+        outputs = json.loads(to_json_plotly(build()))
+        save(version, outputs)
+    return outputs
+
+
+def fill(layout, outputs):
+    """Set every output of the snapshot on its component of `layout`."""
+    for output, value in outputs.items():
+        component_id, prop = output.rsplit('.', 1)
+        setattr(layout[component_id], prop, value)
+
+
+def serve_layout(app, current):
+    """Serve the layout of the current data snapshot, encoded once per data version.
+
+    `current()` returns the snapshot (see snapshot.py), whose `layout` is encoded the first
+    time it is asked for instead of on every page load.
+    """
+    import dash.dash
+
+    endpoint = app.config.routes_pathname_prefix + '_dash-layout'
+    encoded = {}
+
+    def layout():
+        snapshot = current()
+        body = encoded.get(snapshot.version)
+        if body is None:
+            #  looked up here, so an encoder installed later (serialization.py) is used
+            body = dash.dash.to_json(snapshot.layout)
+            #  only the latest version is kept
+            encoded.clear()
+            encoded[snapshot.version] = body
+        return flask.Response(body, mimetype='application/json')
+
+    app.server.view_functions[endpoint] = layout
+
+
+if __name__ == '__main__':
+    if os.path.exists(path()):
+        os.remove(path())
+    os.environ['PRERENDER'] = '1'
+    import app  # noqa: F401  builds the snapshot as it starts
+    print(path())
@@ -0,0 +1,193 @@
+#  radius and nearest-neighbour search over the listings' coordinates
+#  distances are great-circle (haversine) distances in kilometres. A radius search turns
+#  the circle into its bounding box, gathers the points of the grid cells under it from a
+#  GridIndex (see indexes.py), and keeps those within the distance, so it only ever looks
+#  at the points near the centre
+#
+#  the schools and job posts carry no coordinates, only a city; the places searched around
+#  are the districts (the `location` of the listings), each centred on the median position
+#  of its listings, and every mapped listing knows its nearest districts ahead of time
+#
+#  usage: python proximity.py --near "fort bonifacio, taguig" --km 2 --dataset prop4rent --max-price 20000
+import argparse
+
+import flask
+import numpy as np
+import pandas as pd
+
+from indexes import GridIndex
+
+#  mean earth radius (IUGG)
+EARTH_RADIUS_KM = 6371.0088
+
+#  kilometres per degree of latitude
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+#  nearest districts kept per listing
+NEAREST = 3
+
+#  districts with fewer listings than this are not searched around
+MIN_LISTINGS = 5
+
+#  listings returned at most by the JSON endpoint
+MAX_RESULTS = 1000
+
+
+def haversine_km(lat, lon, lat0, lon0):
+    """Great-circle distance in km from every (lat, lon) to (lat0, lon0), which broadcast."""
+    lat, lon, lat0, lon0 = (np.radians(np.asarray(value, dtype='float64')) for value in (lat, lon, lat0, lon0))
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * np.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.)))
+
+
+class RadiusIndex:
+    """Points that can be searched by distance from any position."""
+
+    def __init__(self, lat, lon, grid=None):
+        self.lat = np.asarray(lat, dtype='float64')
+        self.lon = np.asarray(lon, dtype='float64')
+        self.grid = grid if grid is not None else GridIndex(self.lon, self.lat)
+
+    def within(self, lat, lon, km):
+        """Sorted positions of the points within `km` of (lat, lon), and their distances."""
+        if not (np.isfinite(km) and km >= 0 and -90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError('km must be finite and non-negative, lat and lon a position on earth')
+        dlat = km / KM_PER_DEGREE
+        dlon = km / (KM_PER_DEGREE * max(np.cos(np.radians(abs(lat) + dlat)), 1e-6))
+        candidates = self.grid.query((lon - dlon, lat - dlat, lon + dlon, lat + dlat))
+        distances = haversine_km(self.lat[candidates], self.lon[candidates], lat, lon)
+        inside = distances <= km
+        return candidates[inside], distances[inside]
+
+
+def nearest_table(lat, lon, places_lat, places_lon, n, chunk=4096):
+    """Indices of the `n` nearest places to every point, nearest first, and their distances.
+
+    The places (districts) are few, so every point is measured against all of them, a
+    chunk of points at a time.
+    """
+    n = min(n, len(places_lat))
+    indices = np.empty((len(lat), n), dtype='int64')
+    distances = np.empty((len(lat), n))
+    for start in range(0, len(lat), chunk):
+        stop = start + chunk
+        km = haversine_km(np.asarray(lat[start:stop])[:, None], np.asarray(lon[start:stop])[:, None],
+                          places_lat[None, :], places_lon[None, :])
+        nearest = np.argpartition(km, n - 1, axis=1)[:, :n] if n < km.shape[1] else np.tile(np.arange(n), (len(km), 1))
+        order = np.argsort(np.take_along_axis(km, nearest, axis=1), axis=1, kind='stable')
+        indices[start:stop] = np.take_along_axis(nearest, order, axis=1)
+        distances[start:stop] = np.take_along_axis(km, indices[start:stop], axis=1)
+    return indices, distances
+
+
+def district_centers(*frames):
+    """Centre (median latitude and longitude) and city of every district of the listings in `frames`."""
+    listings = pd.concat([frame[['location', 'city', 'latitude', 'longitude']] for frame in frames])
+    listings = listings.astype({'location': str, 'city': str})
+    grouped = listings.groupby('location')
+    centers = grouped[['latitude', 'longitude']].median()
+    centers['city'] = grouped['city'].agg(lambda city: city.mode().iloc[0])
+    centers['listings'] = grouped.size()
+    return centers[centers['listings'] >= MIN_LISTINGS]
+
+
+class Proximity:
+    """Radius search over one dataset's listings around districts or any position.
+
+    `frame` is the dataset as the scatter map draws it, sorted by price; positions returned
+    refer to its rows. `nearest`, the (districts, km) nearest_table of the listings around
+    `centers` when it was computed before, saves computing it again.
+    """
+
+    def __init__(self, frame, centers, grid=None, nearest=None):
+        self.frame = frame
+        self.centers = centers
+        self.index = RadiusIndex(frame['latitude'].to_numpy(), frame['longitude'].to_numpy(), grid)
+        if nearest is None:
+            nearest = nearest_table(self.index.lat, self.index.lon, centers['latitude'].to_numpy(),
+                                    centers['longitude'].to_numpy(), NEAREST)
+        self.nearest_districts, self.nearest_km = nearest
+
+    def near_district(self, district, km):
+        """Sorted positions of the listings within `km` of the centre of `district`."""
+        center = self.centers.loc[district]
+        return self.index.within(center['latitude'], center['longitude'], km)[0]
+
+    def listings(self, lat, lon, km, max_price=None, limit=MAX_RESULTS):
+        """Listings within `km` of (lat, lon), at most `max_price`, nearest first, as JSON-ready dicts."""
+        positions, distances = self.index.within(lat, lon, km)
+        if max_price is not None:
+            affordable = self.frame['price'].to_numpy()[positions] <= max_price
+            positions, distances = positions[affordable], distances[affordable]
+        order = np.argsort(distances, kind='stable')[:limit]
+        positions, distances = positions[order], distances[order]
+        rows = self.frame.iloc[positions]
+        names = self.centers.index
+        return [{'listing': listing, 'location': location, 'price': float(price),
+                 'latitude': float(latitude), 'longitude': float(longitude), 'km': round(float(distance), 3),
+                 'nearest_districts': [{'district': names[district], 'km': round(float(district_km), 3)}
+                                       for district, district_km in zip(self.nearest_districts[position],
+                                                                        self.nearest_km[position])]}
+                for listing, location, price, latitude, longitude, distance, position in
+                zip(rows['listing'], rows['location'].astype(str), rows['price'], rows['latitude'],
+                    rows['longitude'], distances, positions)]
+
+
+def routes(server, searches):
+    """Add the /api/nearby route, which lists the listings around a position or district.
+
+    GET /api/nearby?dataset=prop4rent&km=2&max_price=20000&near=fort bonifacio, taguig
+    (or &lat=14.55&lon=121.05 instead of near) returns them nearest first. `searches` may be
+    a function returning them, called per request.
+    """
+    current = searches if callable(searches) else lambda: searches
+
+    @server.route('/api/nearby')
+    def nearby():
+        query = flask.request.args
+        datasets = current()
+        search = datasets.get(query.get('dataset', 'prop4rent'))
+        if search is None:
+            return flask.jsonify(error=f'dataset must be one of {", ".join(datasets)}'), 400
+        try:
+            km = float(query.get('km', 1))
+            max_price = float(query['max_price']) if 'max_price' in query else None
+            limit = min(int(query.get('limit', MAX_RESULTS)), MAX_RESULTS)
+            if limit < 1:
+                raise ValueError('limit must be at least 1')
+            if 'near' in query:
+                center = search.centers.loc[query['near']]
+                lat, lon = center['latitude'], center['longitude']
+            else:
+                lat, lon = float(query['lat']), float(query['lon'])
+        except KeyError as error:
+            return flask.jsonify(error=f'unknown or missing {error}'), 400
+        except ValueError as error:
+            return flask.jsonify(error=str(error)), 400
+        try:
+            return flask.jsonify(search.listings(lat, lon, km, max_price, limit))
+        except ValueError as error:
+            #  a distance or position within() refuses
+            return flask.jsonify(error=str(error)), 400
+
+
+def main():
+    import datastore
+
+    parser = argparse.ArgumentParser(description='List the listings within a distance of a district.')
+    parser.add_argument('--near', required=True, help='district, e.g. "fort bonifacio, taguig"')
+    parser.add_argument('--km', type=float, default=1.)
+    parser.add_argument('--dataset', choices=['prop4sale', 'prop4rent'], default='prop4rent')
+    parser.add_argument('--max-price', type=float)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    frames = {name: datastore.load(name) for name in ('prop4sale', 'prop4rent')}
+    search = Proximity(frames[args.dataset], district_centers(*frames.values()))
+    center = search.centers.loc[args.near]
+    for listing in search.listings(center['latitude'], center['longitude'], args.km, args.max_price, args.limit):
+        print(f'{listing["km"]:6.2f} km  {listing["price"]:>14,.0f}  {listing["listing"]}')
+
+
+if __name__ == '__main__':
+    main()
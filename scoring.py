@@ -0,0 +1,196 @@
+#  city desirability scores
+#  every city (or district) gets a vector of features, each scaled to 0-1 so that 1 is the
+#  most desirable value among the places compared: cheaper homes and rents, higher salaries,
+#  more job posts and more schools. A user's weights then score every place at once with a
+#  single matrix-vector product, and many sets of weights with a single matrix product
+#
+#  the features are built once at startup from the city aggregates and the datasets;
+#  districts are the `location` of the listings, and take the job and school features of
+#  their city, as job posts and schools are only known per city
+#
+#  usage: python scoring.py --weights sale_price=2 schools=1 --level district --top 10
+import argparse
+
+import flask
+import numpy as np
+import pandas as pd
+
+#  feature -> (label, True when larger values are more desirable)
+FEATURES = {'sale_price': ('Home prices', False),
+            'rent': ('Rents', False),
+            'salary': ('Salaries', True),
+            'jobs': ('Job posts', True),
+            'schools': ('Schools', True)}
+
+#  weight of a feature a query leaves out
+DEFAULT_WEIGHT = 1.
+
+#  districts with fewer listings than this get no price or rent feature of their own
+MIN_LISTINGS = 5
+
+#  sets of weights ranked at most per request to the JSON endpoint
+MAX_QUERIES = 1000
+
+
+def scale(table):
+    """`table` of raw features scaled column by column to 0-1, 1 being the most desirable.
+
+    A place missing a feature gets the average of the other places for it.
+    """
+    low, high = table.min(), table.max()
+    scaled = (table - low) / (high - low).where(high > low, 1.)
+    for feature, (_, larger_is_better) in FEATURES.items():
+        if not larger_is_better:
+            scaled[feature] = 1. - scaled[feature]
+    return scaled.fillna(scaled.mean()).fillna(.5)
+
+
+class Scorer:
+    """Ranks the places of a feature table for any weights over its features."""
+
+    def __init__(self, table, cities):
+        self.places = list(table.index)
+        self.cities = [cities[place] for place in self.places]
+        self.table = table[list(FEATURES)]
+        self._matrix = np.ascontiguousarray(scale(self.table).to_numpy(dtype='float64'))
+
+    def weights(self, values):
+        """Weight vector of a {feature: weight} mapping, or of a sequence in FEATURES order."""
+        if isinstance(values, dict):
+            unknown = set(values) - set(FEATURES)
+            if unknown:
+                raise ValueError(f'unknown features: {", ".join(sorted(unknown))}')
+            values = [values.get(feature, DEFAULT_WEIGHT) for feature in FEATURES]
+        weights = np.asarray(values, dtype='float64')
+        if weights.shape[-1] != len(FEATURES) or (weights < 0).any() or not np.isfinite(weights).all():
+            raise ValueError(f'expected {len(FEATURES)} finite, non-negative weights')
+        return weights
+
+    def scores(self, weights):
+        """Score of every place, 0-100, for a weight vector.
+
+        For a (queries, features) array of weight vectors, a (places, queries) array of scores.
+        """
+        weights = np.asarray(weights, dtype='float64')
+        total = weights.sum(axis=-1)
+        return 100 * (self._matrix @ weights.T) / np.where(total > 0, total, np.inf)
+
+    def rank(self, weights, top=None):
+        """Places best first, as (place, city, score) tuples, for a weight vector.
+
+        For a (queries, features) array of weight vectors, a list of rankings.
+        """
+        scores = self.scores(weights)
+        if scores.ndim == 2:
+            return [self._ranking(column, top) for column in scores.T]
+        return self._ranking(scores, top)
+
+    def _ranking(self, scores, top):
+        order = np.argsort(-scores, kind='stable')[:top]
+        return [(self.places[i], self.cities[i], float(scores[i])) for i in order]
+
+
+def city_features(summaries):
+    """Raw features of every city, from the city aggregates ({dataset: {city: Summary}})."""
+    cities = sorted({city for name in ('prop4sale', 'prop4rent') for city in summaries[name] if city is not None})
+
+    def column(name, statistic):
+        return [statistic(summaries[name][city]) if city in summaries[name] else np.nan for city in cities]
+
+    return pd.DataFrame({'sale_price': column('prop4sale', lambda summary: summary.median),
+                         'rent': column('prop4rent', lambda summary: summary.median),
+                         'salary': column('jobs', lambda summary: summary.median),
+                         'jobs': column('jobs', lambda summary: summary.count),
+                         'schools': column('schools', lambda summary: summary.count)},
+                        index=pd.Index(cities, name='place'))
+
+
+def district_features(prop4sale, prop4rent, by_city):
+    """Raw features of every district of the listings, and the city of every district.
+
+    Prices and rents are the district's own medians; the other features are those of its
+    city, from the `by_city` table.
+    """
+    def medians(frame):
+        grouped = frame.groupby('location', observed=True)['price']
+        return grouped.median().where(grouped.size() >= MIN_LISTINGS)
+
+    listings = pd.concat([prop4sale[['location', 'city']], prop4rent[['location', 'city']]])
+    cities = listings.astype(str).groupby('location')['city'].agg(lambda city: city.mode().iloc[0])
+    table = pd.DataFrame({'sale_price': medians(prop4sale), 'rent': medians(prop4rent)}, index=cities.index)
+    for feature in ('salary', 'jobs', 'schools'):
+        table[feature] = cities.map(by_city[feature]).to_numpy()
+    table.index.name = 'place'
+    return table, cities.to_dict()
+
+
+def scorers(summaries, prop4sale, prop4rent):
+    """{'city': Scorer, 'district': Scorer} for the dashboard's datasets."""
+    by_city = city_features(summaries)
+    by_district, district_cities = district_features(prop4sale, prop4rent, by_city)
+    return {'city': Scorer(by_city, {city: city for city in by_city.index}),
+            'district': Scorer(by_district, district_cities)}
+
+
+def routes(server, scorers):
+    """Add the /api/rank route, which ranks places for weights given as query parameters.
+
+    GET /api/rank?level=district&top=5&sale_price=2&schools=0 ranks for one set of weights
+    (left-out features weigh 1); POST a JSON {"level", "top", "weights": [{feature: weight}]}
+    to rank for many at once. `scorers` may be a function returning them, called per request.
+    """
+    current = scorers if callable(scorers) else lambda: scorers
+
+    def ranking(places):
+        return [{'place': place, 'city': city, 'score': round(score, 2)} for place, city, score in places]
+
+    @server.route('/api/rank', methods=['GET', 'POST'])
+    def rank():
+        if flask.request.method == 'POST':
+            #  an empty body ranks for the default weights, anything else must be a JSON object
+            query = flask.request.get_json(silent=True) if flask.request.get_data() else {}
+            if not isinstance(query, dict):
+                return flask.jsonify(error='expected a JSON object'), 400
+        else:
+            query = flask.request.args
+        levels = current()
+        level = query.get('level', 'city')
+        scorer = levels.get(level) if isinstance(level, str) else None
+        if scorer is None:
+            return flask.jsonify(error=f'level must be one of {", ".join(levels)}'), 400
+        try:
+            top = int(query['top']) if query.get('top') is not None else None
+            if top is not None and top <= 0:
+                raise ValueError('top must be a positive number of places')
+            if flask.request.method == 'GET':
+                weights = scorer.weights({feature: float(value) for feature, value in query.items()
+                                          if feature not in ('level', 'top')})
+                return flask.jsonify(ranking(scorer.rank(weights, top)))
+            queries = query.get('weights', [])[:MAX_QUERIES]
+            weights = np.stack([scorer.weights(values) for values in queries]) if queries else np.empty((0, len(FEATURES)))
+        except (KeyError, ValueError, TypeError) as error:
+            return flask.jsonify(error=str(error)), 400
+        return flask.jsonify([ranking(places) for places in scorer.rank(weights, top)])
+
+
+def main():
+    import aggregates
+    import datastore
+
+    parser = argparse.ArgumentParser(description='Rank the cities or districts for a set of weights.')
+    parser.add_argument('--weights', nargs='*', default=[], metavar='FEATURE=WEIGHT',
+                        help=f'features: {", ".join(FEATURES)}; left-out features weigh {DEFAULT_WEIGHT:g}')
+    parser.add_argument('--level', choices=['city', 'district'], default='city')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    frames = {name: datastore.load(name) for name in datastore.SOURCES}
+    scorer = scorers(aggregates.load(frames), frames['prop4sale'], frames['prop4rent'])[args.level]
+    weights = scorer.weights({feature: float(weight) for feature, weight in
+                              (item.split('=', 1) for item in args.weights)})
+    for place, city, score in scorer.rank(weights, args.top):
+        print(f'{score:6.1f}  {place}' + ('' if place == city else f' ({city})'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#  opt-in fast JSON serialization of callback responses and the layout
+#  with FAST_JSON on, Dash's encoder is replaced by orjson, which writes numpy arrays
+#  natively and calls `to_plotly_json` on figures and components as it meets them, rather
+#  than walking and converting the whole response in python first. Anything orjson cannot
+#  write still goes through plotly's own encoder, so the JSON describes the same figures
+#
+#  with FAST_JSON_TYPED_ARRAYS also on, numeric trace arrays are sent as plotly's base64
+#  typed arrays ({'dtype': 'f8', 'bdata': ...}); that needs plotly.js 2.28 or later in the
+#  browser, and is turned off with a warning when dash bundles an older one
+#
+#  usage: python serialization.py    checks that every callback output encodes to the same
+#                                    figure both ways and times the two encoders
+import os
+import re
+import warnings
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+import clientside
+
+#  first plotly.js release that decodes typed arrays
+TYPED_ARRAYS_SINCE = (2, 28)
+
+#  shorter arrays are not worth encoding
+TYPED_ARRAY_MIN = 16
+
+#  numpy dtypes plotly.js has typed arrays for; 64-bit integers are sent as float64
+_TYPED = {'f8': 'f8', 'f4': 'f4', 'i4': 'i4', 'u4': 'u4', 'i2': 'i2', 'u2': 'u2',
+          'i1': 'i1', 'u1': 'u1', 'i8': 'f8', 'u8': 'f8'}
+
+_typed_arrays = False
+
+
+def plotlyjs_version():
+    """Version of the plotly.js bundled with dash, as a tuple of ints."""
+    from dash import dcc
+    with open(os.path.join(os.path.dirname(dcc.__file__), 'plotly.min.js')) as file:
+        header = file.read(200)
+    return tuple(int(part) for part in re.search(r'plotly\.js v(\d+)\.(\d+)', header).groups())
+
+
+def _typed(values):
+    #  {'dtype', 'bdata'} for a long enough numeric array, None otherwise
+    if len(values) < TYPED_ARRAY_MIN:
+        return None
+    try:
+        array = np.asarray(values)
+    except ValueError:
+        return None
+    if array.ndim != 1 or array.dtype.kind not in 'iuf':
+        return None
+    dtype = _TYPED[array.dtype.str[1:]]
+    return {'dtype': dtype, 'bdata': clientside.encode_array(array, dtype)}
+
+
+def _encode_arrays(value):
+    #  replace every numeric array below a figure trace by its typed array
+    if isinstance(value, dict):
+        return {key: (_typed(item) or item) if isinstance(item, (list, np.ndarray)) else _encode_arrays(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [_encode_arrays(item) for item in value]
+    return value
+
+
+def typed_arrays(figure):
+    """Copy of a figure dict with the numeric arrays of its traces as base64 typed arrays."""
+    return {**figure, 'data': [_encode_arrays(trace) for trace in figure.get('data', [])]}
+
+
+def _default(obj):
+    if hasattr(obj, 'to_plotly_json'):
+        obj = obj.to_plotly_json()
+        if _typed_arrays and isinstance(obj, dict) and 'data' in obj and 'layout' in obj:
+            obj = typed_arrays(obj)
+        return obj
+    if isinstance(obj, np.ndarray):
+        #  non-contiguous or of a dtype orjson does not write natively
+        return obj.tolist()
+    raise TypeError
+
+
+def dumps(value):
+    """JSON of a callback response or layout, as a str."""
+    import orjson
+
+    if _typed_arrays:
+        value = _with_typed_arrays(value)
+    try:
+        return orjson.dumps(value, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    except TypeError:
+        return to_json_plotly(value, engine='orjson')
+
+
+def _with_typed_arrays(value):
+    #  figures that are already dicts, e.g. served from the figure cache
+    if isinstance(value, dict):
+        if 'data' in value and 'layout' in value:
+            return typed_arrays(value)
+        return {key: _with_typed_arrays(item) for key, item in value.items()}
+    return value
+
+
+def install(typed=False):
+    """Serialize callback responses and the layout with `dumps` from now on.
+
+    Also makes orjson plotly's default engine, which the figure cache uses.
+    """
+    global _typed_arrays
+    import dash._callback
+    import dash.dash
+    import orjson  # noqa: F401  fail here rather than on the first request
+    import plotly.io
+
+    if typed and plotlyjs_version() < TYPED_ARRAYS_SINCE:
+        warnings.warn(f'the plotly.js bundled with dash ({".".join(map(str, plotlyjs_version()))}) '
+                      'cannot decode typed arrays, FAST_JSON_TYPED_ARRAYS is ignored')
+        typed = False
+    _typed_arrays = typed
+    plotly.io.json.config.default_engine = 'orjson'
+    dash._callback.to_json = dumps
+    dash.dash.to_json = dumps
+
+
+def verify(app, repeats=5):
+    """Encode every callback output of `app` with plotly's json engine and with `dumps`.
+
+    Returns the outputs whose JSON decodes differently, and the seconds each encoder took.
+    """
+    import json
+    import time
+
+    import benchmark
+
+    mismatches, seconds = [], {'json': 0., 'fast': 0.}
+    for name, call in benchmark.cases(app):
+        response = {'response': {'output': {'figure': call()}}}
+        start = time.perf_counter()
+        for _ in range(repeats):
+            reference = to_json_plotly(response, engine='json')
+        seconds['json'] += time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fast = dumps(response)
+        seconds['fast'] += time.perf_counter() - start
+        if json.loads(reference) != json.loads(fast):
+            mismatches.append(name)
+    return mismatches, seconds
+
+
+if __name__ == '__main__':
+    import app
+
+    mismatches, seconds = verify(app)
+    print(f'json engine {seconds["json"]:.3f}s, fast path {seconds["fast"]:.3f}s')
+    print('identical figures' if not mismatches else f'differences in: {", ".join(mismatches)}')
@@ -0,0 +1,134 @@
+#  versioned data snapshots, swapped in when the data changes on disk
+#  everything the dashboard derives from the datasets (frames, indexes, aggregates, static
+#  charts, the layout) is built into one Snapshot tagged with the data's version. Callbacks
+#  read `reloader.current` once and use that snapshot throughout, so a new one is swapped
+#  in with a single assignment and no response mixes two versions of the data
+#
+#  workers look at the data's version on disk at most every RELOAD_INTERVAL seconds, as
+#  they serve requests. Once a new version has stayed the same for a whole interval, so
+#  that every cleaned csv of the refresh has been written, a background thread builds its
+#  snapshot while the old one keeps serving, then swaps it in. The old snapshot, and the
+#  results memoized from it, are freed as soon as the requests still reading it finish
+#
+#  usage: python snapshot.py        prints the version of the data on disk
+import functools
+import gc
+import logging
+import threading
+import time
+
+import datastore
+
+log = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """The data built from one version of the datasets, as attributes."""
+
+    def __init__(self, version, **data):
+        self.version = version
+        self.loaded = time.time()
+        self.memos = {}
+        self.__dict__.update(data)
+
+
+def cached(maxsize=128):
+    """Memoize `function(snapshot, *args)` per snapshot, like functools.lru_cache.
+
+    The memo is kept on the snapshot, so it goes away with it instead of holding on to
+    an old version's data; `wrapper.cache_clear(snapshot)` empties it.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(snapshot, *args):
+            memo = snapshot.memos.get(function)
+            if memo is None:
+                memo = snapshot.memos.setdefault(function, functools.lru_cache(maxsize)(
+                    functools.partial(function, snapshot)))
+            return memo(*args)
+
+        wrapper.cache_clear = lambda snapshot: snapshot.memos.pop(function, None)
+        return wrapper
+    return decorator
+
+
+class Reloader:
+    """Holds the current snapshot and replaces it when the data on disk changes.
+
+    `build(version)` returns the Snapshot of a data version; `version()` names the data on
+    disk and should be cheap, it is called at most once every `interval` seconds (0 never
+    checks, the first snapshot is then kept for good).
+    """
+
+    def __init__(self, build, version=datastore.version, interval=0):
+        self.build = build
+        self.version = version
+        self.interval = interval
+        self.current = build(version())
+        self._seen = self.current.version
+        self._failed = None
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def on_swap(self, listener):
+        """Call `listener(snapshot)` after every swap, e.g. to drop what the old one built."""
+        self._listeners.append(listener)
+        return listener
+
+    @property
+    def reloading(self):
+        return self._lock.locked()
+
+    def check(self):
+        """Start building the new snapshot in the background once a new data version has settled."""
+        now = time.monotonic()
+        if not self.interval or now - self._checked < self.interval:
+            return
+        self._checked = now
+        try:
+            version = self.version()
+        except OSError:
+            #  a csv in the middle of being replaced
+            return
+        settled, self._seen = version == self._seen, version
+        if (settled and version not in (self.current.version, self._failed)
+                and self._lock.acquire(blocking=False)):
+            threading.Thread(target=self._reload, args=(version,), name='snapshot-reload', daemon=True).start()
+
+    def install(self, server):
+        """Check for new data before the requests of the flask `server`."""
+        server.before_request(self.check)
+
+    def reload(self, version=None):
+        """Build the snapshot of `version`, by default the data on disk, swap it in and return it."""
+        with self._lock:
+            return self._swap(self.build(version or self.version()))
+
+    def _reload(self, version):
+        #  runs on its own thread, with the lock taken by check()
+        try:
+            self._swap(self.build(version))
+        except Exception:
+            self._failed = version
+            log.exception('could not load data version %s, still serving %s', version, self.current.version)
+        finally:
+            self._lock.release()
+
+    def _swap(self, snapshot):
+        previous, self.current = self.current, snapshot
+        for listener in self._listeners:
+            listener(snapshot)
+        #  the memoized methods of the indexes are reference cycles, which only the garbage
+        #  collector frees; gunicorn.conf.py freezes what the master built, which the
+        #  collector would otherwise never look at again
+        del previous
+        if gc.get_freeze_count():
+            gc.unfreeze()
+        gc.collect()
+        log.info('now serving data version %s', snapshot.version)
+        return snapshot
+
+
+if __name__ == '__main__':
+    print(datastore.version())
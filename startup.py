@@ -0,0 +1,87 @@
+#  opt-in startup instrumentation
+#  app.py wraps each of its startup phases in `startup.phase(name)`; with STARTUP_PROFILE
+#  set to a file path, the time and memory of every phase are written there as JSON
+#  once the app has been built, e.g.
+#
+#      STARTUP_PROFILE=startup-{pid}.json gunicorn -c gunicorn.conf.py app:server
+#
+#  without it, phases are not measured at all
+#  kept free of third-party imports so it can time the imports of app.py itself
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+REPORT = os.environ.get('STARTUP_PROFILE', '')
+
+_started = time.perf_counter()
+_phases = []
+
+
+def rss():
+    """Resident memory of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        #  no procfs (macOS, Windows): fall back to the peak, the closest thing available
+        return peak_rss()
+
+
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #  kilobytes on linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Record the wall time and memory growth of the block, when profiling is on."""
+    if not REPORT:
+        yield
+        return
+    rss_before = rss()
+    modules_before = len(sys.modules)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        rss_after = rss()
+        _phases.append({'name': name,
+                        'seconds': round(seconds, 6),
+                        'rss_before': rss_before,
+                        'rss_after': rss_after,
+                        'rss_delta': rss_after - rss_before,
+                        'peak_rss': peak_rss(),
+                        'modules_imported': len(sys.modules) - modules_before})
+
+
+def report():
+    versions = {}
+    for package in ('dash', 'plotly', 'pandas', 'numpy', 'pyarrow'):
+        module = sys.modules.get(package)
+        if module is not None:
+            versions[package] = getattr(module, '__version__', None)
+    return {'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'pid': os.getpid(),
+            'python': platform.python_version(),
+            'versions': versions,
+            'total_seconds': round(time.perf_counter() - _started, 6),
+            'phase_seconds': round(sum(p['seconds'] for p in _phases), 6),
+            'rss': rss(),
+            'peak_rss': peak_rss(),
+            'phases': _phases}
+
+
+def write_report():
+    """Write the report to STARTUP_PROFILE, if set; `{pid}` in the path is filled in."""
+    if not REPORT:
+        return None
+    path = REPORT.format(pid=os.getpid())
+    with open(path, 'w') as file:
+        json.dump(report(), file, indent=2)
+    return path
@@ -0,0 +1,129 @@
+#  synthetic NCR datasets for scale testing
+#  rows are drawn from the real cleaned datasets (so the city mix and the joint
+#  distribution of price, floor area and rooms are the real ones) with noise on prices
+#  and salaries, coordinates jittered and kept inside the listing's city boundary, and
+#  generated listing and school names. Files use the same schema and names as
+#  data/clean and are written in chunks: the real dataset being sampled is loaded whole,
+#  but a synthetic file is never held in memory as a whole, whatever its row count
+#
+#  usage: python synthetic.py --rows 1000000 --output data/synthetic
+#         python benchmark.py --data data/synthetic
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import datastore
+import geodata
+
+#  relative spread of the multiplicative noise on prices and salaries
+PRICE_NOISE = .05
+
+#  standard deviation of the coordinate jitter, in degrees (~200 m)
+COORD_NOISE = .002
+
+
+def reference(name):
+    """The real cleaned dataset that synthetic rows of `name` are drawn from."""
+    return pd.read_csv(datastore.source_path(name), index_col=0)
+
+
+def _noisy(values, rng):
+    return (values * rng.lognormal(0, PRICE_NOISE, len(values))).round(-2).clip(min=100)
+
+
+def random_points(geometry, n, rng):
+    """`n` uniformly distributed points inside a GeoJSON geometry, by rejection sampling."""
+    min_lon, min_lat, max_lon, max_lat = geodata.bounds(geometry)
+    lon, lat = np.empty(0), np.empty(0)
+    while len(lon) < n:
+        lon_try = rng.uniform(min_lon, max_lon, 2 * n)
+        lat_try = rng.uniform(min_lat, max_lat, 2 * n)
+        inside = geodata.contains(geometry, lon_try, lat_try)
+        lon, lat = np.r_[lon, lon_try[inside]], np.r_[lat, lat_try[inside]]
+    return lon[:n], lat[:n]
+
+
+def place(rows, boundaries, rng, attempts=5):
+    """Jitter the coordinates of `rows`, keeping each one inside its city's boundary.
+
+    Points still outside after `attempts` jitters (e.g. drawn from an outlier) are
+    replaced by a uniformly random point in the city.
+    """
+    lon = rows['longitude'].to_numpy(dtype='float64', copy=True)
+    lat = rows['latitude'].to_numpy(dtype='float64', copy=True)
+    cities = rows['city'].to_numpy()
+    for city in np.unique(cities):
+        geometry = boundaries.get(city)
+        if geometry is None:
+            continue
+        todo = np.flatnonzero(cities == city)
+        origin_lon, origin_lat = lon[todo], lat[todo]
+        for _ in range(attempts):
+            lon_try = origin_lon + rng.normal(0, COORD_NOISE, len(todo))
+            lat_try = origin_lat + rng.normal(0, COORD_NOISE, len(todo))
+            inside = geodata.contains(geometry, lon_try, lat_try)
+            lon[todo[inside]], lat[todo[inside]] = lon_try[inside], lat_try[inside]
+            todo, origin_lon, origin_lat = todo[~inside], origin_lon[~inside], origin_lat[~inside]
+            if not len(todo):
+                break
+        if len(todo):
+            lon[todo], lat[todo] = random_points(geometry, len(todo), rng)
+    return lon, lat
+
+
+def chunk(name, source, start, n, boundaries, rng):
+    """Rows `start` to `start + n` of a synthetic `name` dataset."""
+    rows = source.iloc[rng.integers(0, len(source), n)].reset_index(drop=True)
+    ids = np.arange(start, start + n).astype(str)
+    if name in ('prop4sale', 'prop4rent'):
+        offer = 'for Sale' if name == 'prop4sale' else 'for Rent'
+        rows['price'] = _noisy(rows['price'].to_numpy(), rng)
+        rows['longitude'], rows['latitude'] = place(rows, boundaries, rng)
+        rows['listing'] = (rows['bedroom_num'].astype(int).astype(str) + '-BR Unit ' + offer + ' in '
+                           + rows['location'].str.title() + ' #' + ids)
+    elif name == 'jobs':
+        rows['salary'] = _noisy(rows['salary'].to_numpy(), rng)
+    elif name == 'schools':
+        rows['school_name'] = 'Synthetic School ' + pd.Series(ids)
+    rows.index = pd.RangeIndex(start, start + n)
+    return rows
+
+
+def generate(name, rows, chunk_size=100_000, seed=0, boundaries=None):
+    """Yield a synthetic `name` dataset of `rows` rows as DataFrames of `chunk_size` rows."""
+    rng = np.random.default_rng(seed)
+    source = reference(name)
+    if boundaries is None:
+        ncr_geodata = geodata.load()
+        boundaries = dict(zip(ncr_geodata['city'], ncr_geodata['geometry']))
+    for start in range(0, rows, chunk_size):
+        yield chunk(name, source, start, min(chunk_size, rows - start), boundaries, rng)
+
+
+def write(name, rows, directory, chunk_size=100_000, seed=0):
+    """Stream a synthetic `name` dataset into `directory`, named like its cleaned csv."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, datastore.SOURCES[name])
+    with open(path, 'w', newline='') as file:
+        for i, frame in enumerate(generate(name, rows, chunk_size, seed)):
+            frame.to_csv(file, header=(i == 0))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic NCR datasets.')
+    parser.add_argument('--rows', type=int, required=True, help='rows per dataset')
+    parser.add_argument('--datasets', nargs='+', choices=list(datastore.SOURCES),
+                        default=list(datastore.SOURCES))
+    parser.add_argument('--output', default='data/synthetic')
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for i, name in enumerate(args.datasets):
+        print(write(name, args.rows, args.output, args.chunk_size, args.seed + i))
+
+
+if __name__ == '__main__':
+    main()
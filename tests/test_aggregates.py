@@ -0,0 +1,159 @@
+#  the per-city summaries of aggregates.py against numpy on the raw values
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import aggregates
+import datastore
+from aggregates import Summary
+
+
+def test_summary_is_exact_below_the_sketch_limit():
+    values = np.random.default_rng(0).integers(1, 500, 2000) * 100.
+    summary = Summary(np.r_[values, np.nan])
+    assert not summary.compacted
+    assert summary.count == len(values)
+    assert summary.total == values.sum()
+    assert (summary.low, summary.high) == (values.min(), values.max())
+    assert summary.mean == pytest.approx(values.mean())
+    for q in (0, .1, .25, .5, .9, 1):
+        assert summary.quantile(q) == np.quantile(values, q)
+
+
+def test_merged_summary_is_the_summary_of_the_union():
+    rng = np.random.default_rng(1)
+    a, b = rng.integers(0, 300, 1000) * 10., rng.integers(200, 900, 700) * 10.
+    merged = Summary(a).merge(Summary(b))
+    union = Summary(np.r_[a, b])
+    np.testing.assert_array_equal(merged.values, union.values)
+    np.testing.assert_array_equal(merged.counts, union.counts)
+    assert (merged.count, merged.total, merged.low, merged.high) == (union.count, union.total, union.low, union.high)
+
+
+def test_compacted_quantiles_stay_within_the_relative_error():
+    rng = np.random.default_rng(2)
+    parts = [rng.lognormal(10, 1, 30_000), rng.lognormal(11, .5, 20_000), rng.lognormal(9, 2, 5_000)]
+    merged = Summary()
+    for part in parts:
+        merged = merged.merge(Summary(part))
+    values = np.concatenate(parts)
+    assert merged.compacted
+    assert len(merged.values) <= aggregates.MAX_VALUES
+    assert merged.count == len(values)
+    #  the count, sum and extremes are kept exactly
+    assert merged.total == pytest.approx(values.sum(), rel=1e-12)
+    assert (merged.low, merged.high) == (values.min(), values.max())
+    for q in np.linspace(0, 1, 21):
+        exact = np.quantile(values, q)
+        assert abs(merged.quantile(q) - exact) <= aggregates.ACCURACY * exact * (1 + 1e-9)
+
+
+def test_empty_summaries():
+    empty = Summary()
+    assert empty.count == 0
+    assert math.isnan(empty.mean) and math.isnan(empty.median)
+    assert Summary([1., 2.]).merge(empty).median == 1.5
+
+
+def test_summary_round_trips_through_json_data():
+    summary = Summary(np.random.default_rng(3).lognormal(10, 1, 20_000))
+    restored = Summary.from_dict(summary.to_dict())
+    np.testing.assert_array_equal(restored.values, summary.values)
+    np.testing.assert_array_equal(restored.counts, summary.counts)
+    assert restored.median == summary.median and restored.compacted
+
+
+def test_summarize_adds_every_city_under_none():
+    frame = pd.DataFrame({'city': ['makati', 'pasig', 'makati', 'taguig', 'pasig'],
+                          'price': [10., 20., 30., 40., np.nan]})
+    summaries = aggregates.summarize('prop4rent', frame)
+    assert set(summaries) == {'makati', 'pasig', 'taguig', None}
+    assert summaries['makati'].median == 20.
+    assert summaries['pasig'].count == 1
+    assert summaries[None].count == 4 and summaries[None].total == 100.
+    schools = aggregates.summarize('schools', frame)
+    assert schools['makati'].count == 2 and schools[None].count == 5
+
+
+@pytest.mark.parametrize('low, high, bins', [(0., 1., 10), (3_500., 1_250_000., 40), (12_345., 98_765., 7),
+                                             (-5., 5., 3), (.001, .0042, 20), (1e6, 1e6 + 1, 50)])
+def test_bin_edges_cover_the_range_at_a_round_width(low, high, bins):
+    edges = aggregates.bin_edges(low, high, bins)
+    assert edges[0] <= low and edges[-1] > high
+    widths = np.diff(edges)
+    np.testing.assert_allclose(widths, widths[0])
+    mantissa = widths[0] / 10 ** math.floor(math.log10(widths[0]))
+    assert min(abs(mantissa - m) for m in (1, 2, 5, 10)) < 1e-6
+    assert bins / 5 <= len(widths) <= bins + 2
+
+
+def test_bin_edges_of_a_single_value():
+    np.testing.assert_array_equal(aggregates.bin_edges(7., 7., 30), [6.5, 7.5])
+
+
+def test_summary_histogram_counts_every_value_in_its_bin():
+    values = np.random.default_rng(4).integers(1, 300, 5000) * 250.
+    edges = aggregates.bin_edges(values.min(), values.max(), 30)
+    counts, returned = Summary(values).histogram(edges)
+    np.testing.assert_array_equal(returned, edges)
+    np.testing.assert_array_equal(counts, np.histogram(values, bins=edges)[0])
+    assert counts.sum() == len(values)
+
+
+def rentals(seed, n=3000):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'city': rng.choice(['makati', 'pasig', 'taguig'], n),
+                         'price': rng.lognormal(10, .8, n).round(-1)})
+
+
+def assert_same_summaries(actual, expected):
+    assert set(actual) == set(expected)
+    for city in expected:
+        assert actual[city].to_dict() == expected[city].to_dict(), city
+
+
+def test_update_matches_a_full_rebuild_and_keeps_unchanged_cities():
+    before = rentals(5, n=40_000)
+    summaries, fingerprints = aggregates.update({}, {}, 'prop4rent', before)
+    after = before.copy()
+    pasig = after.index[after.city == 'pasig']
+    after.loc[pasig[:10], 'price'] *= 2
+    after = pd.concat([after, pd.DataFrame({'city': ['makati'], 'price': [12345.]})], ignore_index=True)
+    after = after[after.city != 'taguig'].sample(frac=1, random_state=0)
+
+    updated, _ = aggregates.update(summaries, fingerprints, 'prop4rent', after)
+    assert_same_summaries(updated, aggregates.summarize('prop4rent', after))
+    assert updated['pasig'] is not summaries['pasig'] and updated['makati'] is not summaries['makati']
+    assert 'taguig' not in updated
+
+    #  reordering rows changes nothing, so every city is kept as it was
+    shuffled, _ = aggregates.update(updated, _, 'prop4rent', after.sample(frac=1, random_state=1))
+    assert all(shuffled[city] is updated[city] for city in ('makati', 'pasig'))
+
+
+def test_load_updates_the_saved_aggregates(tmp_path, monkeypatch):
+    monkeypatch.setattr(datastore, 'SOURCE_DIR', str(tmp_path / 'clean'))
+    monkeypatch.setattr(datastore, 'STORE_DIR', str(tmp_path / 'store'))
+    os.makedirs(tmp_path / 'clean')
+    frame = rentals(6)
+    frame.to_csv(datastore.source_path('prop4rent'))
+    assert_same_summaries(aggregates.load({'prop4rent': frame})['prop4rent'], aggregates.summarize('prop4rent', frame))
+
+    frame.loc[frame.city == 'taguig', 'price'] += 100
+    frame.to_csv(datastore.source_path('prop4rent'))
+    summarized = []
+
+    class Counted(Summary):
+        def __init__(self, values=(), counts=None, **kwargs):
+            if counts is None and len(values):
+                summarized.append(len(values))
+            super().__init__(values, counts, **kwargs)
+
+    monkeypatch.setattr(aggregates, 'Summary', Counted)
+    loaded = aggregates.load({'prop4rent': frame})['prop4rent']
+    #  only taguig's rows are summarized again
+    assert summarized == [(frame.city == 'taguig').sum()]
+    assert_same_summaries(loaded, aggregates.summarize('prop4rent', frame))
@@ -0,0 +1,102 @@
+#  the cleaning pipeline on small raw scrapes written to a temporary directory
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cleaning
+import datastore
+
+
+def raw_listings(city, rows, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'listing': [f'For Rent: unit {i} in {city}' for i in rows],
+                         'location': f'poblacion, {city}',
+                         'price': [f'{price:,}' for price in rng.integers(10, 40, len(rows)) * 1000],
+                         'bedroom_num': rng.integers(1, 4, len(rows)),
+                         'bathroom_num': rng.integers(1, 3, len(rows)).astype(float),
+                         'floor_area': rng.uniform(20, 80, len(rows)).round(),
+                         'land_size': np.nan,
+                         'longitude': rng.uniform(121., 121.1, len(rows)),
+                         'latitude': rng.uniform(14.5, 14.6, len(rows))})
+
+
+def write_raw(path, frame):
+    frame.to_csv(cleaning.raw_path(path))
+
+
+@pytest.fixture
+def scrape(tmp_path, monkeypatch):
+    monkeypatch.setattr(cleaning, 'RAW_DIR', str(tmp_path / 'raw'))
+    monkeypatch.setattr(cleaning, 'STAGE_DIR', str(tmp_path / 'staging'))
+    monkeypatch.setattr(cleaning, 'MANIFEST', str(tmp_path / 'staging' / 'manifest.json'))
+    monkeypatch.setattr(datastore, 'SOURCE_DIR', str(tmp_path / 'clean'))
+    os.makedirs(tmp_path / 'raw' / 'for rent')
+    os.makedirs(tmp_path / 'clean')
+    for seed, path in enumerate(cleaning.RAW['prop4rent']):
+        write_raw(path, raw_listings(path.split(os.sep)[-1].split('_4rent')[0], range(40), seed))
+    return tmp_path
+
+
+def cleaned():
+    return pd.read_csv(datastore.source_path('prop4rent'), index_col=0)
+
+
+def test_duplicates_across_files_keep_the_first(scrape):
+    first, later = cleaning.RAW['prop4rent'][0], cleaning.RAW['prop4rent'][3]
+    copy = pd.read_csv(cleaning.raw_path(first), index_col=0).iloc[:5].assign(price='35,000')
+    write_raw(later, pd.concat([pd.read_csv(cleaning.raw_path(later), index_col=0), copy], ignore_index=True))
+    cleaning.run(['prop4rent'], jobs=1)
+    df = cleaned()
+    assert not df.duplicated(subset=['listing', 'location']).any()
+    kept = df.set_index('listing').loc[copy['listing']]
+    expected = pd.read_csv(cleaning.raw_path(first), index_col=0).set_index('listing').loc[copy['listing']]
+    np.testing.assert_array_equal(kept['price'], expected['price'].str.replace(',', '').astype(float))
+
+
+def test_incomplete_rows_are_dropped(scrape):
+    path = cleaning.RAW['prop4rent'][1]
+    raw = pd.read_csv(cleaning.raw_path(path), index_col=0)
+    raw.loc[:9, 'floor_area'] = np.nan
+    write_raw(path, raw)
+    cleaning.run(['prop4rent'], jobs=1)
+    df = cleaned()
+    assert not df[['price', 'bedroom_num', 'bathroom_num', 'floor_area']].isna().any().any()
+    assert not df['listing'].isin(raw['listing'].iloc[:10]).any()
+
+
+def test_chunked_merge_writes_the_same_csv(scrape):
+    path = cleaning.RAW['prop4rent'][2]
+    raw = pd.read_csv(cleaning.raw_path(path), index_col=0)
+    write_raw(path, pd.concat([raw, raw.iloc[:7]], ignore_index=True))
+    cleaning.run(['prop4rent'], jobs=1)
+    with open(datastore.source_path('prop4rent')) as file:
+        whole = file.read()
+    cleaning.run(['prop4rent'], full=True, chunk_size=9, jobs=1)
+    with open(datastore.source_path('prop4rent')) as file:
+        assert file.read() == whole
+
+
+def test_incremental_runs_only_redo_what_changed(scrape):
+    paths = cleaning.RAW['prop4rent']
+    assert cleaning.run(['prop4rent'], jobs=1) == [datastore.source_path('prop4rent')]
+    staged = {path: os.stat(cleaning.part_path('prop4rent', path)).st_mtime_ns for path in paths}
+
+    #  nothing changed: nothing is staged or merged again
+    assert cleaning.run(['prop4rent'], jobs=1) == []
+    assert staged == {path: os.stat(cleaning.part_path('prop4rent', path)).st_mtime_ns for path in paths}
+
+    #  one raw file changed: only its part is staged again, and the dataset merged again
+    changed = paths[4]
+    raw = pd.read_csv(cleaning.raw_path(changed), index_col=0)
+    added = raw_listings('pasig', [999], seed=99)
+    write_raw(changed, pd.concat([raw, added], ignore_index=True))
+    assert cleaning.run(['prop4rent'], jobs=1) == [datastore.source_path('prop4rent')]
+    restaged = [path for path in paths if os.stat(cleaning.part_path('prop4rent', path)).st_mtime_ns != staged[path]]
+    assert restaged == [changed]
+    assert added['listing'].iloc[0] in set(cleaned()['listing'])
+
+    #  a rewrite with the same content is recognized by its hash
+    write_raw(changed, pd.concat([raw, added], ignore_index=True))
+    assert cleaning.run(['prop4rent'], jobs=1) == []
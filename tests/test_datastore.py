@@ -0,0 +1,85 @@
+#  the store's array files, and the per-version directories of what is derived from the data
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import datastore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(datastore, 'STORE_DIR', str(tmp_path))
+    disk = {'version': 'v1'}
+    monkeypatch.setattr(datastore, 'version', lambda: disk['version'])
+    return disk
+
+
+def test_arrays_round_trip_as_read_only_views(tmp_path):
+    arrays = {'positions': np.arange(10, dtype='int64'),
+              'bitmaps': np.arange(12, dtype='uint8').reshape(3, 4),
+              'mask': np.array([True, False, True]),
+              'empty': np.empty(0)}
+    path = datastore.write_arrays(arrays, {'cell': .5}, str(tmp_path / 'arrays.arrow'))
+    read, metadata = datastore.read_arrays(path)
+    assert metadata == {'cell': .5}
+    for name, array in arrays.items():
+        assert read[name].dtype == array.dtype and read[name].shape == array.shape
+        np.testing.assert_array_equal(read[name], array)
+        assert not read[name].flags.writeable
+
+
+def test_frames_keep_their_index(tmp_path):
+    frame = pd.DataFrame({'price': [3., 1., 2.], 'city': pd.Categorical(['a', 'b', 'a'])}, index=[7, 2, 5])
+    pd.testing.assert_frame_equal(datastore.read_frame(datastore.write_frame(frame, str(tmp_path / 'frame.arrow'))), frame)
+
+
+def test_derive_writes_each_version_once(store):
+    calls = []
+
+    def build(directory):
+        calls.append(directory)
+        with open(os.path.join(directory, 'rows'), 'w') as file:
+            file.write('complete')
+
+    def worker():
+        with datastore.locked():
+            path = datastore.derive('v1', build)
+        with open(os.path.join(path, 'rows')) as file:
+            seen.append(file.read())
+
+    seen = []
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and seen == ['complete'] * 4
+
+
+def test_derive_publishes_nothing_when_the_build_fails(store):
+    def build(directory):
+        open(os.path.join(directory, 'half'), 'w').close()
+        raise ValueError('unreadable csv')
+
+    with pytest.raises(ValueError):
+        datastore.derive('v1', build)
+    assert os.listdir(datastore.STORE_DIR) == []
+
+
+def test_derive_refuses_a_version_the_data_changed_from(store):
+    def build(directory):
+        store['version'] = 'v2'
+
+    with pytest.raises(RuntimeError):
+        datastore.derive('v1', build)
+    assert not os.path.exists(datastore.derived_path('v1'))
+
+
+def test_derive_removes_older_versions(store):
+    datastore.derive('v1', lambda directory: None)
+    store['version'] = 'v2'
+    datastore.derive('v2', lambda directory: None)
+    assert sorted(os.listdir(datastore.STORE_DIR)) == ['v2']
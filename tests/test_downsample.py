@@ -0,0 +1,58 @@
+#  scatter map thinning: coverage of sparse areas and the overall budget
+import numpy as np
+import pandas as pd
+
+import downsample
+
+CELL = .002
+
+
+def cells(frame):
+    return set(zip(np.floor(frame['latitude'] / CELL).astype(int), np.floor(frame['longitude'] / CELL).astype(int)))
+
+
+def clustered(rng, centres, per_cell):
+    #  `per_cell` listings around the middle of the cell of every centre
+    lat = np.repeat([lat for lat, _ in centres], per_cell) + rng.uniform(.0002, .0018, len(centres) * per_cell)
+    lon = np.repeat([lon for _, lon in centres], per_cell) + rng.uniform(.0002, .0018, len(centres) * per_cell)
+    return pd.DataFrame({'latitude': lat, 'longitude': lon,
+                         'price': rng.lognormal(10, .5, len(lat)).round(-2)})
+
+
+def grid_centres(lat0, lon0, rows, cols, step):
+    return [(lat0 + CELL * step * i, lon0 + CELL * step * j) for i in range(rows) for j in range(cols)]
+
+
+def test_sparse_cells_keep_at_least_their_share():
+    rng = np.random.default_rng(0)
+    core = clustered(rng, grid_centres(14.55, 121.02, 10, 10, 1), 500)
+    periphery = clustered(rng, grid_centres(14.3, 120.8, 20, 30, 3), 5)
+    listings = pd.concat([core, periphery], ignore_index=True)
+    cap = len(listings) // 10
+
+    thinned = downsample.thin(listings, cap)
+    assert abs(len(thinned) - cap) <= 1
+    assert cells(thinned) == cells(listings)
+    kept_periphery = thinned.index.isin(periphery.index + len(core)).sum()
+    assert kept_periphery >= len(periphery) * cap / len(listings)
+    #  the price mix of the dense cells is kept
+    kept_core = thinned[~thinned.index.isin(periphery.index + len(core))]
+    assert abs(kept_core['price'].median() / core['price'].median() - 1) < .05
+
+
+def test_every_cell_is_kept_even_beyond_the_cap():
+    rng = np.random.default_rng(1)
+    listings = clustered(rng, grid_centres(14.5, 121., 30, 30, 2), 3)
+    thinned = downsample.thin(listings, 100)
+    assert len(thinned) == 900
+    assert cells(thinned) == cells(listings)
+
+
+def test_rows_come_back_unchanged_in_their_order():
+    rng = np.random.default_rng(2)
+    listings = clustered(rng, grid_centres(14.5, 121., 5, 5, 1), 40).assign(name=lambda df: df.index.astype(str))
+    thinned = downsample.thin(listings, 200)
+    assert thinned.index.is_monotonic_increasing
+    pd.testing.assert_frame_equal(thinned, listings.loc[thinned.index])
+    assert downsample.thin(listings, len(listings)) is listings
+    assert downsample.thin(listings, 0) is listings
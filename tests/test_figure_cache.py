@@ -0,0 +1,54 @@
+#  the figure cache's LRU eviction and counters
+from figure_cache import FigureCache
+
+
+def figure(title):
+    return {'data': [], 'layout': {'title': {'text': title}}}
+
+
+def test_get_builds_once_and_counts_hits_and_misses():
+    cache = FigureCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return figure('Parañaque')
+
+    first = cache.get(('histogram', 1, None, 'v1'), build)
+    assert cache.get(('histogram', 1, None, 'v1'), build) == first == figure('Parañaque')
+    cache.get(('choropleth', 1, 'v1'), lambda: figure('NCR'))
+    assert len(builds) == 1
+    assert cache.counts() == {('histogram', 'miss'): 1, ('histogram', 'hit'): 1, ('choropleth', 'miss'): 1}
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 2)
+
+
+def test_bytes_are_utf8_bytes_not_characters():
+    cache = FigureCache()
+    cache.get(('histogram',), lambda: figure('Parañaque'))
+    plain = FigureCache()
+    plain.get(('histogram',), lambda: figure('Paranaque'))
+    #  ñ takes two bytes in utf-8
+    assert cache.stats()['bytes'] == plain.stats()['bytes'] + 1
+
+
+def test_least_recently_used_figure_is_evicted():
+    cache = FigureCache(maxsize=2)
+    for key in 'ab':
+        cache.get((key,), lambda: figure(key))
+    #  a is used again, so b is the least recently used when c comes in
+    cache.get(('a',), lambda: figure('rebuilt'))
+    cache.get(('c',), lambda: figure('c'))
+    assert cache.stats()['size'] == 2
+    assert cache.get(('a',), lambda: figure('rebuilt')) == figure('a')
+    assert cache.get(('b',), lambda: figure('rebuilt')) == figure('rebuilt')
+    assert cache.stats()['misses'] == 4
+
+
+def test_evict_drops_the_stale_keys():
+    cache = FigureCache()
+    cache.get(('histogram', 'v1'), lambda: figure('old'))
+    cache.get(('histogram', 'v2'), lambda: figure('new'))
+    cache.evict(lambda key: key[-1] != 'v2')
+    assert cache.stats()['size'] == 1
+    assert cache.get(('histogram', 'v2'), lambda: figure('rebuilt')) == figure('new')
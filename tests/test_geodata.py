@@ -0,0 +1,53 @@
+#  CityGrid against testing every point against every polygon
+import numpy as np
+import pandas as pd
+import pytest
+
+import geodata
+
+
+def square(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+
+@pytest.fixture
+def cities():
+    return pd.DataFrame({'city': ['west', 'east', 'islands', 'ring'],
+                         'geometry': [
+                             {'type': 'Polygon', 'coordinates': [square(0., 0., .05, .1)]},
+                             #  a triangle sharing the west square's eastern edge
+                             {'type': 'Polygon', 'coordinates': [[[.05, 0.], [.12, .05], [.05, .1], [.05, 0.]]]},
+                             {'type': 'MultiPolygon', 'coordinates': [[square(.13, 0., .15, .02)],
+                                                                      [square(.13, .08, .15, .1)]]},
+                             #  a square with a hole, and the hole's edges cross grid cells
+                             {'type': 'Polygon', 'coordinates': [square(0., .11, .1, .2),
+                                                                 square(.0312, .1317, .0687, .1791)]}]})
+
+
+def brute_force(frame, lon, lat):
+    codes = np.full(len(lon), -1)
+    for code, geometry in enumerate(frame['geometry']):
+        inside = geodata.contains(geometry, lon, lat) & (codes == -1)
+        codes[inside] = code
+    return codes
+
+
+def test_city_grid_matches_brute_force(cities):
+    rng = np.random.default_rng(0)
+    lon, lat = rng.uniform(-.02, .17, 20000), rng.uniform(-.02, .22, 20000)
+    grid = geodata.CityGrid(cities, cell=.007)
+    np.testing.assert_array_equal(grid.locate(lon, lat), brute_force(cities, lon, lat))
+
+
+def test_city_grid_names_cities_and_rejects_missing_coordinates(cities):
+    grid = geodata.CityGrid(cities, cell=.01)
+    named = grid.city_of([.02, .07, .14, .14, .01, .05, np.nan, 1.], [.05, .05, .01, .05, .15, .15, .05, 1.])
+    assert list(named) == ['west', 'east', 'islands', None, 'ring', None, None, None]
+
+
+def test_mismatches_flags_listings_outside_their_city(cities):
+    grid = geodata.CityGrid(cities, cell=.01)
+    listings = pd.DataFrame({'city': ['west', 'west', 'east'],
+                             'longitude': [.02, .07, .07],
+                             'latitude': [.05, .05, .05]})
+    assert list(grid.mismatches(listings)) == [False, True, False]
@@ -0,0 +1,58 @@
+#  ETags and 304 Not Modified for the dash routes, through flask's test client
+import pytest
+from dash import Dash, html
+from dash.dependencies import Input, Output
+
+import httpcache
+
+
+@pytest.fixture
+def served():
+    app = Dash(__name__)
+    app.layout = html.Div([html.Button(id='button'), html.Div(id='output')])
+
+    @app.callback(Output('output', 'children'), Input('button', 'n_clicks'))
+    def clicked(n_clicks):
+        return f'clicked {n_clicks} times'
+
+    version = {'current': 'v1-code'}
+    #  compress even these short responses
+    app.server.config['COMPRESS_MIN_SIZE'] = 0
+    httpcache.compress(app.server)
+    httpcache.install_etags(app, lambda: version['current'])
+    return app, app.server.test_client(), version
+
+
+def update(app, client, clicks, **headers):
+    return client.post(app.config.routes_pathname_prefix + '_dash-update-component',
+                       json=httpcache.request_body(app, 'clicked', [clicks]), headers=headers)
+
+
+@pytest.mark.parametrize('encoding', ['identity', 'br'])
+def test_repeat_request_is_not_modified(served, encoding):
+    app, client, _ = served
+    first = update(app, client, 3, **{'Accept-Encoding': encoding})
+    assert first.status_code == 200 and first.headers['ETag'].startswith('W/')
+    assert first.headers.get('Content-Encoding', 'identity') == encoding
+    repeat = update(app, client, 3, **{'Accept-Encoding': encoding, 'If-None-Match': first.headers['ETag']})
+    assert repeat.status_code == 304 and repeat.get_data() == b''
+    #  other inputs are another response
+    assert update(app, client, 4, **{'If-None-Match': first.headers['ETag']}).status_code == 200
+
+
+def test_new_data_version_changes_the_etag(served):
+    app, client, version = served
+    first = update(app, client, 3)
+    version['current'] = 'v2-code'
+    again = update(app, client, 3, **{'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 200 and b'clicked 3 times' in again.get_data()
+    assert again.headers['ETag'] != first.headers['ETag']
+    assert update(app, client, 3, **{'If-None-Match': again.headers['ETag']}).status_code == 304
+
+
+def test_layout_gets_an_etag_too(served):
+    app, client, _ = served
+    first = client.get(app.config.routes_pathname_prefix + '_dash-layout')
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert client.get(app.config.routes_pathname_prefix + '_dash-layout',
+                      headers={'If-None-Match': first.headers['ETag']}).status_code == 304
@@ -0,0 +1,171 @@
+#  the lookup structures of indexes.py, checked against plain pandas filters
+import numpy as np
+import pandas as pd
+import pytest
+
+import datastore
+from indexes import CityPartition, FilterIndex, GridIndex, PriceIndex, UnknownCityError
+
+
+@pytest.fixture
+def listings():
+    rng = np.random.default_rng(0)
+    n = 2000
+    return pd.DataFrame({'price': rng.choice([1e4, 2.5e4, 5e4, 1e5], n) + rng.integers(0, 100, n) * 500.,
+                         'city': rng.choice(['makati', 'pasig', 'taguig'], n)})
+
+
+def test_city_partition_returns_the_rows_of_a_boolean_filter(listings):
+    partition = CityPartition(listings)
+    assert partition.cities == list(listings.city.unique())
+    for city in partition.cities:
+        pd.testing.assert_frame_equal(partition[city], listings[listings.city == city])
+
+
+def test_city_partition_groups_cities_in_order_of_appearance(listings):
+    frame = CityPartition(listings).frame
+    expected = pd.concat([listings[listings.city == city] for city in listings.city.unique()])
+    pd.testing.assert_frame_equal(frame, expected)
+    #  an already partitioned frame is kept as it is, with the same lookups
+    presorted = CityPartition(frame, presorted=True)
+    assert presorted.frame is frame
+    for city in presorted.cities:
+        pd.testing.assert_frame_equal(presorted[city], listings[listings.city == city])
+
+
+def test_city_partition_raises_for_unknown_cities(listings):
+    partition = CityPartition(listings)
+    assert 'makati' in partition and 'quezon' not in partition
+    for city in ['quezon', None, ['makati']]:
+        with pytest.raises(UnknownCityError):
+            partition[city]
+    #  a KeyError, for code that looks cities up like a dict
+    with pytest.raises(KeyError):
+        partition['quezon']
+
+
+def test_price_index_between_is_inclusive(listings):
+    index = PriceIndex(listings)
+    for low, high in [(1e4, 1e4), (2e4, 6e4), (5e4, 2.5e4), (-1, 1e9)]:
+        expected = listings[(listings.price >= low) & (listings.price <= high)]
+        assert sorted(index.between(low, high).index) == sorted(expected.index)
+
+
+def test_price_index_keeps_rows_sorted_and_stable(listings):
+    rows = PriceIndex(listings).between(2e4, 6e4)
+    assert rows.price.is_monotonic_increasing
+    #  rows of equal price keep their original order
+    for _, group in rows.groupby('price'):
+        assert group.index.is_monotonic_increasing
+
+
+def brute_force_box(lon, lat, box):
+    min_lon, min_lat, max_lon, max_lat = box
+    return np.flatnonzero((lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat))
+
+
+def test_grid_index_query_matches_brute_force():
+    rng = np.random.default_rng(1)
+    lon, lat = rng.uniform(120.9, 121.1, 5000), rng.uniform(14.4, 14.7, 5000)
+    index = GridIndex(lon, lat, cell=.01)
+    boxes = [(121., 14.5, 121.05, 14.55),
+             (120.95, 14.45, 120.951, 14.451),
+             (121.0534, 14.4012, 121.2, 14.52),
+             (120., 14., 122., 15.),
+             (121.5, 14.5, 121.6, 14.6),
+             (121.05, 14.55, 121., 14.5)]
+    for box in boxes:
+        np.testing.assert_array_equal(index.query(box), brute_force_box(lon, lat, box))
+
+
+def test_grid_index_skips_points_without_coordinates():
+    lon = np.array([121., np.nan, 121.01, 121.02])
+    lat = np.array([14.5, 14.5, np.nan, 14.52])
+    index = GridIndex(lon, lat, cell=.005)
+    np.testing.assert_array_equal(index.query((120., 14., 122., 15.)), [0, 3])
+    np.testing.assert_array_equal(index.query((121., 14.5, 121.001, 14.501)), [0])
+
+
+def test_grid_index_state_round_trips_through_the_store(tmp_path):
+    rng = np.random.default_rng(4)
+    lon, lat = rng.uniform(120.9, 121.1, 1000), rng.uniform(14.4, 14.7, 1000)
+    lon[::50] = np.nan
+    index = GridIndex(lon, lat, cell=.01)
+    path = datastore.write_arrays(*index.state(), str(tmp_path / 'grid.arrow'))
+    mapped = GridIndex.from_state(*datastore.read_arrays(path))
+    assert (mapped.origin, mapped.shape, mapped.cell) == (index.origin, index.shape, index.cell)
+    for box in [(121., 14.5, 121.05, 14.55), (120., 14., 122., 15.), (121.5, 14.5, 121.6, 14.6)]:
+        np.testing.assert_array_equal(mapped.query(box), index.query(box))
+        assert mapped.snap(box) == index.snap(box)
+
+
+def test_grid_index_snap_widens_to_whole_cells():
+    index = GridIndex([0., 1.], [0., 1.], cell=.25)
+    assert index.snap((.1, .3, .6, .6)) == (0., .25, .75, .75)
+
+
+@pytest.fixture
+def homes():
+    rng = np.random.default_rng(2)
+    n = 3001
+    floor_area = rng.lognormal(4, .6, n).round()
+    floor_area[rng.random(n) < .05] = np.nan
+    return pd.DataFrame({'bedroom_num': rng.integers(0, 6, n).astype(float),
+                         'floor_area': floor_area,
+                         'city': pd.Categorical(rng.choice(['makati', 'pasig', 'taguig', 'manila'], n))})
+
+
+def pandas_select(frame, ranges=None, categories=None, positions=()):
+    mask = np.ones(len(frame), dtype=bool)
+    for column, (low, high) in (ranges or {}).items():
+        values = frame[column]
+        if low is not None:
+            mask &= (values >= low).to_numpy()
+        if high is not None:
+            mask &= (values <= high).to_numpy()
+    for column, chosen in (categories or {}).items():
+        mask &= np.isin(frame[column].to_numpy(dtype=object), list(chosen))
+    for rows in positions:
+        mask &= np.isin(np.arange(len(frame)), rows)
+    return np.flatnonzero(mask)
+
+
+@pytest.mark.parametrize('bins', [1, 4, 32, 5000])
+def test_filter_index_matches_pandas_masks(homes, bins):
+    index = FilterIndex(homes, ranges=['bedroom_num', 'floor_area'], categories=['city'], bins=bins)
+    rng = np.random.default_rng(3)
+    queries = [({}, {}, ()),
+               ({'bedroom_num': (2, 3)}, {}, ()),
+               ({'floor_area': (None, 40)}, {}, ()),
+               ({'floor_area': (60, None)}, {'city': ['pasig']}, ()),
+               ({'floor_area': (0, 1e9)}, {}, ()),
+               ({'floor_area': (None, None), 'bedroom_num': (4, 1)}, {}, ()),
+               ({}, {'city': ['makati', 'quezon']}, ()),
+               ({}, {'city': []}, ()),
+               ({'bedroom_num': (1, 4)}, {}, (np.sort(rng.choice(len(homes), 500, replace=False)),))]
+    for _ in range(50):
+        low, high = np.sort(rng.uniform(0, 200, 2)).round(1)
+        queries.append(({'floor_area': (low, high), 'bedroom_num': (rng.integers(0, 3), rng.integers(2, 6))},
+                         {'city': list(rng.choice(['makati', 'pasig', 'taguig', 'manila'], 2))}, ()))
+    for ranges, categories, positions in queries:
+        np.testing.assert_array_equal(index.select(ranges, categories, positions),
+                                      pandas_select(homes, ranges, categories, positions))
+
+
+def test_filter_index_bounds_and_categories(homes):
+    index = FilterIndex(homes, ranges=['floor_area'], categories=['city'])
+    assert index.bounds('floor_area') == (homes.floor_area.min(), homes.floor_area.max())
+    assert sorted(index.categories('city')) == ['makati', 'manila', 'pasig', 'taguig']
+    assert FilterIndex(homes.iloc[:0], ranges=['floor_area']).bounds('floor_area') is None
+
+
+def test_filter_index_state_round_trips_through_the_store(homes, tmp_path):
+    index = FilterIndex(homes, ranges=['bedroom_num', 'floor_area'], categories=['city'], bins=8)
+    path = datastore.write_arrays(*index.state(), str(tmp_path / 'filters.arrow'))
+    mapped = FilterIndex.from_state(*datastore.read_arrays(path))
+    assert mapped.bounds('floor_area') == index.bounds('floor_area')
+    assert mapped.categories('city') == index.categories('city')
+    for ranges, categories in [({'bedroom_num': (2, 3)}, {}),
+                               ({'floor_area': (30, 80)}, {'city': ['pasig', 'manila']}),
+                               ({}, {'city': ['makati']})]:
+        np.testing.assert_array_equal(mapped.select(ranges, categories), index.select(ranges, categories))
@@ -0,0 +1,80 @@
+#  radius and nearest-district search, checked against measuring every point
+import flask
+import numpy as np
+import pandas as pd
+import pytest
+
+import proximity
+from proximity import Proximity, RadiusIndex, haversine_km, nearest_table
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(5)
+    lat, lon = rng.uniform(14.4, 14.75, 4000), rng.uniform(120.9, 121.15, 4000)
+    lat[::97] = np.nan
+    return lat, lon
+
+
+@pytest.mark.parametrize('lat0, lon0, km', [(14.55, 121.02, 2.), (14.6, 121.0, .3), (14.41, 120.91, 5.),
+                                            (14.55, 121.02, 0.), (14.55, 121.02, 100.), (15.5, 122.5, 3.)])
+def test_within_matches_brute_force(points, lat0, lon0, km):
+    lat, lon = points
+    positions, distances = RadiusIndex(lat, lon).within(lat0, lon0, km)
+    everywhere = haversine_km(lat, lon, lat0, lon0)
+    expected = np.flatnonzero(everywhere <= km)
+    np.testing.assert_array_equal(positions, expected)
+    np.testing.assert_allclose(distances, everywhere[expected])
+
+
+@pytest.mark.parametrize('lat0, lon0, km', [(14.5, 121., -1.), (14.5, 121., float('nan')), (14.5, 121., float('inf')),
+                                            (91., 121., 1.), (14.5, -181., 1.), (float('nan'), 121., 1.)])
+def test_within_rejects_impossible_searches(points, lat0, lon0, km):
+    with pytest.raises(ValueError):
+        RadiusIndex(*points).within(lat0, lon0, km)
+
+
+@pytest.mark.parametrize('n, chunk', [(3, 4096), (3, 7), (1, 100), (10, 100)])
+def test_nearest_table_matches_brute_force(n, chunk):
+    rng = np.random.default_rng(6)
+    lat, lon = rng.uniform(14.4, 14.75, 250), rng.uniform(120.9, 121.15, 250)
+    places_lat, places_lon = rng.uniform(14.4, 14.75, 6), rng.uniform(120.9, 121.15, 6)
+    indices, distances = nearest_table(lat, lon, places_lat, places_lon, n, chunk=chunk)
+    km = haversine_km(lat[:, None], lon[:, None], places_lat[None, :], places_lon[None, :])
+    expected = np.argsort(km, axis=1, kind='stable')[:, :min(n, 6)]
+    np.testing.assert_array_equal(indices, expected)
+    np.testing.assert_allclose(distances, np.take_along_axis(km, expected, axis=1))
+
+
+@pytest.fixture
+def client():
+    rng = np.random.default_rng(7)
+    districts = {'poblacion, makati': (14.565, 121.03), 'kapitolyo, pasig': (14.57, 121.06),
+                 'fort bonifacio, taguig': (14.55, 121.05)}
+    rows = [{'listing': f'{district} #{i}', 'location': district, 'city': district.split(', ')[1],
+             'price': float(rng.integers(10, 50)) * 1000,
+             'latitude': lat + rng.normal(0, .003), 'longitude': lon + rng.normal(0, .003)}
+            for district, (lat, lon) in districts.items() for i in range(8)]
+    frame = pd.DataFrame(rows).sort_values('price', kind='stable')
+    server = flask.Flask(__name__)
+    proximity.routes(server, {'prop4rent': Proximity(frame, proximity.district_centers(frame))})
+    return server.test_client()
+
+
+def test_nearby_lists_listings_nearest_first(client):
+    response = client.get('/api/nearby?near=kapitolyo, pasig&km=1&max_price=30000')
+    assert response.status_code == 200
+    listings = response.get_json()
+    assert listings and all(listing['price'] <= 30000 and listing['km'] <= 1 for listing in listings)
+    assert [listing['km'] for listing in listings] == sorted(listing['km'] for listing in listings)
+    assert len(client.get('/api/nearby?lat=14.57&lon=121.06&km=1&limit=2').get_json()) == 2
+
+
+@pytest.mark.parametrize('query', ['lat=abc&lon=121.05', 'lat=14.55', 'lon=121.05', 'lat=91&lon=121.05',
+                                   'lat=14.55&lon=-200', 'lat=nan&lon=121.05', 'lat=14.55&lon=121.05&km=-1',
+                                   'lat=14.55&lon=121.05&km=nan', 'lat=14.55&lon=121.05&km=inf',
+                                   'lat=14.55&lon=121.05&km=far', 'near=nowhere', 'lat=14.55&lon=121.05&limit=0',
+                                   'dataset=prop4sale&lat=14.55&lon=121.05'])
+def test_nearby_rejects_bad_queries(client, query):
+    response = client.get(f'/api/nearby?{query}')
+    assert response.status_code == 400 and 'error' in response.get_json()
@@ -0,0 +1,82 @@
+#  city scores: the weights, the rankings, and the validation of the /api/rank endpoint
+import flask
+import numpy as np
+import pandas as pd
+import pytest
+
+import scoring
+from scoring import FEATURES, Scorer
+
+
+@pytest.fixture
+def scorer():
+    #  makati is best on every feature, taguig worst on every one
+    table = pd.DataFrame({'sale_price': [5e6, 8e6, 9e6],
+                          'rent': [2e4, 3e4, 4e4],
+                          'salary': [4e4, 3e4, 2e4],
+                          'jobs': [300, 200, 100],
+                          'schools': [50, 40, 30]},
+                         index=pd.Index(['makati', 'pasig', 'taguig'], name='place'))
+    return Scorer(table, {city: city for city in table.index})
+
+
+def test_weights_default_left_out_features_and_reject_bad_values(scorer):
+    np.testing.assert_array_equal(scorer.weights({'rent': 3}), [1, 3, 1, 1, 1])
+    np.testing.assert_array_equal(scorer.weights([0, 1, 2, 3, 4]), [0, 1, 2, 3, 4])
+    for bad in [{'parks': 1}, {'rent': -1}, {'rent': float('nan')}, [1, 2], [1, 1, 1, 1, float('inf')]]:
+        with pytest.raises(ValueError):
+            scorer.weights(bad)
+
+
+def test_rank_orders_places_best_first(scorer):
+    ranking = scorer.rank(scorer.weights({}))
+    assert [place for place, _, _ in ranking] == ['makati', 'pasig', 'taguig']
+    assert ranking[0][2] == pytest.approx(100) and ranking[-1][2] == pytest.approx(0)
+    assert scorer.rank(scorer.weights({}), top=2) == ranking[:2]
+
+
+def test_rank_follows_the_weights():
+    #  pasig has the cheapest rent but the fewest schools
+    table = pd.DataFrame({'sale_price': [1., 1.], 'rent': [2e4, 1e4], 'salary': [1., 1.],
+                          'jobs': [1., 1.], 'schools': [50, 10]}, index=['makati', 'pasig'])
+    scorer = Scorer(table, {'makati': 'makati', 'pasig': 'pasig'})
+    only = {feature: 0 for feature in FEATURES}
+    assert scorer.rank(scorer.weights({**only, 'rent': 1}))[0][0] == 'pasig'
+    assert scorer.rank(scorer.weights({**only, 'schools': 1}))[0][0] == 'makati'
+    #  no weight at all scores every place 0
+    assert all(score == 0 for _, _, score in scorer.rank(scorer.weights(only)))
+
+
+def test_rank_of_many_weights_matches_one_at_a_time(scorer):
+    queries = [{'rent': 5}, {'salary': 0, 'jobs': 2}, {}]
+    batch = scorer.rank(np.stack([scorer.weights(query) for query in queries]), top=2)
+    assert batch == [scorer.rank(scorer.weights(query), top=2) for query in queries]
+
+
+@pytest.fixture
+def client(scorer):
+    server = flask.Flask(__name__)
+    scoring.routes(server, {'city': scorer})
+    return server.test_client()
+
+
+def test_rank_endpoint(client):
+    response = client.get('/api/rank?top=2&rent=3')
+    assert response.status_code == 200
+    assert [row['place'] for row in response.get_json()] == ['makati', 'pasig']
+    response = client.post('/api/rank', json={'top': 1, 'weights': [{'rent': 5}, {'schools': 0}]})
+    assert response.status_code == 200 and len(response.get_json()) == 2
+    assert client.post('/api/rank').get_json() == []
+
+
+@pytest.mark.parametrize('query', ['top=0', 'top=-3', 'top=two', 'level=province', 'parks=1', 'rent=-1', 'rent=x'])
+def test_rank_endpoint_rejects_bad_queries(client, query):
+    response = client.get(f'/api/rank?{query}')
+    assert response.status_code == 400 and 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('body', ['{"top": 3', '[1, 2]', 'null', '{"top": 0}', '{"weights": {"rent": 1}}',
+                                  '{"weights": [{"rent": "cheap"}]}'])
+def test_rank_endpoint_rejects_bad_json(client, body):
+    response = client.post('/api/rank', data=body, content_type='application/json')
+    assert response.status_code == 400 and 'error' in response.get_json()
@@ -0,0 +1,125 @@
+#  snapshot swaps: memos per snapshot, and the reloader's settle, swap and failure handling
+import time
+
+import pytest
+
+import snapshot
+from snapshot import Reloader, Snapshot
+
+
+class Disk:
+    """Stands in for the cleaned csvs: a version that tests change by hand."""
+
+    def __init__(self, version='v1'):
+        self.current = version
+
+    def __call__(self):
+        if isinstance(self.current, Exception):
+            raise self.current
+        return self.current
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.]
+    monkeypatch.setattr(snapshot.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def wait(reloader):
+    while reloader.reloading:
+        time.sleep(.001)
+
+
+def build(version):
+    if version == 'broken':
+        raise ValueError('unreadable csv')
+    return Snapshot(version, rows=[version])
+
+
+def test_cached_memoizes_per_snapshot():
+    calls = []
+
+    @snapshot.cached(maxsize=4)
+    def rows(data, n):
+        calls.append((data.version, n))
+        return data.rows * n
+
+    old, new = Snapshot('v1', rows=[1]), Snapshot('v2', rows=[2])
+    assert rows(old, 2) == [1, 1] and rows(old, 2) == [1, 1]
+    assert rows(new, 2) == [2, 2]
+    assert calls == [('v1', 2), ('v2', 2)]
+    rows.cache_clear(old)
+    assert rows(old, 2) == [1, 1]
+    assert calls[-1] == ('v1', 2)
+
+
+def test_reload_swaps_and_notifies():
+    disk = Disk()
+    reloader = Reloader(build, version=disk)
+    swapped = []
+    reloader.on_swap(lambda data: swapped.append(data.version))
+    old = reloader.current
+    disk.current = 'v2'
+    assert reloader.reload().version == 'v2'
+    assert reloader.current.version == 'v2' and reloader.current is not old
+    assert swapped == ['v2']
+
+
+def test_check_waits_for_the_version_to_settle(clock):
+    disk = Disk()
+    reloader = Reloader(build, version=disk, interval=30)
+    disk.current = 'v2'
+    #  throttled: not looked at before the interval has passed
+    clock[0] += 10
+    reloader.check()
+    assert reloader.current.version == 'v1' and reloader._seen == 'v1'
+    #  first sighting of v2, which may still be half written
+    clock[0] += 30
+    reloader.check()
+    wait(reloader)
+    assert reloader.current.version == 'v1'
+    #  still v2 an interval later: swapped in
+    clock[0] += 30
+    reloader.check()
+    wait(reloader)
+    assert reloader.current.version == 'v2'
+
+
+def test_a_failed_build_keeps_serving_the_old_snapshot(clock):
+    disk = Disk()
+    reloader = Reloader(build, version=disk, interval=1)
+    old = reloader.current
+    disk.current = 'broken'
+    for _ in range(4):
+        clock[0] += 1
+        reloader.check()
+        wait(reloader)
+    assert reloader.current is old
+    assert reloader._failed == 'broken'
+    #  a later version is tried again
+    disk.current = 'v3'
+    for _ in range(2):
+        clock[0] += 1
+        reloader.check()
+        wait(reloader)
+    assert reloader.current.version == 'v3'
+
+
+def test_unreadable_versions_are_ignored(clock):
+    disk = Disk()
+    reloader = Reloader(build, version=disk, interval=1)
+    disk.current = FileNotFoundError('csv being replaced')
+    clock[0] += 1
+    reloader.check()
+    assert not reloader.reloading and reloader.current.version == 'v1'
+
+
+def test_interval_zero_never_checks(clock):
+    disk = Disk()
+    reloader = Reloader(build, version=disk)
+    disk.current = 'v2'
+    for _ in range(3):
+        clock[0] += 3600
+        reloader.check()
+    assert reloader.current.version == 'v1'